@@ -0,0 +1,199 @@
+from ingestion import ActivityColumns, read_activity_columns_in_byte_range
+
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import fcntl
+import hashlib
+import io
+import json
+import os
+import tempfile
+import numpy
+from numpy.lib import format as npy_format
+
+
+class ActivityCache:
+
+    manifest_filename: str = "manifest.json"
+    lock_filename: str = "cache.lock"
+    column_names: tuple[str, ...] = ("user_ids", "job_ids", "type_codes", "timestamps")
+    column_dtypes: dict[str, type] = {
+        "user_ids": ActivityColumns.user_id_dtype,
+        "job_ids": ActivityColumns.job_id_dtype,
+        "type_codes": ActivityColumns.type_code_dtype,
+        "timestamps": ActivityColumns.timestamp_dtype
+    }
+    validation_modes: tuple[str, ...] = ("metadata", "content")
+    tail_digest_bytes: int = 4096
+    hash_block_bytes: int = 2**20
+
+    def __init__(self, cache_directory: str, validation: str = "metadata", chunk_size_bytes: int = 16 * 2**20) -> None:
+        if validation not in self.validation_modes:
+            raise ValueError(f"Unknown cache validation '{validation}'. Expected one of {self.validation_modes}.")
+        self.cache_directory = cache_directory
+        self.validation = validation
+        self.chunk_size_bytes = chunk_size_bytes
+
+    def load(self, activities_filepath: str, incremental: bool = True) -> ActivityColumns:
+        # Workers starting together share one cache directory: the manifest is read and the columns are rebuilt or
+        # appended under an exclusive lock, so one process parses while the others wait and then memory-map its result.
+        with self.lock():
+            source_size = os.path.getsize(activities_filepath)
+            source_mtime = os.path.getmtime(activities_filepath)
+            manifest = self.read_manifest()
+            if manifest is not None and self.is_fresh(manifest, activities_filepath, source_size, source_mtime):
+                return self.memory_map_columns()
+            if incremental and manifest is not None and self.is_appendable(manifest, activities_filepath, source_size):
+                self.append_tail(manifest, activities_filepath, source_size, source_mtime)
+            else:
+                self.rebuild(activities_filepath, source_size, source_mtime)
+            return self.memory_map_columns()
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        os.makedirs(self.cache_directory, exist_ok=True)
+        with open(os.path.join(self.cache_directory, self.lock_filename), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def is_fresh(self, manifest: dict, activities_filepath: str, source_size: int, source_mtime: float) -> bool:
+        if manifest["source_path"] != os.path.abspath(activities_filepath) or manifest["parsed_bytes"] != source_size:
+            return False
+        if not self.has_consistent_columns(manifest):
+            return False
+        if self.validation == "content":
+            return manifest["content_digest"] == self.calculate_content_digest(activities_filepath, source_size)
+        return manifest["source_mtime"] == source_mtime
+
+    def is_appendable(self, manifest: dict, activities_filepath: str, source_size: int) -> bool:
+        parsed_bytes = manifest["parsed_bytes"]
+        if manifest["source_path"] != os.path.abspath(activities_filepath) or source_size <= parsed_bytes:
+            return False
+        if not self.has_consistent_columns(manifest):
+            return False
+        if self.validation == "content":
+            return manifest["content_digest"] == self.calculate_content_digest(activities_filepath, parsed_bytes)
+        return manifest["tail_digest"] == self.calculate_tail_digest(activities_filepath, parsed_bytes)
+
+    def has_consistent_columns(self, manifest: dict) -> bool:
+        for column_name in self.column_names:
+            column_filepath = self.get_column_filepath(column_name)
+            if not os.path.exists(column_filepath):
+                return False
+            column_shape, _ = self.read_column_header(column_filepath)
+            if column_shape != (manifest["number_of_activities"],):
+                return False
+        return True
+
+    def rebuild(self, activities_filepath: str, source_size: int, source_mtime: float) -> None:
+        activity_columns = read_activity_columns_in_byte_range(activities_filepath, 0, source_size, self.chunk_size_bytes)
+        for column_name in self.column_names:
+            column = getattr(activity_columns, column_name).astype(self.column_dtypes[column_name], copy=False)
+            self.replace_column_file(self.get_column_filepath(column_name), column)
+        self.write_manifest(activities_filepath, source_size, source_mtime, len(activity_columns))
+
+    def append_tail(self, manifest: dict, activities_filepath: str, source_size: int, source_mtime: float) -> None:
+        parsed_bytes = manifest["parsed_bytes"]
+        tail_columns = read_activity_columns_in_byte_range(activities_filepath, parsed_bytes, source_size, self.chunk_size_bytes)
+        for column_name in self.column_names:
+            column = getattr(tail_columns, column_name).astype(self.column_dtypes[column_name], copy=False)
+            self.append_to_column_file(self.get_column_filepath(column_name), column)
+        number_of_activities = manifest["number_of_activities"] + len(tail_columns)
+        self.write_manifest(activities_filepath, source_size, source_mtime, number_of_activities)
+
+    def append_to_column_file(self, column_filepath: str, values: numpy.ndarray) -> None:
+        # numpy pads .npy headers so a 1-D shape can grow in place; rewrite the file only if the header size changes.
+        (number_of_rows,), header_length = self.read_column_header(column_filepath)
+        new_header = self.serialize_column_header((number_of_rows + len(values),), values.dtype)
+        if len(new_header) != header_length:
+            existing_values = numpy.load(column_filepath)
+            self.replace_column_file(column_filepath, numpy.concatenate([existing_values, values]))
+            return
+        with open(column_filepath, "r+b") as column_file:
+            column_file.seek(header_length + number_of_rows * values.dtype.itemsize)
+            column_file.write(values.tobytes())
+            column_file.truncate()
+            column_file.seek(0)
+            column_file.write(new_header)
+
+    def replace_column_file(self, column_filepath: str, column: numpy.ndarray) -> None:
+        # Written under a unique name and renamed over the column, so memory maps of the previous file stay valid.
+        file_descriptor, temporary_filepath = tempfile.mkstemp(dir=self.cache_directory, suffix=".tmp.npy")
+        with os.fdopen(file_descriptor, "wb") as column_file:
+            numpy.save(column_file, column)
+        os.replace(temporary_filepath, column_filepath)
+
+    def memory_map_columns(self) -> ActivityColumns:
+        columns = {}
+        for column_name in self.column_names:
+            column_filepath = self.get_column_filepath(column_name)
+            column_shape, _ = self.read_column_header(column_filepath)
+            # Zero-length files cannot be memory-mapped.
+            mmap_mode = "r" if column_shape[0] > 0 else None
+            columns[column_name] = numpy.load(column_filepath, mmap_mode=mmap_mode)
+        return ActivityColumns(**columns)
+
+    def read_manifest(self) -> Optional[dict]:
+        manifest_filepath = os.path.join(self.cache_directory, self.manifest_filename)
+        if not os.path.exists(manifest_filepath):
+            return None
+        with open(manifest_filepath) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("validation") != self.validation:
+            return None
+        return manifest
+
+    def write_manifest(self, activities_filepath: str, source_size: int, source_mtime: float, number_of_activities: int) -> None:
+        manifest = {
+            "source_path": os.path.abspath(activities_filepath),
+            "source_mtime": source_mtime,
+            "parsed_bytes": source_size,
+            "number_of_activities": number_of_activities,
+            "validation": self.validation,
+            "tail_digest": self.calculate_tail_digest(activities_filepath, source_size)
+        }
+        if self.validation == "content":
+            manifest["content_digest"] = self.calculate_content_digest(activities_filepath, source_size)
+        file_descriptor, temporary_filepath = tempfile.mkstemp(dir=self.cache_directory, suffix=".tmp.json")
+        with os.fdopen(file_descriptor, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temporary_filepath, os.path.join(self.cache_directory, self.manifest_filename))
+
+    def get_column_filepath(self, column_name: str) -> str:
+        return os.path.join(self.cache_directory, f"{column_name}.npy")
+
+    def calculate_tail_digest(self, activities_filepath: str, end_offset: int) -> str:
+        start_offset = max(0, end_offset - self.tail_digest_bytes)
+        with open(activities_filepath, "rb") as input_file:
+            input_file.seek(start_offset)
+            return hashlib.sha1(input_file.read(end_offset - start_offset)).hexdigest()
+
+    def calculate_content_digest(self, activities_filepath: str, end_offset: int) -> str:
+        content_hash = hashlib.sha256()
+        with open(activities_filepath, "rb") as input_file:
+            remaining_bytes = end_offset
+            while remaining_bytes > 0:
+                block = input_file.read(min(self.hash_block_bytes, remaining_bytes))
+                if not block:
+                    break
+                remaining_bytes -= len(block)
+                content_hash.update(block)
+        return content_hash.hexdigest()
+
+    @staticmethod
+    def read_column_header(column_filepath: str) -> tuple[tuple, int]:
+        with open(column_filepath, "rb") as column_file:
+            npy_format.read_magic(column_file)
+            column_shape, _, _ = npy_format.read_array_header_1_0(column_file)
+            return column_shape, column_file.tell()
+
+    @staticmethod
+    def serialize_column_header(column_shape: tuple, dtype: numpy.dtype) -> bytes:
+        header = {"descr": npy_format.dtype_to_descr(dtype), "fortran_order": False, "shape": column_shape}
+        header_buffer = io.BytesIO()
+        npy_format.write_array_header_1_0(header_buffer, header)
+        return header_buffer.getvalue()
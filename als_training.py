@@ -0,0 +1,112 @@
+from implicit.als import AlternatingLeastSquares
+
+import time
+import tracemalloc
+import numpy
+import scipy.sparse
+
+
+class TrainingConfig:
+
+    factor_dtypes: dict[str, type] = {"float32": numpy.float32, "float64": numpy.float64}
+
+    def __init__(
+            self,
+            factors: int = 64,
+            iterations: int = 15,
+            regularization: float = 0.05,
+            confidence_scale: float = 2.0,
+            factor_dtype: str = "float32",
+            number_of_threads: int = 0,
+            track_loss: bool = False,
+            early_stopping_tolerance: float = None,
+            early_stopping_patience: int = 1,
+            random_state: int = None
+            ) -> None:
+        if factor_dtype not in self.factor_dtypes:
+            raise ValueError(f"Unknown factor dtype '{factor_dtype}'. Expected one of {tuple(self.factor_dtypes)}.")
+        self.factors = factors
+        self.iterations = iterations
+        self.regularization = regularization
+        self.confidence_scale = confidence_scale
+        self.factor_dtype = factor_dtype
+        # 0 lets implicit use every core.
+        self.number_of_threads = number_of_threads
+        # Early stopping needs the loss, so setting a tolerance turns loss tracking on.
+        self.track_loss = track_loss or early_stopping_tolerance is not None
+        self.early_stopping_tolerance = early_stopping_tolerance
+        self.early_stopping_patience = early_stopping_patience
+        self.random_state = random_state
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, training_config: dict) -> "TrainingConfig":
+        return cls(**training_config)
+
+
+class TrainingConverged(Exception):
+    pass
+
+
+def build_confidence_matrix(matrix_csr: scipy.sparse.csr_matrix, confidence_scale: float) -> scipy.sparse.csr_matrix:
+    # Only the values are copied (as float32, the dtype implicit trains on) and scaled in place; the index arrays are
+    # shared with the score matrix. `confidence_scale * matrix_csr` would copy data, indices and indptr, and implicit
+    # would then copy all three again to cast to float32.
+    confidences = matrix_csr.data.astype(numpy.float32)
+    numpy.multiply(confidences, numpy.float32(confidence_scale), out=confidences)
+    return scipy.sparse.csr_matrix((confidences, matrix_csr.indices, matrix_csr.indptr), shape=matrix_csr.shape, copy=False)
+
+
+def fit_als_model(matrix_csr: scipy.sparse.csr_matrix, training_config: TrainingConfig) -> tuple[AlternatingLeastSquares, dict]:
+    als_model = AlternatingLeastSquares(
+        factors=training_config.factors,
+        regularization=training_config.regularization,
+        dtype=TrainingConfig.factor_dtypes[training_config.factor_dtype],
+        iterations=training_config.iterations,
+        calculate_training_loss=training_config.track_loss,
+        num_threads=training_config.number_of_threads,
+        random_state=training_config.random_state
+        )
+    losses = []
+    stalled_iterations = 0
+
+    def record_iteration(iteration: int, elapsed_seconds: float, loss: float) -> None:
+        # implicit has no early stopping; raising from its per-iteration callback ends fit after the current iteration.
+        nonlocal stalled_iterations
+        if loss is None:
+            return
+        losses.append(float(loss))
+        if training_config.early_stopping_tolerance is None or len(losses) < 2:
+            return
+        relative_improvement = (losses[-2] - losses[-1]) / max(abs(losses[-2]), 1e-12)
+        stalled_iterations = stalled_iterations + 1 if relative_improvement < training_config.early_stopping_tolerance else 0
+        if stalled_iterations >= training_config.early_stopping_patience:
+            raise TrainingConverged()
+
+    started_memory_tracing = not tracemalloc.is_tracing()
+    if started_memory_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    stopped_early = False
+    try:
+        confidence_matrix = build_confidence_matrix(matrix_csr, training_config.confidence_scale)
+        als_model.fit(confidence_matrix, callback=record_iteration)
+    except TrainingConverged:
+        stopped_early = True
+        als_model._check_fit_errors()
+    finally:
+        training_seconds = time.perf_counter() - t0
+        peak_traced_memory_bytes = tracemalloc.get_traced_memory()[1]
+        if started_memory_tracing:
+            tracemalloc.stop()
+    training_report = {
+        "training_seconds": training_seconds,
+        "peak_traced_memory_bytes": peak_traced_memory_bytes,
+        "iterations_run": len(losses) if training_config.track_loss else training_config.iterations,
+        "losses": losses,
+        "stopped_early": stopped_early
+    }
+    return als_model, training_report
@@ -0,0 +1,132 @@
+from utils.utils import select_top_k
+
+from typing import Callable
+
+import numpy
+import scipy.sparse
+
+
+class IVFIndex:
+
+    max_training_sample_size: int = 50_000
+    array_names: tuple[str, ...] = ("centroids", "sorted_item_positions", "sorted_item_factors", "cluster_offsets")
+
+    def __init__(
+            self,
+            item_factors: numpy.ndarray,
+            number_of_clusters: int = None,
+            number_of_probes: int = 8,
+            kmeans_iterations: int = 10,
+            seed: int = 0
+            ) -> None:
+        item_factors = numpy.ascontiguousarray(item_factors, dtype=numpy.float32)
+        number_of_items = len(item_factors)
+        self.number_of_clusters = max(1, min(number_of_clusters or int(numpy.sqrt(number_of_items)), number_of_items))
+        self.number_of_probes = number_of_probes
+        self.kmeans_iterations = kmeans_iterations
+        self.seed = seed
+        self.centroids = self.train_centroids(item_factors)
+        cluster_assignments = numpy.argmax(item_factors @ self.centroids.T, axis=1)
+        # Inverted lists are stored CSR-style: items sorted by cluster plus per-cluster offsets.
+        self.sorted_item_positions = numpy.argsort(cluster_assignments, kind="stable")
+        self.sorted_item_factors = item_factors[self.sorted_item_positions]
+        cluster_sizes = numpy.bincount(cluster_assignments, minlength=self.number_of_clusters)
+        self.cluster_offsets = numpy.concatenate([[0], numpy.cumsum(cluster_sizes)])
+
+    @classmethod
+    def from_arrays(
+            cls,
+            arrays: dict[str, numpy.ndarray],
+            number_of_clusters: int = None,
+            number_of_probes: int = 8,
+            kmeans_iterations: int = 10,
+            seed: int = 0
+            ) -> "IVFIndex":
+        # Restores a saved index without rerunning k-means. The arrays may be read-only memory maps: add_items rebinds
+        # new arrays rather than writing into them.
+        ann_index = cls.__new__(cls)
+        ann_index.number_of_clusters = len(arrays["centroids"])
+        ann_index.number_of_probes = number_of_probes
+        ann_index.kmeans_iterations = kmeans_iterations
+        ann_index.seed = seed
+        for array_name in cls.array_names:
+            setattr(ann_index, array_name, arrays[array_name])
+        return ann_index
+
+    @property
+    def arrays(self) -> dict[str, numpy.ndarray]:
+        return {array_name: getattr(self, array_name) for array_name in self.array_names}
+
+    def train_centroids(self, item_factors: numpy.ndarray) -> numpy.ndarray:
+        # Spherical k-means: inner-product search cares about directions more than magnitudes.
+        random_generator = numpy.random.default_rng(self.seed)
+        item_norms = numpy.linalg.norm(item_factors, axis=1, keepdims=True)
+        normalized_item_factors = item_factors / numpy.maximum(item_norms, 1e-10)
+        if len(normalized_item_factors) > self.max_training_sample_size:
+            sample_positions = random_generator.choice(len(normalized_item_factors), self.max_training_sample_size, replace=False)
+            normalized_item_factors = normalized_item_factors[sample_positions]
+        number_of_samples = len(normalized_item_factors)
+        centroids = normalized_item_factors[random_generator.choice(number_of_samples, self.number_of_clusters, replace=False)]
+        for _ in range(self.kmeans_iterations):
+            cluster_assignments = numpy.argmax(normalized_item_factors @ centroids.T, axis=1)
+            assignment_matrix = scipy.sparse.csr_matrix(
+                (numpy.ones(number_of_samples, dtype=numpy.float32), (cluster_assignments, numpy.arange(number_of_samples))),
+                shape=(self.number_of_clusters, number_of_samples)
+                )
+            centroid_sums = numpy.asarray(assignment_matrix @ normalized_item_factors)
+            centroid_norms = numpy.linalg.norm(centroid_sums, axis=1)
+            empty_clusters = centroid_norms == 0
+            centroid_sums[empty_clusters] = normalized_item_factors[random_generator.choice(number_of_samples, empty_clusters.sum())]
+            centroid_norms[empty_clusters] = 1.0
+            centroids = centroid_sums / centroid_norms[:, numpy.newaxis]
+        return centroids.astype(numpy.float32)
+
+    def search(
+            self, 
+            query_factors: numpy.ndarray, 
+            k: int, 
+            is_eligible: Callable[[int, numpy.ndarray], numpy.ndarray] = None
+            ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        query_factors = numpy.atleast_2d(numpy.asarray(query_factors, dtype=numpy.float32))
+        k = min(k, len(self.sorted_item_positions))
+        cluster_order = numpy.argsort(-(query_factors @ self.centroids.T), axis=1)
+        cluster_sizes = numpy.diff(self.cluster_offsets)
+        positions = numpy.full((len(query_factors), k), -1, dtype=numpy.int64)
+        scores = numpy.full((len(query_factors), k), -numpy.inf, dtype=numpy.float32)
+        for query_idx, query_factor in enumerate(query_factors):
+            probed_clusters = self.select_probed_clusters(cluster_order[query_idx], cluster_sizes, k)
+            candidate_positions = numpy.concatenate([
+                numpy.arange(self.cluster_offsets[cluster], self.cluster_offsets[cluster + 1]) for cluster in probed_clusters
+                ])
+            if is_eligible is not None:
+                # Ineligible items are dropped before scoring; when the probed clusters hold fewer than k eligible items
+                # every cluster is searched, so the query still gets k results if that many exist.
+                is_candidate_eligible = is_eligible(query_idx, self.sorted_item_positions[candidate_positions])
+                if is_candidate_eligible.sum() < k:
+                    candidate_positions = numpy.arange(len(self.sorted_item_positions))
+                    is_candidate_eligible = is_eligible(query_idx, self.sorted_item_positions)
+                candidate_positions = candidate_positions[is_candidate_eligible]
+            candidate_scores = self.sorted_item_factors[candidate_positions] @ query_factor
+            top_k_candidates, top_k_scores = select_top_k(candidate_scores[numpy.newaxis, :], k)
+            number_of_results = top_k_candidates.shape[1]
+            positions[query_idx, :number_of_results] = self.sorted_item_positions[candidate_positions[top_k_candidates[0]]]
+            scores[query_idx, :number_of_results] = top_k_scores[0]
+        return positions, scores
+
+    def select_probed_clusters(self, ranked_clusters: numpy.ndarray, cluster_sizes: numpy.ndarray, k: int) -> numpy.ndarray:
+        # Probe further clusters when the first ones hold fewer than k items, so every query returns exactly k results.
+        candidate_counts = numpy.cumsum(cluster_sizes[ranked_clusters])
+        number_of_probes = max(self.number_of_probes, int(numpy.searchsorted(candidate_counts, k)) + 1)
+        return ranked_clusters[:number_of_probes]
+
+    def add_items(self, item_factors: numpy.ndarray) -> None:
+        # New items take the next positions and join the inverted list of their nearest centroid.
+        item_factors = numpy.ascontiguousarray(item_factors, dtype=numpy.float32)
+        new_item_positions = numpy.arange(len(self.sorted_item_positions), len(self.sorted_item_positions) + len(item_factors))
+        cluster_assignments = numpy.argmax(item_factors @ self.centroids.T, axis=1)
+        assignment_order = numpy.argsort(cluster_assignments, kind="stable")
+        insert_positions = self.cluster_offsets[cluster_assignments[assignment_order] + 1]
+        self.sorted_item_positions = numpy.insert(self.sorted_item_positions, insert_positions, new_item_positions[assignment_order])
+        self.sorted_item_factors = numpy.insert(self.sorted_item_factors, insert_positions, item_factors[assignment_order], axis=0)
+        cluster_sizes = numpy.diff(self.cluster_offsets) + numpy.bincount(cluster_assignments, minlength=self.number_of_clusters)
+        self.cluster_offsets = numpy.concatenate([[0], numpy.cumsum(cluster_sizes)])
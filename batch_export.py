@@ -0,0 +1,90 @@
+from recommender import Recommender
+from utils.utils import for_each_top_k_block
+
+import argparse
+import json
+import os
+import time
+import numpy
+from numpy.lib.format import open_memmap
+
+
+def export_recommendations(
+        recommender: Recommender,
+        output_directory: str,
+        number_of_recommendations: int = 10,
+        block_size: int = 2048,
+        number_of_workers: int = None
+        ) -> str:
+    number_of_workers = number_of_workers or os.cpu_count()
+    user_factors = recommender.get_user_factors(numpy.arange(len(recommender.als_model.user_factors)))
+    number_of_users = len(user_factors)
+    number_of_recommendations = min(number_of_recommendations, len(recommender.als_model.item_factors))
+    os.makedirs(output_directory, exist_ok=True)
+    numpy.save(
+        os.path.join(output_directory, "user_ids.npy"),
+        recommender.matrix_row_user_index.get_entity_ids(numpy.arange(number_of_users))
+        )
+    exported_job_ids = open_memmap(
+        os.path.join(output_directory, "job_ids.npy"),
+        mode="w+",
+        dtype=numpy.int32,
+        shape=(number_of_users, number_of_recommendations)
+        )
+    exported_scores = open_memmap(
+        os.path.join(output_directory, "scores.npy"),
+        mode="w+",
+        dtype=numpy.float32,
+        shape=(number_of_users, number_of_recommendations)
+        )
+
+    def mask_block(block_start: int, block_end: int, block_scores: numpy.ndarray) -> None:
+        recommender.mask_ineligible_jobs(numpy.arange(block_start, block_end), block_scores)
+
+    def export_block(block_start: int, block_end: int, job_matrix_column_idx: numpy.ndarray, scores: numpy.ndarray) -> None:
+        # Users with fewer eligible jobs than number_of_recommendations are padded with job id -1.
+        job_ids = recommender.matrix_column_job_index.get_entity_ids(job_matrix_column_idx)
+        exported_job_ids[block_start:block_end] = numpy.where(scores > -numpy.inf, job_ids, -1)
+        exported_scores[block_start:block_end] = scores
+
+    t0 = time.time()
+    for_each_top_k_block(
+        user_factors, 
+        recommender.als_model.item_factors, 
+        number_of_recommendations, 
+        export_block, 
+        block_size, 
+        number_of_workers,
+        mask_block
+        )
+    exported_job_ids.flush()
+    exported_scores.flush()
+    t1 = time.time()
+    manifest = {
+        "model_version": getattr(recommender, "model_version", None),
+        "number_of_users": number_of_users,
+        "number_of_recommendations": number_of_recommendations,
+        "block_size": block_size,
+        "number_of_workers": number_of_workers,
+        "export_duration_seconds": t1 - t0
+    }
+    with open(os.path.join(output_directory, "manifest.json"), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+    return output_directory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the top-N job recommendations for every user to .npy files.")
+    parser.add_argument("--artifacts", default="artifacts", help="Root directory of the versioned model artifacts.")
+    parser.add_argument("--model-version", default=None, help="Model version to export. Defaults to the latest.")
+    parser.add_argument("--output", required=True, help="Directory receiving user_ids.npy, job_ids.npy and scores.npy.")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--block-size", type=int, default=2048)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--jobs", default=None, help="Job catalog (jobs.jsonl); closed and expired jobs are not exported.")
+    args = parser.parse_args()
+    recommender = Recommender.load_model(args.artifacts, args.model_version)
+    if args.jobs is not None:
+        recommender.load_job_catalog(args.jobs)
+    export_recommendations(recommender, args.output, args.top_n, args.block_size, args.workers)
+    print(f"Recommendations exported to {args.output}")
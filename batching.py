@@ -0,0 +1,59 @@
+from typing import Any, Callable
+
+import asyncio
+
+
+class RecommendationBatcher:
+
+    def __init__(
+            self,
+            score_batch: Callable[[Any, list[int], int], dict],
+            batch_window_seconds: float = 0.002,
+            max_batch_size: int = 64
+            ) -> None:
+        self.score_batch = score_batch
+        self.batch_window_seconds = batch_window_seconds
+        self.max_batch_size = max_batch_size
+        # Requests are batched per (model, N): each request is scored on the model it was submitted with, even when a
+        # swap or an update publishes a new model before its batch is flushed.
+        self.pending_requests: dict[tuple[Any, int], list[tuple[int, asyncio.Future]]] = {}
+        self.flush_handles: dict[tuple[Any, int], asyncio.TimerHandle] = {}
+        self.running_batches: set[asyncio.Task] = set()
+
+    async def submit(self, model: Any, user_id: int, number_of_recommendations: int = 10) -> list[dict]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch_key = (model, number_of_recommendations)
+        pending_requests = self.pending_requests.setdefault(batch_key, [])
+        pending_requests.append((user_id, future))
+        if len(pending_requests) >= self.max_batch_size:
+            self.flush(batch_key)
+        elif batch_key not in self.flush_handles:
+            self.flush_handles[batch_key] = loop.call_later(self.batch_window_seconds, self.flush, batch_key)
+        return await future
+
+    def flush(self, batch_key: tuple[Any, int]) -> None:
+        flush_handle = self.flush_handles.pop(batch_key, None)
+        if flush_handle is not None:
+            flush_handle.cancel()
+        batch = self.pending_requests.pop(batch_key, [])
+        if not batch:
+            return
+        batch_task = asyncio.get_running_loop().create_task(self.run_batch(batch, *batch_key))
+        self.running_batches.add(batch_task)
+        batch_task.add_done_callback(self.running_batches.discard)
+
+    async def run_batch(self, batch: list[tuple[int, asyncio.Future]], model: Any, number_of_recommendations: int) -> None:
+        # Duplicate user ids in a batch are scored once and fanned out to every waiting caller.
+        user_ids = list(dict.fromkeys(user_id for user_id, _ in batch))
+        loop = asyncio.get_running_loop()
+        try:
+            batch_response = await loop.run_in_executor(None, self.score_batch, model, user_ids, number_of_recommendations)
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for user_id, future in batch:
+            if not future.done():
+                future.set_result(batch_response.get(user_id, []))
@@ -0,0 +1,58 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ann_index import IVFIndex
+from utils.utils import select_top_k
+
+
+def generate_clustered_factors(number_of_vectors: int, cluster_centers: numpy.ndarray, noise: float, random_generator) -> numpy.ndarray:
+    # ALS factors are far from isotropic; a mixture of Gaussians is a closer stand-in than pure noise.
+    assignments = random_generator.integers(0, len(cluster_centers), number_of_vectors)
+    noise_factors = noise * random_generator.standard_normal((number_of_vectors, cluster_centers.shape[1]), dtype=numpy.float32)
+    return cluster_centers[assignments] + noise_factors
+
+
+def recall_at_k(found_positions: numpy.ndarray, exact_positions: numpy.ndarray) -> float:
+    k = exact_positions.shape[1]
+    overlaps = [len(set(found) & set(exact)) for found, exact in zip(found_positions.tolist(), exact_positions.tolist())]
+    return float(numpy.mean(overlaps)) / k
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@10 and latency of the IVF index against the exact scan.")
+    parser.add_argument("--catalog-sizes", type=int, nargs="+", default=[7_500, 50_000, 200_000, 500_000])
+    parser.add_argument("--probes", type=int, nargs="+", default=[4, 8, 16, 32])
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=1.0)
+    args = parser.parse_args()
+
+    random_generator = numpy.random.default_rng(0)
+    cluster_centers = random_generator.standard_normal((256, args.factors), dtype=numpy.float32)
+    query_factors = generate_clustered_factors(args.queries, cluster_centers, args.noise, random_generator)
+    print(f"{'jobs':>8} {'clusters':>8} {'probes':>7} {'build s':>8} {'recall@10':>10} {'ann ms/q':>9} {'exact ms/q':>11}")
+    for catalog_size in args.catalog_sizes:
+        item_factors = generate_clustered_factors(catalog_size, cluster_centers, args.noise, random_generator)
+        t0 = time.perf_counter()
+        exact_positions = numpy.vstack([
+            select_top_k((query_factor @ item_factors.T)[numpy.newaxis, :], 10)[0] for query_factor in query_factors
+            ])
+        exact_milliseconds = 1e3 * (time.perf_counter() - t0) / args.queries
+        t0 = time.perf_counter()
+        ann_index = IVFIndex(item_factors)
+        build_seconds = time.perf_counter() - t0
+        for number_of_probes in args.probes:
+            ann_index.number_of_probes = number_of_probes
+            t0 = time.perf_counter()
+            ann_positions = numpy.vstack([ann_index.search(query_factor, 10)[0] for query_factor in query_factors])
+            ann_milliseconds = 1e3 * (time.perf_counter() - t0) / args.queries
+            print(
+                f"{catalog_size:>8} {ann_index.number_of_clusters:>8} {number_of_probes:>7} {build_seconds:>8.2f} "
+                f"{recall_at_k(ann_positions, exact_positions):>10.3f} {ann_milliseconds:>9.3f} {exact_milliseconds:>11.3f}"
+                )
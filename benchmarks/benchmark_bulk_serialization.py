@@ -0,0 +1,61 @@
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmark_query_latency import build_recommender_with_random_factors
+from bulk_serialization import iter_encoded_recommendations
+
+
+def measure(function) -> tuple[float, float, int]:
+    # Seconds of one call, traced peak memory (MB) of a second call (tracing slows allocations down), and the body size.
+    t0 = time.perf_counter()
+    body = function()
+    duration_seconds = time.perf_counter() - t0
+    del body
+    tracemalloc.start()
+    body = function()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration_seconds, peak_bytes / 1e6, len(body)
+
+
+def render_default_response(recommender, user_ids: list[int], number_of_recommendations: int) -> bytes:
+    # What FastAPI does with the dict returned by the bulk endpoint: jsonable_encoder, then JSONResponse.
+    response = recommender.get_job_recommendations_for_bulk_users(user_ids, number_of_recommendations)
+    return JSONResponse(jsonable_encoder(response)).body
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk recommendation response time, peak memory and size per response format.")
+    parser.add_argument("--bulk-sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 50_000])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--jobs", type=int, default=7_500)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    recommender = build_recommender_with_random_factors(args.users, args.jobs)
+    user_ids = recommender.entity_indices["unique_users"]
+    print(f"{'users':>7} {'format':>8} {'seconds':>8} {'peak MB':>8} {'body MB':>8}")
+    for bulk_size in args.bulk_sizes:
+        bulk_user_ids = user_ids[:bulk_size]
+        measure(lambda: recommender.get_job_recommendation_arrays_for_bulk_users(bulk_user_ids[:10], args.top_n))
+        candidates = [
+            ("scoring", lambda: recommender.get_job_recommendation_arrays_for_bulk_users(bulk_user_ids, args.top_n)[1]),
+            ("default", lambda: render_default_response(recommender, bulk_user_ids, args.top_n))
+            ]
+        for response_format in ("json", "ndjson", "binary"):
+            candidates.append((response_format, lambda response_format=response_format: b"".join(
+                iter_encoded_recommendations(recommender, bulk_user_ids, response_format, args.top_n, chunk_size=args.chunk_size)
+                )))
+        for name, function in candidates:
+            duration_seconds, peak_megabytes, body_size = measure(function)
+            body_megabytes = body_size / 1e6 if name != "scoring" else 0.0
+            print(f"{bulk_size:>7} {name:>8} {duration_seconds:>8.3f} {peak_megabytes:>8.1f} {body_megabytes:>8.2f}")
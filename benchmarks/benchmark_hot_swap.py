@@ -0,0 +1,105 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmark_sharded_ingestion import write_random_activities
+from model_manager import ModelManager
+
+
+def run_clients(
+        model_manager: ModelManager, 
+        user_ids: list[int], 
+        concurrency: int, 
+        think_time_seconds: float, 
+        keep_running
+        ) -> list[tuple[float, float, str]]:
+    samples = []
+
+    def client(seed: int) -> None:
+        random_generator = numpy.random.default_rng(seed)
+        while keep_running():
+            user_id = user_ids[random_generator.integers(len(user_ids))]
+            t0 = time.perf_counter()
+            recommender = model_manager.recommender
+            recommender.get_job_recommendations_for_single_user(user_id)
+            t1 = time.perf_counter()
+            samples.append((t0, t1 - t0, recommender.model_version))
+            time.sleep(think_time_seconds)
+
+    client_threads = [threading.Thread(target=client, args=(seed,)) for seed in range(concurrency)]
+    for client_thread in client_threads:
+        client_thread.start()
+    for client_thread in client_threads:
+        client_thread.join()
+    return samples
+
+
+def report(label: str, latencies: numpy.ndarray, window_seconds: float) -> None:
+    if len(latencies) == 0:
+        print(f"{label:>16} {'-':>10}")
+        return
+    latencies_ms = latencies * 1e3
+    print(
+        f"{label:>16} {len(latencies) / window_seconds:>10.0f} {numpy.percentile(latencies_ms, 50):>9.3f} "
+        f"{numpy.percentile(latencies_ms, 99):>9.3f} {latencies_ms.max():>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure request latency before, during and after a background retrain and model swap.")
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--retrain-after", type=float, default=5.0)
+    parser.add_argument("--think-time-ms", type=float, default=1.0, help="Pause between a client's requests.")
+    parser.add_argument("--training-niceness", type=int, default=ModelManager.training_process_niceness)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        activities_filepath = os.path.join(temporary_directory, "activities.jsonl")
+        write_random_activities(activities_filepath, args.events)
+        ModelManager.training_process_niceness = args.training_niceness
+        model_manager = ModelManager(os.path.join(temporary_directory, "artifacts"), activities_filepath)
+        initial_model_version = model_manager.load_or_train().model_version
+        user_ids = model_manager.recommender.entity_indices["unique_users"]
+        retrain_window = {}
+
+        def trigger_retrain() -> None:
+            time.sleep(args.retrain_after)
+            retrain_window["start"] = time.perf_counter()
+            model_manager.retrain().result()
+            retrain_window["end"] = time.perf_counter()
+
+        retrain_thread = threading.Thread(target=trigger_retrain)
+        benchmark_start = time.perf_counter()
+        retrain_thread.start()
+        # Clients keep running for the requested duration and at least a few seconds past the swap.
+        deadline = benchmark_start + args.duration
+        samples = run_clients(
+            model_manager, 
+            user_ids, 
+            args.concurrency, 
+            args.think_time_ms / 1000, 
+            lambda: time.perf_counter() < max(deadline, retrain_window.get("end", float("inf")) + 3.0)
+            )
+        retrain_thread.join()
+        benchmark_end = time.perf_counter()
+        model_manager.stop()
+
+    start_times = numpy.array([start_time for start_time, _, _ in samples])
+    latencies = numpy.array([latency for _, latency, _ in samples])
+    retrain_start, retrain_end = retrain_window["start"], retrain_window["end"]
+    print(f"{os.cpu_count()} cpus, {args.events} events, concurrency {args.concurrency}, retrain took {retrain_end - retrain_start:.1f} s")
+    print(f"model versions served: {initial_model_version} -> {model_manager.recommender.model_version}")
+    print(f"{'window':>16} {'rps':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    report("before retrain", latencies[start_times < retrain_start], retrain_start - benchmark_start)
+    report("during retrain", latencies[(start_times >= retrain_start) & (start_times < retrain_end)], retrain_end - retrain_start)
+    report("after swap", latencies[start_times >= retrain_end], max(benchmark_end - retrain_end, 1e-9))
@@ -0,0 +1,57 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from als_training import TrainingConfig
+from recommender import Recommender
+from synthetic_data import generate_activity_columns
+
+
+def generate_update_batches(number_of_users: int, number_of_jobs: int, number_of_batches: int, batch_size: int, seed: int = 1) -> list[list[dict]]:
+    # Ids range 1% past the trained ones, so batches add new pairs and the odd new user or job.
+    random_generator = numpy.random.default_rng(seed)
+    batches = []
+    for _ in range(number_of_batches):
+        user_ids = random_generator.integers(1, int(number_of_users * 1.01) + 1, batch_size).tolist()
+        job_ids = random_generator.integers(1, int(number_of_jobs * 1.01) + 1, batch_size).tolist()
+        activity_types = random_generator.choice(["impression", "redirect"], batch_size).tolist()
+        batches.append([
+            {"user_id": user_id, "job_id": job_id, "type": activity_type}
+            for user_id, job_id, activity_type in zip(user_ids, job_ids, activity_types)
+            ])
+    return batches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of small incremental updates against the size of the model.")
+    parser.add_argument("--events", type=int, nargs="+", default=[200_000, 1_000_000, 4_000_000])
+    parser.add_argument("--events-per-user", type=int, default=20)
+    parser.add_argument("--events-per-job", type=int, default=200)
+    parser.add_argument("--batches", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{'events':>10} {'stored pairs':>13} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'merges':>7}")
+    for number_of_events in args.events:
+        number_of_users = number_of_events // args.events_per_user
+        number_of_jobs = number_of_events // args.events_per_job
+        recommender = Recommender.from_activity_columns(generate_activity_columns(number_of_users, number_of_jobs, number_of_events))
+        recommender.build_sparse_matrix()
+        recommender.train_als_model(TrainingConfig(iterations=2))
+        recommender.build_matrix_pair_counts()
+        number_of_stored_pairs = recommender.matrix_csr.nnz
+        durations = []
+        number_of_merges = 0
+        for batch in generate_update_batches(number_of_users, number_of_jobs, args.batches, args.batch_size):
+            matrix_csr = recommender.matrix_csr
+            t0 = time.perf_counter()
+            recommender.update_with_activities(batch)
+            durations.append(time.perf_counter() - t0)
+            number_of_merges += recommender.matrix_csr is not matrix_csr
+        p50, p99, maximum = numpy.percentile(durations, [50, 99, 100]) * 1000
+        print(f"{number_of_events:>10} {number_of_stored_pairs:>13} {p50:>8.2f} {p99:>8.2f} {maximum:>8.2f} {number_of_merges:>7}")
@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batching import RecommendationBatcher
+from benchmark_query_latency import build_recommender_with_random_factors
+from recommender import Recommender
+
+
+async def run_clients(handle_request, user_ids: list[int], concurrency: int, duration_seconds: float) -> list[float]:
+    latencies = []
+    deadline = time.perf_counter() + duration_seconds
+    random_generator = numpy.random.default_rng(0)
+
+    async def client() -> None:
+        while time.perf_counter() < deadline:
+            user_id = user_ids[random_generator.integers(len(user_ids))]
+            t0 = time.perf_counter()
+            await handle_request(user_id)
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies
+
+
+def report(label: str, latencies: list[float], duration_seconds: float) -> None:
+    latencies_ms = numpy.array(latencies) * 1e3
+    print(
+        f"{label:>28} {len(latencies) / duration_seconds:>10.0f} "
+        f"{numpy.percentile(latencies_ms, 50):>9.2f} {numpy.percentile(latencies_ms, 99):>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-request scoring with micro-batched scoring under concurrent load.")
+    parser.add_argument("--users", type=int, default=17_000)
+    parser.add_argument("--jobs", type=int, default=7_500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--batch-window-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    recommender = build_recommender_with_random_factors(args.users, args.jobs)
+    user_ids = recommender.entity_indices["unique_users"]
+    print(f"{'mode':>28} {'rps':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for concurrency in args.concurrency:
+        async def handle_request_directly(user_id: int) -> list[dict]:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, recommender.get_job_recommendations_for_single_user, user_id)
+
+        batcher = RecommendationBatcher(
+            Recommender.get_job_recommendations_for_bulk_users,
+            batch_window_seconds=args.batch_window_ms / 1000,
+            max_batch_size=args.max_batch_size
+            )
+        latencies = asyncio.run(run_clients(handle_request_directly, user_ids, concurrency, args.duration))
+        report(f"per-request c={concurrency}", latencies, args.duration)
+        async def handle_request_in_batch(user_id: int) -> list[dict]:
+            return await batcher.submit(recommender, user_id)
+
+        latencies = asyncio.run(run_clients(handle_request_in_batch, user_ids, concurrency, args.duration))
+        report(f"micro-batched c={concurrency}", latencies, args.duration)
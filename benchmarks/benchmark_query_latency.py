@@ -0,0 +1,52 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy
+import scipy.sparse
+from implicit.als import AlternatingLeastSquares
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from entity_index import EntityIndex
+from recommender import Recommender
+
+
+def build_recommender_with_random_factors(number_of_users: int, number_of_jobs: int, factors: int = 64, seed: int = 0) -> Recommender:
+    random_generator = numpy.random.default_rng(seed)
+    unique_users = numpy.sort(random_generator.choice(number_of_users * 10, size=number_of_users, replace=False))
+    unique_jobs = numpy.arange(number_of_jobs)
+    recommender = Recommender.__new__(Recommender)
+    recommender.entity_indices = {"unique_users": unique_users.tolist(), "unique_jobs": unique_jobs.tolist()}
+    recommender.matrix_row_user_index = EntityIndex(unique_users)
+    recommender.matrix_column_job_index = EntityIndex(unique_jobs)
+    recommender.matrix_csr = scipy.sparse.csr_matrix((number_of_users, number_of_jobs), dtype=numpy.float32)
+    als_model = AlternatingLeastSquares(factors=factors)
+    als_model.user_factors = random_generator.standard_normal((number_of_users, factors), dtype=numpy.float32)
+    als_model.item_factors = random_generator.standard_normal((number_of_jobs, factors), dtype=numpy.float32)
+    recommender.als_model = als_model
+    return recommender
+
+
+def time_per_call(function, repetitions: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repetitions):
+        function()
+    return (time.perf_counter() - t0) / repetitions
+
+
+if __name__ == "__main__":
+    # The last column is the cost of the former `user_id in list` membership check for a single user.
+    number_of_jobs = 7_500
+    bulk_size = 100
+    print(f"{'users':>10} {'single ms':>10} {'bulk ms':>10} {'similar ms':>11} {'list scan ms':>13}")
+    for number_of_users in (10_000, 100_000, 1_000_000):
+        recommender = build_recommender_with_random_factors(number_of_users, number_of_jobs)
+        user_ids = recommender.entity_indices["unique_users"]
+        last_user_id = user_ids[-1]
+        bulk_user_ids = user_ids[-bulk_size:]
+        single_ms = 1e3 * time_per_call(lambda: recommender.get_job_recommendations_for_single_user(last_user_id), 200)
+        bulk_ms = 1e3 * time_per_call(lambda: recommender.get_job_recommendations_for_bulk_users(bulk_user_ids), 20)
+        similar_ms = 1e3 * time_per_call(lambda: recommender.find_similar_jobs(number_of_jobs - 1), 200)
+        list_scan_ms = 1e3 * time_per_call(lambda: last_user_id in user_ids, 20)
+        print(f"{number_of_users:>10} {single_ms:>10.3f} {bulk_ms:>10.3f} {similar_ms:>11.3f} {list_scan_ms:>13.3f}")
@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ingestion import read_pair_counts_sharded
+
+
+def write_random_activities(activities_filepath: str, number_of_events: int, seed: int = 0) -> None:
+    random_generator = numpy.random.default_rng(seed)
+    user_ids = random_generator.integers(1, 170_000, size=number_of_events)
+    job_ids = random_generator.zipf(1.3, size=number_of_events) % 75_000
+    is_redirect = random_generator.random(number_of_events) < 0.2
+    timestamps = 1.6e9 + numpy.sort(random_generator.random(number_of_events)) * 3e7
+    with open(activities_filepath, "w") as output_file:
+        for user_id, job_id, redirect, timestamp in zip(user_ids.tolist(), job_ids.tolist(), is_redirect.tolist(), timestamps.tolist()):
+            activity = {
+                "timestamp": timestamp,
+                "job_id": job_id,
+                "user_id": user_id,
+                "type": "redirect" if redirect else "impression"
+                }
+            output_file.write(json.dumps(activity) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time sharded ingestion of an activity log on 1/2/4/8 workers.")
+    parser.add_argument("--activities", help="Existing activities.jsonl. A random one is generated when omitted.")
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--chunk-size-mb", type=float, default=16)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        activities_filepath = args.activities
+        if activities_filepath is None:
+            activities_filepath = os.path.join(temporary_directory, "activities.jsonl")
+            write_random_activities(activities_filepath, args.events)
+        file_megabytes = os.path.getsize(activities_filepath) / 2**20
+        chunk_size_bytes = int(args.chunk_size_mb * 2**20)
+        print(f"{activities_filepath}: {file_megabytes:.0f} MB, chunk size {args.chunk_size_mb} MB, {os.cpu_count()} cpus")
+        print(f"{'workers':>8} {'seconds':>10} {'MB/s':>10} {'speedup':>10} {'pairs':>10} {'worker max RSS MB':>18}")
+        baseline_duration = None
+        for number_of_workers in args.workers:
+            t0 = time.perf_counter()
+            pair_counts = read_pair_counts_sharded(activities_filepath, number_of_workers, chunk_size_bytes)
+            duration = time.perf_counter() - t0
+            baseline_duration = baseline_duration or duration
+            worker_max_rss_megabytes = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 2**10
+            print(
+                f"{number_of_workers:>8} {duration:>10.2f} {file_megabytes / duration:>10.1f} "
+                f"{baseline_duration / duration:>10.2f} {len(pair_counts):>10} {worker_max_rss_megabytes:>18.0f}"
+                )
@@ -0,0 +1,50 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmark_query_latency import build_recommender_with_random_factors
+
+
+def measure_latencies_ms(function, repetitions: int) -> numpy.ndarray:
+    function()
+    latencies = []
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - t0)
+    return 1e3 * numpy.array(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single-user and bulk latency of sharded scatter-gather scoring against the number of shards.")
+    parser.add_argument("--catalog-sizes", type=int, nargs="+", default=[100_000, 500_000, 2_000_000])
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4], help="0 scores in the serving process.")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--bulk-size", type=int, default=64)
+    parser.add_argument("--repetitions", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'jobs':>9} {'shards':>7} {'start s':>8} {'single p50 ms':>14} {'single p95 ms':>14} {'bulk p50 ms':>12} {'bulk p95 ms':>12}")
+    for catalog_size in args.catalog_sizes:
+        recommender = build_recommender_with_random_factors(args.users, catalog_size, args.factors)
+        user_ids = recommender.entity_indices["unique_users"]
+        bulk_user_ids = user_ids[:args.bulk_size]
+        for number_of_shards in args.shards:
+            t0 = time.perf_counter()
+            if number_of_shards:
+                recommender.enable_sharded_scoring(number_of_shards)
+            start_seconds = time.perf_counter() - t0
+            single_latencies_ms = measure_latencies_ms(lambda: recommender.get_job_recommendations_for_single_user(user_ids[-1]), args.repetitions)
+            bulk_latencies_ms = measure_latencies_ms(lambda: recommender.get_job_recommendations_for_bulk_users(bulk_user_ids), max(args.repetitions // 5, 1))
+            recommender.disable_sharded_scoring()
+            print(
+                f"{catalog_size:>9} {number_of_shards:>7} {start_seconds:>8.2f} "
+                f"{numpy.percentile(single_latencies_ms, 50):>14.2f} {numpy.percentile(single_latencies_ms, 95):>14.2f} "
+                f"{numpy.percentile(bulk_latencies_ms, 50):>12.2f} {numpy.percentile(bulk_latencies_ms, 95):>12.2f}"
+                )
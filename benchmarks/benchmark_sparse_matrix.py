@@ -0,0 +1,62 @@
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from recommender import Recommender
+
+
+def build_recommender_from_random_triples(number_of_users: int, number_of_jobs: int, number_of_pairs: int, seed: int = 0) -> Recommender:
+    random_generator = numpy.random.default_rng(seed)
+    pair_keys = numpy.unique(random_generator.integers(0, number_of_users * number_of_jobs, size=number_of_pairs))
+    user_ids = (pair_keys // number_of_jobs).tolist()
+    job_ids = (pair_keys % number_of_jobs).tolist()
+    implicit_scores = random_generator.integers(1, 31, size=len(pair_keys)).tolist()
+    recommender = Recommender.__new__(Recommender)
+    recommender.user_job_implicit_scores = [
+        Recommender.generate_user_job_triple(user_id, job_id, implicit_score)
+        for user_id, job_id, implicit_score in zip(user_ids, job_ids, implicit_scores)
+        ]
+    recommender.entity_indices = {
+        "unique_users": sorted(set(user_ids)),
+        "unique_jobs": sorted(set(job_ids))
+        }
+    return recommender
+
+
+def measure_build_sparse_matrix(recommender: Recommender) -> tuple[float, int]:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    recommender.build_sparse_matrix()
+    t1 = time.perf_counter()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return t1 - t0, peak_bytes
+
+
+if __name__ == "__main__":
+    # Fixed catalog, growing nnz: peak memory should grow linearly with nnz.
+    # Growing catalog, fixed nnz: peak memory should stay flat (no users x jobs allocation).
+    scenarios = [
+        (17_000, 7_500, 50_000),
+        (17_000, 7_500, 100_000),
+        (17_000, 7_500, 200_000),
+        (17_000, 7_500, 400_000),
+        (170_000, 75_000, 200_000),
+        (1_700_000, 750_000, 200_000),
+    ]
+    print(f"{'users':>10} {'jobs':>10} {'nnz':>10} {'seconds':>10} {'peak MB':>10} {'bytes/nnz':>10} {'dense MB':>10}")
+    for number_of_users, number_of_jobs, number_of_pairs in scenarios:
+        recommender = build_recommender_from_random_triples(number_of_users, number_of_jobs, number_of_pairs)
+        duration, peak_bytes = measure_build_sparse_matrix(recommender)
+        nnz = recommender.matrix_csr.nnz
+        number_of_rows, number_of_columns = recommender.matrix_csr.shape
+        dense_megabytes = number_of_rows * number_of_columns * 8 / 2**20
+        print(
+            f"{number_of_users:>10} {number_of_jobs:>10} {nnz:>10} {duration:>10.3f} "
+            f"{peak_bytes / 2**20:>10.1f} {peak_bytes / nnz:>10.1f} {dense_megabytes:>10.0f}"
+            )
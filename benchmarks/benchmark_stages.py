@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from recommender import Recommender
+from synthetic_data import generate_activity_columns, write_activities
+from utils.utils import nested_default_dict
+
+
+def measure_stage(stage_function, repetitions: int, trace_memory: bool) -> dict:
+    t0 = time.perf_counter()
+    for _ in range(repetitions):
+        stage_function()
+    stage_measurement = {"seconds": (time.perf_counter() - t0) / repetitions, "repetitions": repetitions}
+    # Memory is measured in a separate traced run because tracemalloc slows allocation-heavy stages down.
+    if trace_memory:
+        tracemalloc.start()
+        stage_function()
+        stage_measurement["peak_traced_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return stage_measurement
+
+
+def build_stage_functions(activities_filepath: str, query_repetitions: int) -> list[tuple[str, object, int]]:
+    nested_recommender = Recommender.__new__(Recommender)
+    nested_recommender.activities_filepath = activities_filepath
+
+    def read_activity_data() -> None:
+        nested_recommender.activities = nested_default_dict()
+        nested_recommender.read_activity_data()
+
+    columnar_recommender = Recommender.__new__(Recommender)
+    columnar_recommender.activities_filepath = activities_filepath
+    columnar_recommender.ingestion_mode = "columnar"
+    columnar_recommender.cache_directory = None
+
+    def read_activity_columns() -> None:
+        columnar_recommender.read_activity_columns()
+        columnar_recommender.add_implicit_score_columns()
+
+    query_state = {}
+
+    def get_query_state() -> dict:
+        # Query arguments are drawn once the entities are known, outside of the timed calls.
+        if not query_state:
+            random_generator = numpy.random.default_rng(0)
+            user_ids = nested_recommender.entity_indices["unique_users"]
+            job_ids = nested_recommender.entity_indices["unique_jobs"]
+            query_state["user_id"] = user_ids[random_generator.integers(len(user_ids))]
+            query_state["bulk_user_ids"] = random_generator.choice(user_ids, size=min(100, len(user_ids)), replace=False).tolist()
+            query_state["job_id"] = job_ids[random_generator.integers(len(job_ids))]
+        return query_state
+
+    stage_functions = [
+        ("read_activity_data", read_activity_data, 1),
+        ("add_implicit_scores", nested_recommender.add_implicit_scores, 1),
+        ("generate_user_job_triples", nested_recommender.generate_user_job_triples, 1),
+        ("get_unique_entities", nested_recommender.get_unique_entities, 1),
+        ("read_activity_columns", read_activity_columns, 1),
+        ("build_sparse_matrix", nested_recommender.build_sparse_matrix, 1),
+        ("train_als_model", nested_recommender.train_als_model, 1),
+        ("build_similar_jobs_table", nested_recommender.build_similar_jobs_table, 1),
+        (
+            "get_job_recommendations_for_single_user",
+            lambda: nested_recommender.get_job_recommendations_for_single_user(get_query_state()["user_id"]),
+            query_repetitions
+        ),
+        (
+            "get_job_recommendations_for_bulk_users",
+            lambda: nested_recommender.get_job_recommendations_for_bulk_users(get_query_state()["bulk_user_ids"]),
+            max(1, query_repetitions // 10)
+        ),
+        ("find_similar_jobs", lambda: nested_recommender.find_similar_jobs(get_query_state()["job_id"]), query_repetitions)
+        ]
+    return stage_functions
+
+
+def benchmark_scale(number_of_events: int, number_of_users: int, number_of_jobs: int, query_repetitions: int, trace_memory: bool) -> dict:
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        activities_filepath = os.path.join(temporary_directory, "activities.jsonl")
+        write_activities(activities_filepath, generate_activity_columns(number_of_users, number_of_jobs, number_of_events))
+        stage_measurements = {}
+        for stage_name, stage_function, repetitions in build_stage_functions(activities_filepath, query_repetitions):
+            stage_measurements[stage_name] = measure_stage(stage_function, repetitions, trace_memory)
+            print(f"{number_of_events:>10} {stage_name:>40} {stage_measurements[stage_name]['seconds']:>12.6f}")
+        scale_result = {
+            "number_of_events": number_of_events,
+            "number_of_users": number_of_users,
+            "number_of_jobs": number_of_jobs,
+            "activities_file_bytes": os.path.getsize(activities_filepath),
+            "stages": stage_measurements
+        }
+    return scale_result
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent
+            ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results: dict, baseline_results: dict) -> None:
+    baseline_scales = {scale["number_of_events"]: scale for scale in baseline_results["scales"]}
+    print(f"{'events':>10} {'stage':>40} {'baseline s':>12} {'current s':>12} {'ratio':>8}")
+    for scale in results["scales"]:
+        baseline_scale = baseline_scales.get(scale["number_of_events"])
+        if baseline_scale is None:
+            continue
+        for stage_name, stage_measurement in scale["stages"].items():
+            baseline_measurement = baseline_scale["stages"].get(stage_name)
+            if baseline_measurement is None:
+                continue
+            ratio = stage_measurement["seconds"] / max(baseline_measurement["seconds"], 1e-12)
+            print(
+                f"{scale['number_of_events']:>10} {stage_name:>40} {baseline_measurement['seconds']:>12.6f} "
+                f"{stage_measurement['seconds']:>12.6f} {ratio:>8.2f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and measure memory of every Recommender stage on synthetic data at several scales.")
+    parser.add_argument("--events", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--events-per-user", type=float, default=10.0)
+    parser.add_argument("--events-per-job", type=float, default=20.0)
+    parser.add_argument("--query-repetitions", type=int, default=200)
+    parser.add_argument("--skip-memory", action="store_true", help="Skip the traced run that measures peak memory.")
+    parser.add_argument("--output", default="stage_benchmark.json")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare stage timings against.")
+    args = parser.parse_args()
+
+    print(f"{'events':>10} {'stage':>40} {'seconds':>12}")
+    scales = [
+        benchmark_scale(
+            number_of_events,
+            max(1, int(number_of_events / args.events_per_user)),
+            max(1, int(number_of_events / args.events_per_job)),
+            args.query_repetitions,
+            not args.skip_memory
+            )
+        for number_of_events in args.events
+        ]
+    results = {
+        "git_commit": get_git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python_version": platform.python_version(),
+        "numpy_version": numpy.__version__,
+        "cpu_count": os.cpu_count(),
+        "scales": scales
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=4)
+    print(f"Results written to {args.output}")
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            compare_results(results, json.load(baseline_file))
@@ -0,0 +1,84 @@
+import argparse
+import http.client
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+repository_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repository_root))
+
+from load_test import find_free_port
+from synthetic_data import generate_activity_columns, write_activities
+from train import train_and_save_model
+
+
+def get_status_code(host: str, port: int, path: str) -> int:
+    connection = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        connection.request("GET", path)
+        return connection.getresponse().status
+    except OSError:
+        return None
+    finally:
+        connection.close()
+
+
+def measure_startup(working_directory: str, background_loading: bool, timeout_seconds: float) -> tuple[float, float]:
+    # Seconds from spawning the server to the first answered liveness probe (listening) and readiness probe (ready).
+    # The server runs in working_directory, so its dataset/ and artifacts/ paths resolve there.
+    host, port = "127.0.0.1", find_free_port()
+    environment = dict(os.environ, RECOMMENDER_BACKGROUND_LOADING="1" if background_loading else "0")
+    t0 = time.perf_counter()
+    server_process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(repository_root),
+            "--host", host, "--port", str(port), "--log-level", "warning"
+        ],
+        cwd=working_directory,
+        env=environment,
+        stdout=subprocess.DEVNULL
+        )
+    try:
+        listening_seconds = None
+        while time.perf_counter() - t0 < timeout_seconds:
+            if server_process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server_process.returncode} during startup.")
+            if listening_seconds is None and get_status_code(host, port, "/health/live") == 200:
+                listening_seconds = time.perf_counter() - t0
+            if listening_seconds is not None and get_status_code(host, port, "/health/ready") == 200:
+                return listening_seconds, time.perf_counter() - t0
+            time.sleep(0.01)
+        raise TimeoutError(f"Server was not ready within {timeout_seconds} seconds.")
+    finally:
+        server_process.terminate()
+        server_process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to listening and time to ready of the API, loading the model before or after listening.")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--jobs", type=int, default=5_000)
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as working_directory:
+        os.makedirs(os.path.join(working_directory, "dataset"))
+        activities_filepath = os.path.join(working_directory, "dataset", "activities.jsonl")
+        write_activities(activities_filepath, generate_activity_columns(args.users, args.jobs, args.events))
+        print(f"{'model':>8} {'loading':>11} {'listening s':>12} {'ready s':>8}")
+        for scenario in ("train", "load"):
+            if scenario == "load":
+                # Artifacts from one training run are memory-mapped on every start.
+                train_and_save_model(activities_filepath, os.path.join(working_directory, "artifacts"))
+            for background_loading in (False, True):
+                for _ in range(args.repetitions):
+                    if scenario == "train":
+                        shutil.rmtree(os.path.join(working_directory, "artifacts"), ignore_errors=True)
+                    listening_seconds, ready_seconds = measure_startup(working_directory, background_loading, args.startup_timeout)
+                    print(f"{scenario:>8} {'background' if background_loading else 'blocking':>11} {listening_seconds:>12.2f} {ready_seconds:>8.2f}")
@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy
+
+repository_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repository_root))
+
+from synthetic_data import generate_activity_columns, write_activities
+from train import train_and_save_model
+
+
+endpoint_paths: dict[str, str] = {
+    "single": "/recommend/jobs_single_user/",
+    "bulk": "/recommend/jobs_multiple_users/",
+    "similar": "/recommend/find_similar_jobs/"
+}
+
+
+class KeepAliveHTTPClient:
+
+    # A minimal HTTP/1.1 client over one persistent connection, so the harness needs nothing beyond the standard library.
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.reader: asyncio.StreamReader = None
+        self.writer: asyncio.StreamWriter = None
+
+    async def connect(self) -> None:
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method: str, path: str, body: bytes = b"") -> tuple[int, bytes]:
+        if self.writer is None:
+            await self.connect()
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection.")
+        status_code = int(status_line.split()[1])
+        content_length = 0
+        while True:
+            header_line = await self.reader.readline()
+            if header_line in (b"\r\n", b""):
+                break
+            header_name, _, header_value = header_line.decode("latin-1").partition(":")
+            if header_name.strip().lower() == "content-length":
+                content_length = int(header_value.strip())
+        response_body = await self.reader.readexactly(content_length)
+        return status_code, response_body
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.writer = None
+
+
+class RequestMix:
+
+    def __init__(
+            self,
+            endpoint_weights: dict[str, float],
+            user_ids: numpy.ndarray,
+            job_ids: numpy.ndarray,
+            bulk_size: int,
+            replayed_requests: list[tuple[str, str, bytes]] = None,
+            seed: int = 0
+            ) -> None:
+        # Ids are drawn from the activity stream, so popular users and jobs are requested more often, as in production.
+        self.endpoint_names = list(endpoint_weights)
+        weights = numpy.array([endpoint_weights[endpoint_name] for endpoint_name in self.endpoint_names], dtype=numpy.float64)
+        self.endpoint_probabilities = weights / weights.sum()
+        self.user_ids = user_ids
+        self.job_ids = job_ids
+        self.bulk_size = bulk_size
+        self.replayed_requests = replayed_requests or []
+        self.random_generator = numpy.random.default_rng(seed)
+        self.next_replayed_request = 0
+
+    def next_request(self) -> tuple[str, str, bytes]:
+        if self.replayed_requests:
+            replayed_request = self.replayed_requests[self.next_replayed_request % len(self.replayed_requests)]
+            self.next_replayed_request += 1
+            return replayed_request
+        endpoint_name = self.endpoint_names[self.random_generator.choice(len(self.endpoint_names), p=self.endpoint_probabilities)]
+        if endpoint_name == "single":
+            body = {"user_id": int(self.user_ids[self.random_generator.integers(len(self.user_ids))])}
+        elif endpoint_name == "bulk":
+            body = {"user_ids": self.user_ids[self.random_generator.integers(len(self.user_ids), size=self.bulk_size)].tolist()}
+        else:
+            body = {"job_id": int(self.job_ids[self.random_generator.integers(len(self.job_ids))])}
+        return endpoint_name, endpoint_paths[endpoint_name], json.dumps(body).encode()
+
+
+def read_replayed_requests(replay_filepath: str) -> list[tuple[str, str, bytes]]:
+    # Each line holds one recorded request: {"path": "/recommend/...", "body": {...}}.
+    path_endpoint_names = {path: endpoint_name for endpoint_name, path in endpoint_paths.items()}
+    replayed_requests = []
+    with open(replay_filepath) as replay_file:
+        for line in replay_file:
+            if not line.strip():
+                continue
+            recorded_request = json.loads(line)
+            path = recorded_request["path"]
+            endpoint_name = path_endpoint_names.get(path, path)
+            replayed_requests.append((endpoint_name, path, json.dumps(recorded_request["body"]).encode()))
+    return replayed_requests
+
+
+async def run_load(
+        host: str,
+        port: int,
+        request_mix: RequestMix,
+        concurrency: int,
+        duration_seconds: float,
+        warmup_seconds: float
+        ) -> tuple[dict[str, list[float]], dict[str, int], float]:
+    latencies: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    start_time = time.perf_counter()
+    measure_from = start_time + warmup_seconds
+    deadline = measure_from + duration_seconds
+
+    async def client() -> None:
+        http_client = KeepAliveHTTPClient(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                endpoint_name, path, body = request_mix.next_request()
+                t0 = time.perf_counter()
+                try:
+                    status_code, _ = await http_client.request("POST", path, body)
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    status_code = None
+                    await http_client.close()
+                t1 = time.perf_counter()
+                if t0 < measure_from:
+                    continue
+                if status_code != 200:
+                    errors[endpoint_name] = errors.get(endpoint_name, 0) + 1
+                else:
+                    latencies.setdefault(endpoint_name, []).append(t1 - t0)
+        finally:
+            await http_client.close()
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - measure_from
+
+
+def summarize(latencies: dict[str, list[float]], errors: dict[str, int], measured_seconds: float) -> dict:
+    summary = {}
+    for endpoint_name in sorted(set(latencies) | set(errors)):
+        endpoint_latencies_ms = numpy.array(latencies.get(endpoint_name, [numpy.nan])) * 1e3
+        summary[endpoint_name] = {
+            "requests": len(latencies.get(endpoint_name, [])),
+            "errors": errors.get(endpoint_name, 0),
+            "rps": len(latencies.get(endpoint_name, [])) / measured_seconds,
+            "p50_ms": float(numpy.percentile(endpoint_latencies_ms, 50)),
+            "p95_ms": float(numpy.percentile(endpoint_latencies_ms, 95)),
+            "p99_ms": float(numpy.percentile(endpoint_latencies_ms, 99))
+        }
+    return summary
+
+
+def find_free_port() -> int:
+    with socket.socket() as free_socket:
+        free_socket.bind(("127.0.0.1", 0))
+        return free_socket.getsockname()[1]
+
+
+def start_server(artifacts_root: str, port: int, number_of_workers: int, server_environment: dict[str, str]) -> subprocess.Popen:
+    environment = dict(os.environ, RECOMMENDER_ARTIFACTS=artifacts_root, **server_environment)
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(number_of_workers), "--log-level", "warning"
+        ],
+        cwd=repository_root,
+        env=environment
+        )
+
+
+async def wait_until_serving(host: str, port: int, server_process: subprocess.Popen, timeout_seconds: float) -> None:
+    deadline = time.perf_counter() + timeout_seconds
+    while time.perf_counter() < deadline:
+        if server_process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server_process.returncode} before serving.")
+        http_client = KeepAliveHTTPClient(host, port)
+        try:
+            status_code, _ = await http_client.request("GET", "/health/ready")
+            if status_code == 200:
+                return
+        except OSError:
+            pass
+        finally:
+            await http_client.close()
+        await asyncio.sleep(0.2)
+    raise TimeoutError(f"Server did not serve within {timeout_seconds} seconds.")
+
+
+def parse_key_values(key_values: list[str], value_type=str) -> dict:
+    parsed_key_values = {}
+    for key_value in key_values:
+        key, _, value = key_value.partition("=")
+        parsed_key_values[key] = value_type(value)
+    return parsed_key_values
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a mix of recommendation requests against the API and report RPS and latency percentiles.")
+    parser.add_argument("--url", default=None, help="Target an already running server instead of starting one.")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--jobs", type=int, default=5_000)
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--mix", nargs="+", default=["single=0.7", "bulk=0.1", "similar=0.2"], help="Endpoint weights, e.g. single=0.7.")
+    parser.add_argument("--bulk-size", type=int, default=50)
+    parser.add_argument("--replay", default=None, help="JSONL of recorded requests ({\"path\": ..., \"body\": ...}) replayed in order.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes of the started server.")
+    parser.add_argument("--server-env", nargs="*", default=[], help="Environment of the started server, e.g. RECOMMENDER_MICRO_BATCHING=0.")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", default=None, help="Write the summary as JSON.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    activity_columns = generate_activity_columns(args.users, args.jobs, args.events, seed=args.seed)
+    replayed_requests = read_replayed_requests(args.replay) if args.replay else None
+    request_mix = RequestMix(
+        parse_key_values(args.mix, float),
+        activity_columns.user_ids,
+        activity_columns.job_ids,
+        args.bulk_size,
+        replayed_requests,
+        args.seed
+        )
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        server_process = None
+        if args.url is None:
+            activities_filepath = os.path.join(temporary_directory, "activities.jsonl")
+            artifacts_root = os.path.join(temporary_directory, "artifacts")
+            write_activities(activities_filepath, activity_columns)
+            train_and_save_model(activities_filepath, artifacts_root)
+            host, port = "127.0.0.1", find_free_port()
+            server_process = start_server(artifacts_root, port, args.workers, parse_key_values(args.server_env))
+        else:
+            target_url = urlsplit(args.url)
+            host, port = target_url.hostname, target_url.port or 80
+        try:
+            if server_process is not None:
+                asyncio.run(wait_until_serving(host, port, server_process, args.startup_timeout))
+            latencies, errors, measured_seconds = asyncio.run(
+                run_load(host, port, request_mix, args.concurrency, args.duration, args.warmup)
+                )
+        finally:
+            if server_process is not None:
+                server_process.terminate()
+                server_process.wait()
+
+    summary = summarize(latencies, errors, measured_seconds)
+    print(f"concurrency {args.concurrency}, workers {args.workers}, server env {args.server_env}, {measured_seconds:.1f} s measured")
+    print(f"{'endpoint':>10} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint_name, endpoint_summary in summary.items():
+        print(
+            f"{endpoint_name:>10} {endpoint_summary['requests']:>9} {endpoint_summary['errors']:>7} {endpoint_summary['rps']:>9.1f} "
+            f"{endpoint_summary['p50_ms']:>9.2f} {endpoint_summary['p95_ms']:>9.2f} {endpoint_summary['p99_ms']:>9.2f}"
+            )
+    if args.output is not None:
+        with open(args.output, "w") as output_file:
+            json.dump({"arguments": vars(args), "measured_seconds": measured_seconds, "endpoints": summary}, output_file, indent=4)
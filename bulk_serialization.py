@@ -0,0 +1,134 @@
+from typing import TYPE_CHECKING, Iterator
+
+import json
+import numpy
+
+if TYPE_CHECKING:
+    from recommender import Recommender
+
+
+json_media_type: str = "application/json"
+ndjson_media_type: str = "application/x-ndjson"
+binary_media_type: str = "application/octet-stream"
+response_formats: tuple[str, ...] = ("json", "ndjson", "binary")
+default_chunk_size: int = 1024
+
+# Binary responses are a header followed by one fixed-size little-endian record per user, so clients can decode the
+# whole body with a single numpy.frombuffer and chunks can be streamed without knowing the number of users up front.
+binary_format_magic: bytes = b"RECS"
+binary_format_version: int = 1
+binary_header_dtype = numpy.dtype([("magic", "S4"), ("version", "<u4"), ("number_of_recommendations", "<u4")])
+
+
+def get_binary_record_dtype(number_of_recommendations: int) -> numpy.dtype:
+    # Job ids are stored as int32, as in batch exports; padded slots hold job id -1 and score -inf.
+    return numpy.dtype([
+        ("user_id", "<i8"),
+        ("job_ids", "<i4", (number_of_recommendations,)),
+        ("scores", "<f4", (number_of_recommendations,))
+        ])
+
+
+def iter_recommendation_chunks(
+        recommender: "Recommender",
+        user_ids: list[int],
+        number_of_recommendations: int = 10,
+        chunk_size: int = default_chunk_size
+        ) -> Iterator[tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]]:
+    # Users are scored chunk by chunk, so the scores and encoded text held per request are bounded by chunk_size users.
+    for chunk_start in range(0, len(user_ids), chunk_size):
+        yield recommender.get_job_recommendation_arrays_for_bulk_users(user_ids[chunk_start:chunk_start + chunk_size], number_of_recommendations)
+
+
+def encode_job_lists(job_ids: numpy.ndarray, scores: numpy.ndarray) -> list[str]:
+    # One JSON list per user, formatted from plain Python lists instead of a dict per job; padded slots trail each row.
+    # Recommender is imported here rather than at module level, so importing this module does not load scipy and
+    # implicit before background loading starts; a model is always loaded by the time anything is encoded.
+    from recommender import Recommender
+    number_of_recommended_jobs = (scores > -numpy.inf).sum(axis=1).tolist()
+    job_lists = []
+    for number_of_jobs, user_job_ids, user_scores in zip(number_of_recommended_jobs, job_ids.tolist(), scores.tolist()):
+        job_lists.append("[" + ",".join([
+            f'{{"{Recommender.job_id_key}":{job_id},"{Recommender.recommendation_score_key}":{score!r}}}'
+            for job_id, score in zip(user_job_ids[:number_of_jobs], user_scores[:number_of_jobs])
+            ]) + "]")
+    return job_lists
+
+
+def encode_json_chunk(user_ids: numpy.ndarray, job_ids: numpy.ndarray, scores: numpy.ndarray, tiers: list[str] = None) -> str:
+    # The members of the default bulk response object ({"<user_id>": [...]} or {"<user_id>": {"tier": ..., "jobs": [...]}}).
+    job_lists = encode_job_lists(job_ids, scores)
+    if tiers is None:
+        return ",".join([f'"{user_id}":{job_list}' for user_id, job_list in zip(user_ids.tolist(), job_lists)])
+    return ",".join([
+        f'"{user_id}":{{"tier":{json.dumps(tier)},"jobs":{job_list}}}'
+        for user_id, tier, job_list in zip(user_ids.tolist(), tiers, job_lists)
+        ])
+
+
+def encode_ndjson_chunk(user_ids: numpy.ndarray, job_ids: numpy.ndarray, scores: numpy.ndarray, tiers: list[str] = None) -> str:
+    job_lists = encode_job_lists(job_ids, scores)
+    if tiers is None:
+        return "".join([f'{{"user_id":{user_id},"jobs":{job_list}}}\n' for user_id, job_list in zip(user_ids.tolist(), job_lists)])
+    return "".join([
+        f'{{"user_id":{user_id},"tier":{json.dumps(tier)},"jobs":{job_list}}}\n'
+        for user_id, tier, job_list in zip(user_ids.tolist(), tiers, job_lists)
+        ])
+
+
+def encode_binary_header(number_of_recommendations: int) -> bytes:
+    return numpy.array([(binary_format_magic, binary_format_version, number_of_recommendations)], dtype=binary_header_dtype).tobytes()
+
+
+def encode_binary_chunk(user_ids: numpy.ndarray, job_ids: numpy.ndarray, scores: numpy.ndarray) -> bytes:
+    records = numpy.empty(len(user_ids), dtype=get_binary_record_dtype(job_ids.shape[1]))
+    records["user_id"] = user_ids
+    records["job_ids"] = job_ids
+    records["scores"] = scores
+    return records.tobytes()
+
+
+def decode_binary_recommendations(body: bytes) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    header = numpy.frombuffer(body, dtype=binary_header_dtype, count=1)[0]
+    if header["magic"] != binary_format_magic or header["version"] != binary_format_version:
+        raise ValueError("Not a binary recommendations response.")
+    records = numpy.frombuffer(body, dtype=get_binary_record_dtype(int(header["number_of_recommendations"])), offset=binary_header_dtype.itemsize)
+    return records["user_id"], records["job_ids"], records["scores"]
+
+
+def iter_encoded_recommendations(
+        recommender: "Recommender",
+        user_ids: list[int],
+        response_format: str = "json",
+        number_of_recommendations: int = 10,
+        include_tiers: bool = False,
+        chunk_size: int = default_chunk_size
+        ) -> Iterator[bytes]:
+    # Yields the response body chunk by chunk; b"".join of the chunks is the complete json, ndjson or binary body.
+    if response_format not in response_formats:
+        raise ValueError(f"Unknown response format {response_format!r}, expected one of {response_formats}.")
+    # Each user is encoded once, in order of first occurrence, like the keys of the non-streamed response: a repeated
+    # id would otherwise repeat a key of the JSON object.
+    user_ids = list(dict.fromkeys(user_ids))
+    if response_format == "binary":
+        yield encode_binary_header(min(number_of_recommendations, len(recommender.matrix_column_job_index)))
+    elif response_format == "json":
+        yield b"{"
+    is_first_chunk = True
+    for chunk_user_ids, job_ids, scores in iter_recommendation_chunks(recommender, user_ids, number_of_recommendations, chunk_size):
+        if not len(chunk_user_ids):
+            continue
+        tiers = recommender.get_recommendation_tiers(chunk_user_ids) if include_tiers else None
+        if response_format == "binary":
+            yield encode_binary_chunk(chunk_user_ids, job_ids, scores)
+        elif response_format == "ndjson":
+            yield encode_ndjson_chunk(chunk_user_ids, job_ids, scores, tiers).encode()
+        else:
+            yield (("" if is_first_chunk else ",") + encode_json_chunk(chunk_user_ids, job_ids, scores, tiers)).encode()
+        is_first_chunk = False
+    if response_format == "json":
+        yield b"}"
+
+
+def get_media_type(response_format: str) -> str:
+    return {"json": json_media_type, "ndjson": ndjson_media_type, "binary": binary_media_type}[response_format]
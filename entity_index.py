@@ -0,0 +1,95 @@
+from utils.utils import append_rows
+
+import numpy
+
+
+class EntityIndex:
+
+    entity_id_dtype = numpy.int64
+    missing_position: int = -1
+    # Appended ids are looked up in a small sorted side table, merged into the main one once it outgrows this share.
+    merge_fraction: float = 1 / 64
+    merge_minimum: int = 1024
+
+    def __init__(self, entity_ids) -> None:
+        self.entity_ids = numpy.asarray(entity_ids, dtype=self.entity_id_dtype)
+        self.sort_order = numpy.argsort(self.entity_ids, kind="stable")
+        self.sorted_entity_ids = self.entity_ids[self.sort_order]
+        self.appended_sort_order = numpy.empty(0, dtype=numpy.int64)
+        self.appended_sorted_entity_ids = numpy.empty(0, dtype=self.entity_id_dtype)
+
+    def __len__(self) -> int:
+        return len(self.entity_ids)
+
+    def __iter__(self):
+        return iter(self.entity_ids.tolist())
+
+    def __getitem__(self, position):
+        return self.entity_ids[position]
+
+    def __contains__(self, entity_id) -> bool:
+        return self.get_positions([entity_id])[0] != self.missing_position
+
+    def get_loc(self, entity_id: int) -> int:
+        position = self.get_positions([entity_id])[0]
+        if position == self.missing_position:
+            raise KeyError(entity_id)
+        return int(position)
+
+    def get_positions(self, entity_ids: numpy.ndarray) -> numpy.ndarray:
+        entity_ids, is_in_range = self.to_entity_ids(entity_ids)
+        positions = self.search_sorted_ids(self.sorted_entity_ids, self.sort_order, entity_ids)
+        if len(self.appended_sorted_entity_ids):
+            is_missing = positions == self.missing_position
+            positions[is_missing] = self.search_sorted_ids(self.appended_sorted_entity_ids, self.appended_sort_order, entity_ids[is_missing])
+        positions[~is_in_range] = self.missing_position
+        return positions
+
+    @classmethod
+    def to_entity_ids(cls, entity_ids) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # (ids in the id dtype, whether each id fits it). Request ids are unbounded Python ints: ids outside the dtype
+        # cannot be in any index, so they are stored as 0 and flagged instead of raising OverflowError.
+        try:
+            entity_ids = numpy.asarray(entity_ids, dtype=cls.entity_id_dtype)
+            return entity_ids, numpy.ones(entity_ids.shape, dtype=bool)
+        except OverflowError:
+            id_bounds = numpy.iinfo(cls.entity_id_dtype)
+            entity_ids = numpy.asarray(entity_ids, dtype=object)
+            is_in_range = ((entity_ids >= id_bounds.min) & (entity_ids <= id_bounds.max)).astype(bool)
+            return numpy.where(is_in_range, entity_ids, 0).astype(cls.entity_id_dtype), is_in_range
+
+    @classmethod
+    def search_sorted_ids(cls, sorted_entity_ids: numpy.ndarray, sort_order: numpy.ndarray, entity_ids: numpy.ndarray) -> numpy.ndarray:
+        if len(sorted_entity_ids) == 0:
+            return numpy.full(entity_ids.shape, cls.missing_position, dtype=numpy.int64)
+        sorted_positions = numpy.searchsorted(sorted_entity_ids, entity_ids)
+        sorted_positions = numpy.minimum(sorted_positions, len(sorted_entity_ids) - 1)
+        is_found = sorted_entity_ids[sorted_positions] == entity_ids
+        return numpy.where(is_found, sort_order[sorted_positions], cls.missing_position)
+
+    def get_entity_ids(self, positions: numpy.ndarray) -> numpy.ndarray:
+        return self.entity_ids[positions]
+
+    def append(self, entity_ids: numpy.ndarray) -> "EntityIndex":
+        # Returns a new index with the ids appended, leaving this one unchanged for readers still holding it. The ids
+        # grow into spare capacity and only the side table is rewritten, so appending k ids costs O(k) amortized.
+        entity_ids = numpy.asarray(entity_ids, dtype=self.entity_id_dtype)
+        entity_index = EntityIndex.__new__(EntityIndex)
+        entity_index.entity_ids = append_rows(self.entity_ids, entity_ids)
+        new_positions = numpy.arange(len(self.entity_ids), len(entity_index.entity_ids))
+        new_id_order = numpy.argsort(entity_ids, kind="stable")
+        insert_positions = numpy.searchsorted(self.appended_sorted_entity_ids, entity_ids[new_id_order])
+        appended_sorted_entity_ids = numpy.insert(self.appended_sorted_entity_ids, insert_positions, entity_ids[new_id_order])
+        appended_sort_order = numpy.insert(self.appended_sort_order, insert_positions, new_positions[new_id_order])
+        if len(appended_sorted_entity_ids) > max(self.merge_minimum, self.merge_fraction * len(entity_index.entity_ids)):
+            insert_positions = numpy.searchsorted(self.sorted_entity_ids, appended_sorted_entity_ids)
+            entity_index.sorted_entity_ids = numpy.insert(self.sorted_entity_ids, insert_positions, appended_sorted_entity_ids)
+            entity_index.sort_order = numpy.insert(self.sort_order, insert_positions, appended_sort_order)
+            entity_index.appended_sorted_entity_ids = numpy.empty(0, dtype=self.entity_id_dtype)
+            entity_index.appended_sort_order = numpy.empty(0, dtype=numpy.int64)
+        else:
+            entity_index.sorted_entity_ids = self.sorted_entity_ids
+            entity_index.sort_order = self.sort_order
+            entity_index.appended_sorted_entity_ids = appended_sorted_entity_ids
+            entity_index.appended_sort_order = appended_sort_order
+        return entity_index
@@ -0,0 +1,218 @@
+from als_training import TrainingConfig
+from entity_index import EntityIndex
+from ingestion import ActivityColumns, PairCounts, encode_pair_keys, read_activity_columns
+from recommender import Recommender
+from utils.utils import for_each_top_k_block
+
+from concurrent.futures import ProcessPoolExecutor
+
+import argparse
+import csv
+import itertools
+import os
+import time
+import numpy
+import scipy.sparse
+
+
+def split_activities_by_timestamp(
+        activity_columns: ActivityColumns,
+        test_start_timestamp: float = None,
+        test_fraction: float = 0.2
+        ) -> tuple[ActivityColumns, ActivityColumns]:
+    # Without an explicit boundary, the latest test_fraction of events (by timestamp) form the test period.
+    if test_start_timestamp is None:
+        test_start_timestamp = numpy.nanquantile(activity_columns.timestamps, 1 - test_fraction)
+    is_test = activity_columns.timestamps >= test_start_timestamp
+    return select_activities(activity_columns, ~is_test), select_activities(activity_columns, is_test)
+
+
+def select_activities(activity_columns: ActivityColumns, is_selected: numpy.ndarray) -> ActivityColumns:
+    return ActivityColumns(
+        activity_columns.user_ids[is_selected],
+        activity_columns.job_ids[is_selected],
+        activity_columns.type_codes[is_selected],
+        activity_columns.timestamps[is_selected]
+        )
+
+
+def build_relevance_matrix(recommender: Recommender, test_activity_columns: ActivityColumns) -> scipy.sparse.csr_matrix:
+    # Relevant items are the test-period jobs with a positive implicit score. Users and jobs unseen during training
+    # cannot be scored by the model and are left out, so metrics measure ranking quality on the known catalogue.
+    test_pair_counts = PairCounts.from_activity_columns(test_activity_columns)
+    implicit_scores = Recommender.calculate_implicit_scores(test_pair_counts.impressions, test_pair_counts.redirects)
+    user_matrix_row_idx = recommender.matrix_row_user_index.get_positions(test_pair_counts.user_ids.astype(numpy.int64))
+    job_matrix_column_idx = recommender.matrix_column_job_index.get_positions(test_pair_counts.job_ids.astype(numpy.int64))
+    is_relevant = (
+        (implicit_scores > 0)
+        & (user_matrix_row_idx != EntityIndex.missing_position)
+        & (job_matrix_column_idx != EntityIndex.missing_position)
+        )
+    relevance_matrix = scipy.sparse.csr_matrix(
+        (numpy.ones(is_relevant.sum(), dtype=numpy.float32), (user_matrix_row_idx[is_relevant], job_matrix_column_idx[is_relevant])),
+        shape=recommender.matrix_csr.shape
+        )
+    relevance_matrix.sum_duplicates()
+    return relevance_matrix
+
+
+def evaluate_recommender(
+        recommender: Recommender,
+        relevance_matrix: scipy.sparse.csr_matrix,
+        k: int = 10,
+        exclude_training_items: bool = True,
+        block_size: int = 2048,
+        number_of_workers: int = None
+        ) -> dict:
+    t0 = time.perf_counter()
+    relevant_items_per_user = numpy.diff(relevance_matrix.indptr)
+    test_user_matrix_row_idx = numpy.flatnonzero(relevant_items_per_user)
+    if len(test_user_matrix_row_idx) == 0:
+        raise ValueError("No test users to evaluate: the test period has no positive activity on users and jobs seen in training.")
+    user_factors = numpy.asarray(recommender.als_model.user_factors)[test_user_matrix_row_idx]
+    training_matrix = recommender.matrix_csr[test_user_matrix_row_idx]
+    top_k_positions = numpy.empty((len(test_user_matrix_row_idx), min(k, relevance_matrix.shape[1])), dtype=numpy.int64)
+
+    def exclude_training_items_from_block(block_start: int, block_end: int, block_scores: numpy.ndarray) -> None:
+        block_training_matrix = training_matrix[block_start:block_end]
+        block_rows = numpy.repeat(numpy.arange(block_end - block_start), numpy.diff(block_training_matrix.indptr))
+        block_scores[block_rows, block_training_matrix.indices] = -numpy.inf
+
+    def store_block(block_start: int, block_end: int, positions: numpy.ndarray, scores: numpy.ndarray) -> None:
+        top_k_positions[block_start:block_end] = positions
+
+    for_each_top_k_block(
+        user_factors,
+        recommender.als_model.item_factors,
+        k,
+        store_block,
+        block_size,
+        number_of_workers,
+        exclude_training_items_from_block if exclude_training_items else None
+        )
+    # Hits are found by looking the recommended (user, job) pairs up in the sorted relevant pair keys.
+    relevance_rows = numpy.repeat(numpy.arange(relevance_matrix.shape[0]), relevant_items_per_user)
+    relevant_pair_keys = encode_pair_keys(relevance_rows, relevance_matrix.indices)
+    recommended_pair_keys = encode_pair_keys(
+        numpy.repeat(test_user_matrix_row_idx, top_k_positions.shape[1]),
+        top_k_positions.ravel()
+        )
+    key_positions = numpy.minimum(numpy.searchsorted(relevant_pair_keys, recommended_pair_keys), len(relevant_pair_keys) - 1)
+    hits = (relevant_pair_keys[key_positions] == recommended_pair_keys).reshape(top_k_positions.shape)
+    number_of_relevant_items = relevant_items_per_user[test_user_matrix_row_idx]
+    number_of_hits = hits.sum(axis=1)
+    rank_discounts = 1 / numpy.log2(numpy.arange(2, k + 2))
+    discounted_cumulative_gains = (hits * rank_discounts[:hits.shape[1]]).sum(axis=1)
+    ideal_discounted_cumulative_gains = numpy.cumsum(rank_discounts)[numpy.minimum(number_of_relevant_items, k) - 1]
+    evaluation = {
+        f"precision_at_{k}": float(numpy.mean(number_of_hits / k)),
+        f"recall_at_{k}": float(numpy.mean(number_of_hits / number_of_relevant_items)),
+        f"ndcg_at_{k}": float(numpy.mean(discounted_cumulative_gains / ideal_discounted_cumulative_gains)),
+        "number_of_test_users": int(len(test_user_matrix_row_idx)),
+        "evaluation_seconds": time.perf_counter() - t0
+    }
+    return evaluation
+
+
+worker_state: dict = {}
+
+
+def initialize_grid_search_worker(train_activity_columns: ActivityColumns, test_activity_columns: ActivityColumns) -> None:
+    # Every worker builds the training matrix and the relevance matrix once and reuses them for all of its configs.
+    recommender = Recommender.from_activity_columns(train_activity_columns)
+    recommender.build_sparse_matrix()
+    worker_state["recommender"] = recommender
+    worker_state["relevance_matrix"] = build_relevance_matrix(recommender, test_activity_columns)
+
+
+def evaluate_training_config(training_config: dict, k: int, exclude_training_items: bool) -> dict:
+    recommender = worker_state["recommender"]
+    recommender.train_als_model(TrainingConfig.from_dict(training_config))
+    evaluation = evaluate_recommender(recommender, worker_state["relevance_matrix"], k, exclude_training_items, number_of_workers=1)
+    result = dict(training_config)
+    result.update(evaluation)
+    result["training_seconds"] = recommender.training_report["training_seconds"]
+    result["peak_traced_memory_bytes"] = recommender.training_report["peak_traced_memory_bytes"]
+    return result
+
+
+def expand_parameter_grid(parameter_grid: dict[str, list]) -> list[dict]:
+    parameter_names = list(parameter_grid)
+    return [dict(zip(parameter_names, parameter_values)) for parameter_values in itertools.product(*parameter_grid.values())]
+
+
+def grid_search(
+        train_activity_columns: ActivityColumns,
+        test_activity_columns: ActivityColumns,
+        parameter_grid: dict[str, list],
+        k: int = 10,
+        exclude_training_items: bool = True,
+        number_of_workers: int = None,
+        results_filepath: str = None
+        ) -> list[dict]:
+    number_of_workers = number_of_workers or os.cpu_count()
+    training_configs = expand_parameter_grid(parameter_grid)
+    # Parallelism comes from the processes, so each training run is single-threaded unless the grid says otherwise.
+    for training_config in training_configs:
+        training_config.setdefault("number_of_threads", 1 if number_of_workers > 1 else 0)
+    with ProcessPoolExecutor(
+            max_workers=number_of_workers,
+            initializer=initialize_grid_search_worker,
+            initargs=(train_activity_columns, test_activity_columns)
+            ) as executor:
+        results = list(executor.map(
+            evaluate_training_config,
+            training_configs,
+            itertools.repeat(k),
+            itertools.repeat(exclude_training_items)
+            ))
+    if results_filepath is not None:
+        write_results_table(results, results_filepath)
+    return results
+
+
+def write_results_table(results: list[dict], results_filepath: str) -> None:
+    column_names = list(dict.fromkeys(column_name for result in results for column_name in result))
+    with open(results_filepath, "w", newline="") as results_file:
+        writer = csv.DictWriter(results_file, fieldnames=column_names)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate ALS settings on a temporal train/test split with a parallel grid search.")
+    parser.add_argument("--activities", default="dataset/activities.jsonl")
+    parser.add_argument("--test-start-timestamp", type=float, default=None)
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--factors", type=int, nargs="+", default=[64])
+    parser.add_argument("--iterations", type=int, nargs="+", default=[15])
+    parser.add_argument("--regularization", type=float, nargs="+", default=[0.05])
+    parser.add_argument("--confidence-scale", type=float, nargs="+", default=[2.0])
+    parser.add_argument("--include-training-items", action="store_true", help="Do not exclude training-period items from the top k.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="evaluation_results.csv")
+    args = parser.parse_args()
+    train_activity_columns, test_activity_columns = split_activities_by_timestamp(
+        read_activity_columns(args.activities),
+        args.test_start_timestamp,
+        args.test_fraction
+        )
+    parameter_grid = {
+        "factors": args.factors,
+        "iterations": args.iterations,
+        "regularization": args.regularization,
+        "confidence_scale": args.confidence_scale
+    }
+    results = grid_search(
+        train_activity_columns,
+        test_activity_columns,
+        parameter_grid,
+        args.k,
+        not args.include_training_items,
+        args.workers,
+        args.output
+        )
+    for result in sorted(results, key=lambda result: -result[f"ndcg_at_{args.k}"]):
+        print({name: round(value, 4) if isinstance(value, float) else value for name, value in result.items()})
+    print(f"Results table written to {args.output}")
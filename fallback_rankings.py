@@ -0,0 +1,132 @@
+from entity_index import EntityIndex
+
+import json
+import numpy
+import scipy.sparse
+
+
+class FallbackRankings:
+
+    # Tiers in the order they are tried for users the model does not know.
+    segment_tier: str = "segment"
+    recent_popularity_tier: str = "recent_popularity"
+    global_popularity_tier: str = "global_popularity"
+    array_names: tuple[str, ...] = (
+        "global_job_positions", "global_job_scores", "recent_job_positions", "recent_job_scores",
+        "segment_user_ids", "segment_user_codes", "segment_job_positions", "segment_job_scores"
+        )
+    ranking_size: int = 100
+
+    def __init__(self, arrays: dict[str, numpy.ndarray]) -> None:
+        self.arrays = arrays
+        self.global_job_positions = arrays["global_job_positions"]
+        self.global_job_scores = arrays["global_job_scores"]
+        self.recent_job_positions = arrays.get("recent_job_positions")
+        self.recent_job_scores = arrays.get("recent_job_scores")
+        self.segment_job_positions = arrays.get("segment_job_positions")
+        self.segment_job_scores = arrays.get("segment_job_scores")
+        self.segment_user_codes = arrays.get("segment_user_codes")
+        self.segment_user_index = EntityIndex(arrays["segment_user_ids"]) if "segment_user_ids" in arrays else None
+        has_recent_ranking = self.recent_job_positions is not None and len(self.recent_job_positions) > 0
+        self.default_tier = self.recent_popularity_tier if has_recent_ranking else self.global_popularity_tier
+
+    @classmethod
+    def build(
+            cls,
+            matrix_csr: scipy.sparse.csr_matrix,
+            user_ids: numpy.ndarray,
+            recent_job_scores: numpy.ndarray = None,
+            user_segments: tuple[numpy.ndarray, numpy.ndarray] = None,
+            ranking_size: int = None
+            ) -> "FallbackRankings":
+        # Every ranking is a short array of job columns sorted by summed implicit score, so serving is a slice.
+        ranking_size = ranking_size or cls.ranking_size
+        arrays = {}
+        job_scores = numpy.bincount(matrix_csr.indices, weights=matrix_csr.data, minlength=matrix_csr.shape[1])
+        arrays["global_job_positions"], arrays["global_job_scores"] = cls.rank_jobs(job_scores, ranking_size)
+        if recent_job_scores is not None:
+            arrays["recent_job_positions"], arrays["recent_job_scores"] = cls.rank_jobs(recent_job_scores, ranking_size)
+        if user_segments is not None:
+            segment_user_ids, segment_user_codes = user_segments
+            arrays["segment_user_ids"] = segment_user_ids
+            arrays["segment_user_codes"] = segment_user_codes
+            arrays["segment_job_positions"], arrays["segment_job_scores"] = cls.rank_segment_jobs(
+                matrix_csr, user_ids, EntityIndex(segment_user_ids), segment_user_codes, ranking_size
+                )
+        return cls(arrays)
+
+    @staticmethod
+    def rank_jobs(job_scores: numpy.ndarray, ranking_size: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        ranked_job_positions = numpy.argsort(-job_scores, kind="stable")[:ranking_size]
+        ranked_job_positions = ranked_job_positions[job_scores[ranked_job_positions] > 0]
+        return ranked_job_positions.astype(numpy.int32), job_scores[ranked_job_positions].astype(numpy.float32)
+
+    @staticmethod
+    def rank_segment_jobs(
+            matrix_csr: scipy.sparse.csr_matrix,
+            user_ids: numpy.ndarray,
+            segment_user_index: EntityIndex,
+            segment_user_codes: numpy.ndarray,
+            ranking_size: int
+            ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Segment rankings are padded with position -1 when a segment interacted with fewer than ranking_size jobs.
+        number_of_segments = int(segment_user_codes.max()) + 1 if len(segment_user_codes) else 0
+        user_segment_positions = segment_user_index.get_positions(user_ids)
+        row_segment_codes = numpy.where(
+            user_segment_positions != EntityIndex.missing_position,
+            segment_user_codes[user_segment_positions],
+            -1
+            )
+        pair_segment_codes = numpy.repeat(row_segment_codes, numpy.diff(matrix_csr.indptr))
+        is_segmented = pair_segment_codes != -1
+        segment_job_matrix = scipy.sparse.csr_matrix(
+            (matrix_csr.data[is_segmented].astype(numpy.float64), (pair_segment_codes[is_segmented], matrix_csr.indices[is_segmented])),
+            shape=(number_of_segments, matrix_csr.shape[1])
+            )
+        segment_job_matrix.sum_duplicates()
+        segment_job_positions = numpy.full((number_of_segments, ranking_size), -1, dtype=numpy.int32)
+        segment_job_scores = numpy.zeros((number_of_segments, ranking_size), dtype=numpy.float32)
+        for segment_code in range(number_of_segments):
+            row_start, row_end = segment_job_matrix.indptr[segment_code], segment_job_matrix.indptr[segment_code + 1]
+            row_job_scores = segment_job_matrix.data[row_start:row_end]
+            row_order = numpy.argsort(-row_job_scores, kind="stable")[:ranking_size]
+            segment_job_positions[segment_code, :len(row_order)] = segment_job_matrix.indices[row_start:row_end][row_order]
+            segment_job_scores[segment_code, :len(row_order)] = row_job_scores[row_order]
+        return segment_job_positions, segment_job_scores
+
+    def get_user_tiers(self, user_ids: list[int]) -> list[str]:
+        tiers = numpy.full(len(user_ids), self.default_tier, dtype=object)
+        if self.segment_user_index is not None:
+            user_segment_positions = self.segment_user_index.get_positions(user_ids)
+            is_segmented = user_segment_positions != EntityIndex.missing_position
+            segment_codes = self.segment_user_codes[user_segment_positions[is_segmented]]
+            # Segments without any interactions fall through to the popularity tiers.
+            has_ranking = self.segment_job_positions[segment_codes, 0] != -1
+            tiers[numpy.flatnonzero(is_segmented)[has_ranking]] = self.segment_tier
+        return tiers.tolist()
+
+    def get_ranking(self, tier: str, user_id: int = None) -> tuple[numpy.ndarray, numpy.ndarray]:
+        if tier == self.segment_tier:
+            segment_code = self.segment_user_codes[self.segment_user_index.get_loc(user_id)]
+            return self.segment_job_positions[segment_code], self.segment_job_scores[segment_code]
+        if tier == self.recent_popularity_tier:
+            return self.recent_job_positions, self.recent_job_scores
+        return self.global_job_positions, self.global_job_scores
+
+
+def read_user_segments(users_filepath: str, segment_attribute: str) -> tuple[numpy.ndarray, numpy.ndarray, list[str]]:
+    # Users without a scalar value for the attribute get no segment.
+    user_ids = []
+    segment_values = []
+    with open(users_filepath) as input_file:
+        for line in input_file:
+            if not line.strip():
+                continue
+            user = json.loads(line)
+            segment_value = user.get(segment_attribute)
+            if segment_value is None or isinstance(segment_value, (list, dict)):
+                continue
+            user_ids.append(user["user_id"])
+            segment_values.append(str(segment_value))
+    unique_segment_values, segment_user_codes = numpy.unique(numpy.asarray(segment_values, dtype=str), return_inverse=True)
+    return numpy.asarray(user_ids, dtype=numpy.int64), segment_user_codes.astype(numpy.int32), unique_segment_values.tolist()
@@ -0,0 +1,117 @@
+from ingestion import read_pair_counts_sharded
+
+import argparse
+import json
+import time
+import numpy
+
+
+summary_quantiles: tuple[float, ...] = (0.5, 0.95, 0.99)
+
+
+def summarize_distribution(values: numpy.ndarray, quantiles: tuple[float, ...] = summary_quantiles) -> dict:
+    if not len(values):
+        return {"count": 0}
+    summary = {"count": int(len(values)), "mean": float(values.mean()), "min": int(values.min())}
+    for quantile in quantiles:
+        summary[f"p{round(quantile * 100)}"] = float(numpy.quantile(values, quantile))
+    summary["max"] = int(values.max())
+    return summary
+
+
+def group_max(entity_ids: numpy.ndarray, counts: numpy.ndarray) -> numpy.ndarray:
+    # Max count per entity over its pairs, from one sort and a reduceat instead of a dense entity x entity table.
+    entity_order = numpy.argsort(entity_ids, kind="stable")
+    sorted_entity_ids = entity_ids[entity_order]
+    group_starts = numpy.flatnonzero(numpy.concatenate([[True], sorted_entity_ids[1:] != sorted_entity_ids[:-1]]))
+    return numpy.maximum.reduceat(counts[entity_order], group_starts) if len(counts) else counts
+
+
+def group_sum(entity_ids: numpy.ndarray, counts: numpy.ndarray) -> numpy.ndarray:
+    _, entity_codes = numpy.unique(entity_ids, return_inverse=True)
+    return numpy.bincount(entity_codes, weights=counts).astype(numpy.int64)
+
+
+def calculate_entity_funnel(entity_ids: numpy.ndarray, impressions: numpy.ndarray, redirects: numpy.ndarray) -> dict:
+    entity_impressions = group_sum(entity_ids, impressions)
+    entity_redirects = group_sum(entity_ids, redirects)
+    is_impressed = entity_impressions > 0
+    is_redirected = entity_redirects > 0
+    entity_funnel = {
+        "engaged": int((is_impressed | is_redirected).sum()),
+        "impressed": int(is_impressed.sum()),
+        "redirected": int(is_redirected.sum()),
+        "impressed_never_redirected": int((is_impressed & ~is_redirected).sum()),
+        "redirected_without_impression": int((is_redirected & ~is_impressed).sum()),
+        "impressions_per_entity": summarize_distribution(entity_impressions[is_impressed]),
+        "redirects_per_entity": summarize_distribution(entity_redirects[is_redirected])
+    }
+    return entity_funnel
+
+
+def calculate_funnel_statistics(
+        user_ids: numpy.ndarray,
+        job_ids: numpy.ndarray,
+        impressions: numpy.ndarray,
+        redirects: numpy.ndarray
+        ) -> dict:
+    # Works on one row per (user, job) pair with its impression and redirect counters, so memory grows with the
+    # number of interacting pairs rather than with users x jobs.
+    user_ids = numpy.asarray(user_ids, dtype=numpy.int64)
+    job_ids = numpy.asarray(job_ids, dtype=numpy.int64)
+    impressions = numpy.asarray(impressions, dtype=numpy.int64)
+    redirects = numpy.asarray(redirects, dtype=numpy.int64)
+    interactions = impressions + redirects
+    total_impressions = int(impressions.sum())
+    total_redirects = int(redirects.sum())
+    total_events = total_impressions + total_redirects
+    per_job_max_pair_interactions = {}
+    for counter_name, counts in (("total", interactions), ("impressions", impressions), ("redirects", redirects)):
+        # As in the EDA crosstabs: per job, the most interactions any single user had with it (jobs with none excluded).
+        is_counted = counts > 0
+        per_job_max_pair_interactions[counter_name] = summarize_distribution(group_max(job_ids[is_counted], counts[is_counted]))
+    funnel_statistics = {
+        "events": {
+            "total": total_events,
+            "impressions": total_impressions,
+            "redirects": total_redirects,
+            "impression_share": total_impressions / total_events if total_events else None,
+            "redirect_share": total_redirects / total_events if total_events else None
+        },
+        "users": calculate_entity_funnel(user_ids, impressions, redirects),
+        "jobs": calculate_entity_funnel(job_ids, impressions, redirects),
+        "pairs": {
+            "count": int(len(interactions)),
+            "redirected": int((redirects > 0).sum()),
+            "redirected_without_impression": int(((redirects > 0) & (impressions == 0)).sum()),
+            "interactions_per_pair": summarize_distribution(interactions[interactions > 0])
+        },
+        "per_job_max_pair_interactions": per_job_max_pair_interactions
+    }
+    return funnel_statistics
+
+
+def calculate_funnel_statistics_from_file(activities_filepath: str, number_of_workers: int = 1) -> dict:
+    # One streaming pass: byte-range shards are parsed chunk by chunk straight into per-pair counters.
+    pair_counts = read_pair_counts_sharded(activities_filepath, number_of_workers)
+    return calculate_funnel_statistics(pair_counts.user_ids, pair_counts.job_ids, pair_counts.impressions, pair_counts.redirects)
+
+
+def write_funnel_statistics(funnel_statistics: dict, output_filepath: str) -> None:
+    with open(output_filepath, "w") as output_file:
+        json.dump(funnel_statistics, output_file, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute activity funnel statistics from sparse per-pair counters.")
+    parser.add_argument("--activities", default="dataset/activities.jsonl")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", default=None, help="Write the statistics as JSON instead of printing them.")
+    args = parser.parse_args()
+    t0 = time.time()
+    funnel_statistics = calculate_funnel_statistics_from_file(args.activities, args.workers)
+    print(f"Funnel statistics duration (seconds): {time.time() - t0}")
+    if args.output is not None:
+        write_funnel_statistics(funnel_statistics, args.output)
+    else:
+        print(json.dumps(funnel_statistics, indent=4))
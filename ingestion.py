@@ -0,0 +1,229 @@
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+
+import json
+import os
+import numpy
+
+
+class Activity(Enum):
+    IMPRESSION = 1
+    REDIRECT = 2
+
+
+activity_type_codes: dict[str, int] = {activity.name.lower(): activity.value for activity in Activity}
+unknown_activity_type_code: int = 0
+
+
+class ActivityColumns:
+
+    user_id_dtype = numpy.int32
+    job_id_dtype = numpy.int32
+    type_code_dtype = numpy.uint8
+    timestamp_dtype = numpy.float64
+
+    def __init__(self, user_ids: numpy.ndarray, job_ids: numpy.ndarray, type_codes: numpy.ndarray, timestamps: numpy.ndarray) -> None:
+        self.user_ids = user_ids
+        self.job_ids = job_ids
+        self.type_codes = type_codes
+        self.timestamps = timestamps
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @classmethod
+    def empty(cls) -> "ActivityColumns":
+        return cls(
+            numpy.empty(0, dtype=cls.user_id_dtype),
+            numpy.empty(0, dtype=cls.job_id_dtype),
+            numpy.empty(0, dtype=cls.type_code_dtype),
+            numpy.empty(0, dtype=cls.timestamp_dtype)
+            )
+
+    @classmethod
+    def concatenate(cls, activity_columns: list["ActivityColumns"]) -> "ActivityColumns":
+        if not activity_columns:
+            return cls.empty()
+        return cls(
+            numpy.concatenate([columns.user_ids for columns in activity_columns]),
+            numpy.concatenate([columns.job_ids for columns in activity_columns]),
+            numpy.concatenate([columns.type_codes for columns in activity_columns]),
+            numpy.concatenate([columns.timestamps for columns in activity_columns])
+            )
+
+
+class PairCounts:
+
+    count_dtype = numpy.int64
+
+    def __init__(self, user_ids: numpy.ndarray, job_ids: numpy.ndarray, impressions: numpy.ndarray, redirects: numpy.ndarray) -> None:
+        self.user_ids = user_ids
+        self.job_ids = job_ids
+        self.impressions = impressions
+        self.redirects = redirects
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @classmethod
+    def from_activity_columns(cls, activity_columns: ActivityColumns) -> "PairCounts":
+        is_impression = activity_columns.type_codes == Activity.IMPRESSION.value
+        is_redirect = activity_columns.type_codes == Activity.REDIRECT.value
+        return cls.group_by_pair(
+            activity_columns.user_ids,
+            activity_columns.job_ids,
+            is_impression.astype(cls.count_dtype),
+            is_redirect.astype(cls.count_dtype)
+            )
+
+    @classmethod
+    def merge(cls, pair_counts: list["PairCounts"]) -> "PairCounts":
+        if not pair_counts:
+            return cls.from_activity_columns(ActivityColumns.empty())
+        return cls.group_by_pair(
+            numpy.concatenate([counts.user_ids for counts in pair_counts]),
+            numpy.concatenate([counts.job_ids for counts in pair_counts]),
+            numpy.concatenate([counts.impressions for counts in pair_counts]),
+            numpy.concatenate([counts.redirects for counts in pair_counts])
+            )
+
+    @classmethod
+    def group_by_pair(cls, user_ids: numpy.ndarray, job_ids: numpy.ndarray, impressions: numpy.ndarray, redirects: numpy.ndarray) -> "PairCounts":
+        pair_keys = encode_pair_keys(user_ids, job_ids)
+        unique_pair_keys, pair_positions = numpy.unique(pair_keys, return_inverse=True)
+        number_of_pairs = len(unique_pair_keys)
+        pair_user_ids, pair_job_ids = decode_pair_keys(unique_pair_keys)
+        return cls(
+            pair_user_ids.astype(ActivityColumns.user_id_dtype),
+            pair_job_ids.astype(ActivityColumns.job_id_dtype),
+            numpy.bincount(pair_positions, weights=impressions, minlength=number_of_pairs).astype(cls.count_dtype),
+            numpy.bincount(pair_positions, weights=redirects, minlength=number_of_pairs).astype(cls.count_dtype)
+            )
+
+
+def encode_pair_keys(user_ids: numpy.ndarray, job_ids: numpy.ndarray) -> numpy.ndarray:
+    return (user_ids.astype(numpy.int64) << 32) | job_ids.astype(numpy.int64)
+
+
+def decode_pair_keys(pair_keys: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    return pair_keys >> 32, pair_keys & 0xFFFFFFFF
+
+
+def parse_activity_lines(lines: list[bytes]) -> ActivityColumns:
+    lines = [line for line in lines if line.strip()]
+    activities = json.loads(b"[" + b",".join(lines) + b"]")
+    return activity_columns_from_records(activities)
+
+
+def activity_columns_from_records(activities: list[dict]) -> ActivityColumns:
+    number_of_activities = len(activities)
+    user_ids = numpy.fromiter(
+        (activity["user_id"] for activity in activities),
+        dtype=ActivityColumns.user_id_dtype,
+        count=number_of_activities
+        )
+    job_ids = numpy.fromiter(
+        (activity["job_id"] for activity in activities),
+        dtype=ActivityColumns.job_id_dtype,
+        count=number_of_activities
+        )
+    type_codes = numpy.fromiter(
+        (activity_type_codes.get(activity["type"], unknown_activity_type_code) for activity in activities),
+        dtype=ActivityColumns.type_code_dtype,
+        count=number_of_activities
+        )
+    timestamps = numpy.fromiter(
+        (activity.get("timestamp", numpy.nan) for activity in activities),
+        dtype=ActivityColumns.timestamp_dtype,
+        count=number_of_activities
+        )
+    return ActivityColumns(user_ids, job_ids, type_codes, timestamps)
+
+
+def read_activity_columns(activities_filepath: str, lines_per_chunk: int = 100_000) -> ActivityColumns:
+    activity_column_chunks = []
+    with open(activities_filepath, "rb") as input_file:
+        lines = []
+        for line in input_file:
+            lines.append(line)
+            if len(lines) == lines_per_chunk:
+                activity_column_chunks.append(parse_activity_lines(lines))
+                lines = []
+        if lines:
+            activity_column_chunks.append(parse_activity_lines(lines))
+    return ActivityColumns.concatenate(activity_column_chunks)
+
+
+def split_into_byte_range_shards(activities_filepath: str, number_of_shards: int) -> list[tuple[int, int]]:
+    file_size = os.path.getsize(activities_filepath)
+    shard_boundaries = [0]
+    with open(activities_filepath, "rb") as input_file:
+        for shard_number in range(1, number_of_shards):
+            approximate_boundary = max(file_size * shard_number // number_of_shards, shard_boundaries[-1])
+            if approximate_boundary == 0:
+                continue
+            # Move the boundary forward to the first line starting at or after the approximate offset.
+            input_file.seek(approximate_boundary - 1)
+            input_file.readline()
+            shard_boundaries.append(input_file.tell())
+    shard_boundaries.append(file_size)
+    byte_ranges = [
+        (shard_start, shard_end) 
+        for shard_start, shard_end in zip(shard_boundaries[:-1], shard_boundaries[1:]) 
+        if shard_start < shard_end
+        ]
+    return byte_ranges
+
+
+def iterate_line_chunks(activities_filepath: str, shard_start: int, shard_end: int, chunk_size_bytes: int):
+    unfinished_line = b""
+    with open(activities_filepath, "rb") as input_file:
+        input_file.seek(shard_start)
+        remaining_bytes = shard_end - shard_start
+        while remaining_bytes > 0:
+            chunk = input_file.read(min(chunk_size_bytes, remaining_bytes))
+            if not chunk:
+                break
+            remaining_bytes -= len(chunk)
+            lines = (unfinished_line + chunk).split(b"\n")
+            unfinished_line = lines.pop()
+            if lines:
+                yield lines
+    if unfinished_line.strip():
+        yield [unfinished_line]
+
+
+def read_activity_columns_in_byte_range(activities_filepath: str, shard_start: int, shard_end: int, chunk_size_bytes: int) -> ActivityColumns:
+    activity_column_chunks = [
+        parse_activity_lines(lines) 
+        for lines in iterate_line_chunks(activities_filepath, shard_start, shard_end, chunk_size_bytes)
+        ]
+    return ActivityColumns.concatenate(activity_column_chunks)
+
+
+def count_pair_activities_in_byte_range(activities_filepath: str, shard_start: int, shard_end: int, chunk_size_bytes: int) -> PairCounts:
+    partial_pair_counts = PairCounts.merge([])
+    for lines in iterate_line_chunks(activities_filepath, shard_start, shard_end, chunk_size_bytes):
+        chunk_pair_counts = PairCounts.from_activity_columns(parse_activity_lines(lines))
+        partial_pair_counts = PairCounts.merge([partial_pair_counts, chunk_pair_counts])
+    return partial_pair_counts
+
+
+def read_pair_counts_sharded(activities_filepath: str, number_of_workers: int = 1, chunk_size_bytes: int = 16 * 2**20) -> PairCounts:
+    # Peak memory per worker is bounded by one chunk of raw lines plus that worker's partial pair table.
+    byte_ranges = split_into_byte_range_shards(activities_filepath, number_of_workers)
+    if number_of_workers == 1 or len(byte_ranges) <= 1:
+        partial_pair_counts = [
+            count_pair_activities_in_byte_range(activities_filepath, shard_start, shard_end, chunk_size_bytes) 
+            for shard_start, shard_end in byte_ranges
+            ]
+    else:
+        with ProcessPoolExecutor(max_workers=number_of_workers) as executor:
+            partial_pair_counts = list(executor.map(
+                count_pair_activities_in_byte_range,
+                [activities_filepath] * len(byte_ranges),
+                [shard_start for shard_start, _ in byte_ranges],
+                [shard_end for _, shard_end in byte_ranges],
+                [chunk_size_bytes] * len(byte_ranges)
+                ))
+    return PairCounts.merge(partial_pair_counts)
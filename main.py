@@ -1,7 +1,17 @@
-from recommender import Recommender
+from batching import RecommendationBatcher
+from bulk_serialization import get_media_type, iter_encoded_recommendations
+from metrics import metrics
+from model_manager import ModelManager
+from recommendation_cache import RecommendationCache
+from time_decay import ScoreDecay
 
+import os
+import time
 import uvicorn
-from fastapi import FastAPI
+from typing import Literal
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
 
@@ -14,31 +24,250 @@ class Users(BaseModel):
 class Job(BaseModel):
     job_id: int
 
+class ActivityEvent(BaseModel):
+    user_id: int
+    job_id: int
+    type: str
+    timestamp: float = None
+
+class ActivityEvents(BaseModel):
+    activities: list[ActivityEvent]
+
+class JobAvailability(BaseModel):
+    job_ids: list[int]
+    is_available: bool
+
+
+artifacts_root = os.environ.get("RECOMMENDER_ARTIFACTS", "artifacts")
+activities_filepath = os.environ.get("RECOMMENDER_ACTIVITIES", "dataset/activities.jsonl")
+jobs_filepath = os.environ.get("RECOMMENDER_JOBS", "dataset/jobs.jsonl")
+users_filepath = os.environ.get("RECOMMENDER_USERS", "dataset/users.jsonl")
+segment_attribute = os.environ.get("RECOMMENDER_SEGMENT_ATTRIBUTE", "degree_subject")
+micro_batching_enabled = os.environ.get("RECOMMENDER_MICRO_BATCHING", "1") == "1"
+batch_window_milliseconds = float(os.environ.get("RECOMMENDER_BATCH_WINDOW_MS", "2"))
+max_batch_size = int(os.environ.get("RECOMMENDER_MAX_BATCH_SIZE", "64"))
+retrain_interval_seconds = float(os.environ.get("RECOMMENDER_RETRAIN_INTERVAL_SECONDS", "0"))
+cache_max_entries = int(os.environ.get("RECOMMENDER_CACHE_MAX_ENTRIES", "100000"))
+cache_ttl_seconds = float(os.environ.get("RECOMMENDER_CACHE_TTL_SECONDS", "300"))
+metrics_enabled = os.environ.get("RECOMMENDER_METRICS", "1") == "1"
+memory_tracing_enabled = os.environ.get("RECOMMENDER_TRACE_MEMORY", "0") == "1"
+profiling_enabled = os.environ.get("RECOMMENDER_PROFILING", "0") == "1"
+number_of_scoring_shards = int(os.environ.get("RECOMMENDER_SCORING_SHARDS", "0"))
+bulk_chunk_size = int(os.environ.get("RECOMMENDER_BULK_CHUNK_SIZE", "1024"))
+background_loading_enabled = os.environ.get("RECOMMENDER_BACKGROUND_LOADING", "0") == "1"
+score_half_life_days = os.environ.get("RECOMMENDER_SCORE_HALF_LIFE_DAYS")
+score_max_lookback_days = os.environ.get("RECOMMENDER_SCORE_MAX_LOOKBACK_DAYS")
+ann_index_enabled = os.environ.get("RECOMMENDER_ANN_INDEX", "0") == "1"
+ann_clusters = os.environ.get("RECOMMENDER_ANN_CLUSTERS")
+ann_probes = int(os.environ.get("RECOMMENDER_ANN_PROBES", "8"))
+
+if metrics_enabled:
+    metrics.enable(trace_memory=memory_tracing_enabled)
+
+score_decay = None
+if score_half_life_days or score_max_lookback_days:
+    score_decay = ScoreDecay(
+        float(score_half_life_days) * 86400 if score_half_life_days else None,
+        float(score_max_lookback_days) * 86400 if score_max_lookback_days else None
+        )
+
+ann_index_parameters = None
+if ann_index_enabled:
+    ann_index_parameters = {"number_of_clusters": int(ann_clusters) if ann_clusters else None, "number_of_probes": ann_probes}
+
+model_manager = ModelManager(
+    artifacts_root,
+    activities_filepath,
+    ingestion_mode="columnar",
+    cache_directory="dataset/activity_cache",
+    retrain_interval_seconds=retrain_interval_seconds,
+    jobs_filepath=jobs_filepath,
+    users_filepath=users_filepath if os.path.exists(users_filepath) else None,
+    segment_attribute=segment_attribute,
+    number_of_scoring_shards=number_of_scoring_shards,
+    score_decay=score_decay,
+    ann_index_parameters=ann_index_parameters
+    )
+recommendation_cache = RecommendationCache(max_entries=cache_max_entries, ttl_seconds=cache_ttl_seconds)
+# Cache keys include the model version and update generation; clearing on swap and invalidating updated users just
+# release entries of previous models early.
+model_manager.swap_listeners.append(lambda recommender: recommendation_cache.clear())
+model_manager.update_listeners.append(lambda update_summary: recommendation_cache.invalidate_users(update_summary["updated_user_ids"]))
+model_manager.availability_listeners.append(recommendation_cache.clear)
+
+
+def score_bulk_users(recommender, user_ids: list[int], number_of_recommendations: int) -> dict:
+    metrics.observe_batch_size("micro_batcher", len(user_ids))
+    return recommendation_cache.get_job_recommendations_for_bulk_users(recommender, user_ids, number_of_recommendations)
+
+single_user_batcher = RecommendationBatcher(
+    score_bulk_users,
+    batch_window_seconds=batch_window_milliseconds / 1000,
+    max_batch_size=max_batch_size
+    )
+
+
+def collect_model_and_cache_metrics() -> list[str]:
+    model_info = model_manager.get_model_info()
+    cache_statistics = recommendation_cache.get_statistics()
+    lines = [
+        "# HELP recommender_model_trained_at_seconds Training timestamp of the served model.",
+        "# TYPE recommender_model_trained_at_seconds gauge",
+        f'recommender_model_trained_at_seconds{{model_version="{model_info["model_version"]}"}} {model_info["trained_at"]}',
+        "# HELP recommender_cache_entries Number of cached responses.",
+        "# TYPE recommender_cache_entries gauge",
+        f"recommender_cache_entries {cache_statistics['entries']}"
+        ]
+    for counter_name in ("hits", "misses", "evictions", "expirations", "invalidations"):
+        lines.append(f"# TYPE recommender_cache_{counter_name}_total counter")
+        lines.append(f"recommender_cache_{counter_name}_total {cache_statistics[counter_name]}")
+    return lines
+
+metrics.collectors.append(collect_model_and_cache_metrics)
+
+
+def collect_training_stage_metrics() -> list[str]:
+    # Training runs in a spawned process, so its stage metrics come from the training report saved with the model.
+    model_info = model_manager.get_model_info()
+    training_report = model_info["training_report"] or {}
+    lines = []
+    for report_key, metric_name, documentation in (
+            ("stage_durations", "recommender_training_stage_duration_seconds", "Duration of each stage of the training that built the served model."),
+            ("stage_peak_traced_memory_bytes", "recommender_training_stage_peak_traced_memory_bytes", "Peak traced memory of each stage of the training that built the served model."),
+            ("stage_max_rss_bytes", "recommender_training_stage_max_rss_bytes", "Peak resident set size of the training process when each stage finished.")
+            ):
+        lines.append(f"# HELP {metric_name} {documentation}")
+        lines.append(f"# TYPE {metric_name} gauge")
+        for stage, value in sorted(training_report.get(report_key, {}).items()):
+            lines.append(f'{metric_name}{{model_version="{model_info["model_version"]}",stage="{stage}"}} {value}')
+    return lines
 
-recommender = Recommender("dataset/activities.jsonl")
-recommender.build_sparse_matrix()
-recommender.train_als_model()
+metrics.collectors.append(collect_training_stage_metrics)
 
 app = FastAPI()
 
+
+async def record_request_metrics(request: Request, call_next):
+    # Only requests to known routes get their own series, so arbitrary paths cannot blow up the label cardinality.
+    path = request.url.path if request.url.path in route_paths else "other"
+    t0 = time.perf_counter()
+    if profiling_enabled and request.headers.get("x-profile") == "1":
+        with metrics.profile(path):
+            response = await call_next(request)
+    else:
+        response = await call_next(request)
+    metrics.observe_request(path, time.perf_counter() - t0)
+    return response
+
+# The middleware is only installed when something consumes it, so disabled instrumentation adds no per-request work.
+if metrics_enabled or profiling_enabled:
+    app.middleware("http")(record_request_metrics)
+
+@app.on_event("startup")
+def start_model_manager():
+    # The first model is loaded (or trained) here rather than at import: training runs in a spawned process, which
+    # re-imports this module as __mp_main__ under `python main.py` and must not start a training of its own.
+    if background_loading_enabled:
+        model_manager.load_in_background()
+    else:
+        model_manager.load_or_train()
+    model_manager.start()
+
+@app.on_event("shutdown")
+def stop_model_manager():
+    model_manager.stop()
+
+
+def get_ready_recommender():
+    # Until the first model is loaded, model endpoints answer 503 so clients and load balancers retry later.
+    recommender = model_manager.recommender
+    if recommender is None:
+        raise HTTPException(status_code=503, detail="Model is warming up, retry once /health/ready reports ready.", headers={"Retry-After": "1"})
+    return recommender
+
+
+@app.get("/health/live")
+async def check_liveness():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def check_readiness():
+    readiness = model_manager.get_readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
 @app.post("/recommend/jobs_single_user/") 
-def recommend_jobs_single_user(user: User):
-    response = recommender.get_job_recommendations_for_single_user(user.user_id)
-    single_user_job_recommendations = {"user_id": user.user_id, "jobs":response}
+async def recommend_jobs_single_user(user: User, recommender=Depends(get_ready_recommender)):
+    # Jobs and tier both come from the model the request started with, so a swap or update mid-request cannot mix them.
+    if micro_batching_enabled:
+        response = await single_user_batcher.submit(recommender, user.user_id)
+    else:
+        response = await run_in_threadpool(recommendation_cache.get_job_recommendations_for_single_user, recommender, user.user_id)
+    tier = recommender.get_recommendation_tiers([user.user_id])[0]
+    single_user_job_recommendations = {"user_id": user.user_id, "tier": tier, "jobs":response}
     return single_user_job_recommendations
 
 @app.post("/recommend/jobs_multiple_users/") 
-def recommend_jobs_bulk_users(users: Users):
-    response = recommender.get_job_recommendations_for_bulk_users(users.user_ids)
+def recommend_jobs_bulk_users(
+        users: Users, 
+        include_tiers: bool = False, 
+        response_format: Literal["json", "ndjson", "binary"] = None, 
+        recommender=Depends(get_ready_recommender)
+        ):
+    metrics.observe_batch_size("bulk_endpoint", len(users.user_ids))
+    if response_format is not None:
+        # Encoded straight from the score arrays and streamed chunk by chunk of users, bypassing the response cache.
+        body_chunks = iter_encoded_recommendations(recommender, users.user_ids, response_format, include_tiers=include_tiers, chunk_size=bulk_chunk_size)
+        return StreamingResponse(body_chunks, media_type=get_media_type(response_format))
+    response = recommendation_cache.get_job_recommendations_for_bulk_users(recommender, users.user_ids)
+    if include_tiers:
+        tiers = dict(zip(users.user_ids, recommender.get_recommendation_tiers(users.user_ids)))
+        response = {user_id: {"tier": tiers[user_id], "jobs": jobs} for user_id, jobs in response.items()}
     multi_user_job_recommendations = response
     return multi_user_job_recommendations
 
 @app.post("/recommend/find_similar_jobs/") 
-def recommend_similar_jobs(job: Job):
-    response = recommender.find_similar_jobs(job.job_id)
-    similar_job_recommendations = {"job_id": job.job_id, "jobs": response}
+def recommend_similar_jobs(job: Job, recommender=Depends(get_ready_recommender)):
+    response = recommendation_cache.find_similar_jobs(recommender, job.job_id)
+    similar_job_recommendations = {"job_id": job.job_id, "tier": recommender.get_similar_jobs_tier(job.job_id), "jobs": response}
     return similar_job_recommendations
 
+@app.get("/model/")
+def get_model_info():
+    return model_manager.get_model_info()
+
+@app.post("/model/retrain/")
+def retrain_model():
+    model_manager.retrain()
+    return model_manager.get_model_info()
+
+@app.post("/model/update/", dependencies=[Depends(get_ready_recommender)])
+def update_model(activity_events: ActivityEvents):
+    activities = [activity_event.dict(exclude_none=True) for activity_event in activity_events.activities]
+    try:
+        update_summary = model_manager.update_with_activities(activities)
+    except ValueError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    return update_summary
+
+@app.post("/jobs/availability/")
+def update_job_availability(job_availability: JobAvailability):
+    number_of_updated_jobs = model_manager.set_job_availability(job_availability.job_ids, job_availability.is_available)
+    return {"updated_jobs": number_of_updated_jobs}
+
+@app.get("/cache/")
+def get_cache_statistics():
+    return recommendation_cache.get_statistics()
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profiles/")
+def get_profiles():
+    return list(metrics.profiles)
+
+route_paths = {route.path for route in app.routes}
+
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
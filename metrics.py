@@ -0,0 +1,220 @@
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import bisect
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+
+latency_buckets_seconds: tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+    )
+stage_buckets_seconds: tuple[float, ...] = (0.001, 0.01, 0.1, 1.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+batch_size_buckets: tuple[float, ...] = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+def get_max_rss_bytes() -> int:
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def format_labels(label_names: tuple[str, ...], label_values: tuple, extra_labels: str = "") -> str:
+    labels = [f'{label_name}="{label_value}"' for label_name, label_value in zip(label_names, label_values)]
+    if extra_labels:
+        labels.append(extra_labels)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Histogram:
+
+    def __init__(self, name: str, documentation: str, buckets: tuple[float, ...], label_names: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.label_names = label_names
+        # Per label values: [count per bucket (last one is +Inf), sum of observations].
+        self.series: dict[tuple, list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, label_values: tuple = ()) -> None:
+        bucket_position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket_position] += 1
+            series[1] += value
+
+    def get_count(self, label_values: tuple = ()) -> int:
+        series = self.series.get(label_values)
+        return sum(series[0]) if series is not None else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series_items = [(label_values, list(bucket_counts), total) for label_values, (bucket_counts, total) in self.series.items()]
+        for label_values, bucket_counts, total in sorted(series_items):
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float("inf"),), bucket_counts):
+                cumulative_count += bucket_count
+                upper_bound_label = "+Inf" if upper_bound == float("inf") else repr(float(upper_bound))
+                labels = format_labels(self.label_names, label_values, f'le="{upper_bound_label}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative_count}")
+            labels = format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative_count}")
+        return lines
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval_seconds: float = 0.001, max_stack_depth: int = 64) -> None:
+        self.interval_seconds = interval_seconds
+        self.max_stack_depth = max_stack_depth
+        self.stack_counts: Counter = Counter()
+        self.number_of_samples = 0
+        self.stop_event = threading.Event()
+        self.sampling_thread: threading.Thread = None
+
+    def start(self) -> None:
+        self.sampling_thread = threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+        self.sampling_thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.sampling_thread.join()
+
+    def run(self) -> None:
+        # Samples every thread but its own: requests hand work to thread pools, so the request thread alone misses it.
+        sampling_thread_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval_seconds):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampling_thread_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_stack_depth:
+                    stack.append(f"{frame.f_code.co_name} ({frame.f_code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stack_counts[";".join(reversed(stack))] += 1
+            self.number_of_samples += 1
+
+    def get_collapsed_stacks(self) -> list[str]:
+        # Collapsed stack format, one "frame;frame;frame count" line per stack, as consumed by flamegraph tools.
+        return [f"{stack} {count}" for stack, count in self.stack_counts.most_common()]
+
+
+class MetricsRegistry:
+
+    max_stored_profiles: int = 20
+
+    def __init__(self, enabled: bool = False, trace_memory: bool = False) -> None:
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.stage_durations = Histogram(
+            "recommender_stage_duration_seconds",
+            "Duration of ingestion, implicit scoring, matrix build, training and funnel statistics stages.",
+            stage_buckets_seconds,
+            ("stage",)
+            )
+        self.request_latencies = Histogram(
+            "recommender_request_latency_seconds",
+            "Latency of API requests per query path.",
+            latency_buckets_seconds,
+            ("path",)
+            )
+        self.batch_sizes = Histogram(
+            "recommender_bulk_batch_size",
+            "Number of users scored per bulk call.",
+            batch_size_buckets,
+            ("source",)
+            )
+        self.last_stage_durations: dict[str, float] = {}
+        self.stage_peak_traced_memory: dict[str, int] = {}
+        self.stage_max_rss: dict[str, int] = {}
+        self.collectors: list[Callable[[], list[str]]] = []
+        self.profiles: deque = deque(maxlen=self.max_stored_profiles)
+
+    def enable(self, trace_memory: bool = False) -> None:
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self) -> None:
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = False
+
+    @contextmanager
+    def time_stage(self, stage: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - t0
+            self.stage_durations.observe(duration, (stage,))
+            self.last_stage_durations[stage] = duration
+            self.stage_max_rss[stage] = get_max_rss_bytes()
+            # numpy reports its buffers to tracemalloc, so the traced peak covers the arrays built by the stage.
+            if self.trace_memory and tracemalloc.is_tracing():
+                self.stage_peak_traced_memory[stage] = tracemalloc.get_traced_memory()[1]
+
+    def observe_request(self, path: str, duration: float) -> None:
+        if self.enabled:
+            self.request_latencies.observe(duration, (path,))
+
+    def observe_batch_size(self, source: str, batch_size: int) -> None:
+        if self.enabled:
+            self.batch_sizes.observe(batch_size, (source,))
+
+    @contextmanager
+    def profile(self, label: str, interval_seconds: float = 0.001) -> Iterator[SamplingProfiler]:
+        sampling_profiler = SamplingProfiler(interval_seconds)
+        sampling_profiler.start()
+        t0 = time.perf_counter()
+        try:
+            yield sampling_profiler
+        finally:
+            sampling_profiler.stop()
+            self.profiles.append({
+                "label": label,
+                "duration_seconds": time.perf_counter() - t0,
+                "number_of_samples": sampling_profiler.number_of_samples,
+                "collapsed_stacks": sampling_profiler.get_collapsed_stacks()
+            })
+
+    def render(self) -> str:
+        lines = []
+        for histogram in (self.stage_durations, self.request_latencies, self.batch_sizes):
+            lines.extend(histogram.render())
+        lines.append("# HELP recommender_stage_last_duration_seconds Duration of the latest run of each stage.")
+        lines.append("# TYPE recommender_stage_last_duration_seconds gauge")
+        for stage, duration in sorted(self.last_stage_durations.items()):
+            lines.append(f'recommender_stage_last_duration_seconds{{stage="{stage}"}} {duration}')
+        lines.append("# HELP recommender_stage_peak_traced_memory_bytes Peak traced Python and numpy memory of the latest run of each stage.")
+        lines.append("# TYPE recommender_stage_peak_traced_memory_bytes gauge")
+        for stage, peak_memory in sorted(self.stage_peak_traced_memory.items()):
+            lines.append(f'recommender_stage_peak_traced_memory_bytes{{stage="{stage}"}} {peak_memory}')
+        lines.append("# HELP recommender_stage_max_rss_bytes Peak resident set size of the process when each stage last finished.")
+        lines.append("# TYPE recommender_stage_max_rss_bytes gauge")
+        for stage, max_rss in sorted(self.stage_max_rss.items()):
+            lines.append(f'recommender_stage_max_rss_bytes{{stage="{stage}"}} {max_rss}')
+        lines.append("# HELP recommender_process_max_rss_bytes Peak resident set size of the process.")
+        lines.append("# TYPE recommender_process_max_rss_bytes gauge")
+        lines.append(f"recommender_process_max_rss_bytes {get_max_rss_bytes()}")
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,231 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable
+from metrics import metrics
+
+import multiprocessing
+import os
+import threading
+
+# The recommender stack (scipy, implicit) is imported on first load rather than here, so a server importing the
+# manager can start listening before paying for it.
+if TYPE_CHECKING:
+    from als_training import TrainingConfig
+    from recommender import Recommender
+    from time_decay import ScoreDecay
+
+
+def initialize_training_process(niceness: int, metrics_enabled: bool, trace_memory: bool) -> None:
+    # Training competes with request handling for CPU; the serving process keeps priority.
+    os.nice(niceness)
+    # Stages are timed in this process; their metrics reach the server in the training report of the artifact.
+    if metrics_enabled:
+        metrics.enable(trace_memory=trace_memory)
+
+
+class ModelManager:
+
+    training_process_niceness: int = 10
+
+    def __init__(
+            self,
+            artifacts_root: str,
+            activities_filepath: str,
+            ingestion_mode: str = "columnar",
+            cache_directory: str = None,
+            retrain_interval_seconds: float = None,
+            training_config: "TrainingConfig" = None,
+            jobs_filepath: str = None,
+            users_filepath: str = None,
+            segment_attribute: str = None,
+            number_of_scoring_shards: int = 0,
+            score_decay: "ScoreDecay" = None,
+            ann_index_parameters: dict = None
+            ) -> None:
+        self.artifacts_root = artifacts_root
+        self.activities_filepath = activities_filepath
+        self.ingestion_mode = ingestion_mode
+        self.cache_directory = cache_directory
+        self.retrain_interval_seconds = retrain_interval_seconds
+        self.training_config = training_config
+        self.jobs_filepath = jobs_filepath
+        self.users_filepath = users_filepath
+        self.segment_attribute = segment_attribute
+        self.number_of_scoring_shards = number_of_scoring_shards
+        self.score_decay = score_decay
+        self.ann_index_parameters = ann_index_parameters
+        # Availability changes made through the API since the catalog was read; they are re-applied to every new model.
+        self.job_availability_overrides: dict[int, bool] = {}
+        self.recommender: "Recommender" = None
+        self.retrain_future: Future = None
+        self.last_retrain_error: str = None
+        self.loading_thread: threading.Thread = None
+        self.loading_error: str = None
+        self.retrain_lock = threading.Lock()
+        self.update_lock = threading.Lock()
+        self.swap_listeners: list[Callable[["Recommender"], None]] = []
+        self.update_listeners: list[Callable[[dict], None]] = []
+        self.availability_listeners: list[Callable[[], None]] = []
+        self.stop_event = threading.Event()
+        self.schedule_thread: threading.Thread = None
+        # Training runs in a fresh spawned process so it never shares the server's threads, BLAS pools or GIL.
+        self.training_executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initialize_training_process,
+            initargs=(self.training_process_niceness, metrics.enabled, metrics.trace_memory)
+            )
+
+    def load_or_train(self) -> "Recommender":
+        from recommender import Recommender
+        if os.path.exists(os.path.join(self.artifacts_root, Recommender.latest_artifact_pointer_filename)):
+            self.swap_model(Recommender.load_model(self.artifacts_root))
+        else:
+            self.retrain().result()
+        return self.recommender
+
+    def load_in_background(self) -> threading.Thread:
+        # The server listens right away; requests needing a model are answered as warming up until the first swap.
+        if self.loading_thread is None:
+            self.loading_thread = threading.Thread(target=self.run_initial_load, name="model-initial-load", daemon=True)
+            self.loading_thread.start()
+        return self.loading_thread
+
+    def run_initial_load(self) -> None:
+        try:
+            self.load_or_train()
+        except Exception as error:
+            self.loading_error = repr(error)
+            print(f"Initial model loading failed: {error!r}")
+
+    def is_ready(self) -> bool:
+        return self.recommender is not None
+
+    def get_readiness(self) -> dict:
+        readiness = {
+            "ready": self.is_ready(),
+            "model_version": getattr(self.recommender, "model_version", None),
+            "loading": self.loading_thread is not None and self.loading_thread.is_alive(),
+            "loading_error": self.loading_error
+        }
+        return readiness
+
+    def swap_model(self, recommender: "Recommender") -> None:
+        # Rebinding the attribute is atomic: requests that already read the previous model keep using it.
+        self.apply_job_availability(recommender)
+        # Retrained models carry the index in their manifest; artifacts trained without one get it built on load.
+        if self.ann_index_parameters is not None and recommender.ann_index is None:
+            recommender.enable_ann_index(**self.ann_index_parameters)
+        if self.number_of_scoring_shards:
+            recommender.enable_sharded_scoring(self.number_of_scoring_shards)
+        with self.update_lock:
+            previous_recommender = self.recommender
+            self.recommender = recommender
+        # Requests still holding the previous model fall back to scoring locally once its shards are closed.
+        if previous_recommender is not None:
+            previous_recommender.disable_sharded_scoring()
+        for swap_listener in self.swap_listeners:
+            swap_listener(recommender)
+
+    def update_with_activities(self, activities: list[dict]) -> dict:
+        # Updates are applied to a copy of the served model and published by rebinding the attribute, like a retrained
+        # model, so requests never see new ids before their matrix rows and factors. They are serialized with each
+        # other and with swaps.
+        with self.update_lock:
+            recommender = self.recommender.copy_for_update()
+            update_summary = recommender.update_with_activities(activities)
+            self.recommender = recommender
+        for update_listener in self.update_listeners:
+            update_listener(update_summary)
+        return update_summary
+
+    def apply_job_availability(self, recommender: "Recommender") -> None:
+        if self.jobs_filepath is not None and os.path.exists(self.jobs_filepath):
+            recommender.load_job_catalog(self.jobs_filepath)
+        for is_available in (True, False):
+            job_ids = [job_id for job_id, job_is_available in self.job_availability_overrides.items() if job_is_available == is_available]
+            if job_ids:
+                recommender.set_job_availability(job_ids, is_available)
+
+    def set_job_availability(self, job_ids: list[int], is_available: bool) -> int:
+        with self.update_lock:
+            self.job_availability_overrides.update(dict.fromkeys(job_ids, is_available))
+            # Before the first model is loaded the overrides are only recorded; swap_model applies them.
+            number_of_updated_jobs = self.recommender.set_job_availability(job_ids, is_available) if self.recommender is not None else 0
+        for availability_listener in self.availability_listeners:
+            availability_listener()
+        return number_of_updated_jobs
+
+    def retrain(self) -> Future:
+        from train import train_and_save_model
+        with self.retrain_lock:
+            if self.retrain_future is not None and not self.retrain_future.done():
+                return self.retrain_future
+            training_future = self.training_executor.submit(
+                train_and_save_model,
+                self.activities_filepath,
+                self.artifacts_root,
+                self.ingestion_mode,
+                self.cache_directory,
+                self.training_config,
+                self.users_filepath,
+                self.segment_attribute,
+                self.score_decay,
+                self.ann_index_parameters
+                )
+            retrain_future = Future()
+            training_future.add_done_callback(lambda training_future: self.finish_retrain(training_future, retrain_future))
+            self.retrain_future = retrain_future
+            return retrain_future
+
+    def finish_retrain(self, training_future: Future, retrain_future: Future) -> None:
+        # Loading memory-maps the new artifacts, so the swap does not copy the factors.
+        from recommender import Recommender
+        try:
+            artifact_directory = training_future.result()
+            recommender = Recommender.load_model(self.artifacts_root, os.path.basename(artifact_directory))
+        except Exception as error:
+            self.last_retrain_error = repr(error)
+            print(f"Model retraining failed, keeping model version {self.get_model_info()['model_version']}: {error!r}")
+            retrain_future.set_exception(error)
+            return
+        self.last_retrain_error = None
+        self.swap_model(recommender)
+        retrain_future.set_result(recommender.model_version)
+
+    def is_retraining(self) -> bool:
+        return self.retrain_future is not None and not self.retrain_future.done()
+
+    def get_model_info(self) -> dict:
+        recommender = self.recommender
+        model_info = {
+            "model_version": getattr(recommender, "model_version", None),
+            "trained_at": getattr(recommender, "trained_at", None),
+            "training_report": getattr(recommender, "training_report", None),
+            "retraining": self.is_retraining(),
+            "retrain_interval_seconds": self.retrain_interval_seconds,
+            "last_retrain_error": self.last_retrain_error
+        }
+        return model_info
+
+    def start(self) -> None:
+        if not self.retrain_interval_seconds or self.schedule_thread is not None:
+            return
+        self.stop_event.clear()
+        self.schedule_thread = threading.Thread(target=self.run_schedule, name="model-retrain-schedule", daemon=True)
+        self.schedule_thread.start()
+
+    def run_schedule(self) -> None:
+        while not self.stop_event.wait(self.retrain_interval_seconds):
+            try:
+                self.retrain().result()
+            except Exception:
+                pass
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.schedule_thread is not None:
+            self.schedule_thread.join()
+            self.schedule_thread = None
+        self.training_executor.shutdown(wait=True, cancel_futures=True)
+        if self.recommender is not None:
+            self.recommender.disable_sharded_scoring()
@@ -0,0 +1,74 @@
+from entity_index import EntityIndex
+from ingestion import decode_pair_keys
+
+import numpy
+
+
+class PendingPairs:
+
+    # (user, job) pairs touched by incremental updates, held next to the CSR matrix until enough of them accumulate:
+    # splicing a few pairs into the CSR arrays rewrites all of them, and requests may be reading the stored arrays, so
+    # new pairs and the new values of stored pairs are kept sorted by pair key (row << 32 | column) and merged into
+    # fresh arrays in one pass once they outgrow merge_fraction of the stored pairs. Pending values supersede stored ones.
+    merge_fraction: float = 1 / 64
+    merge_minimum: int = 4096
+
+    def __init__(self, pair_keys: numpy.ndarray, data: numpy.ndarray, counters: dict[str, numpy.ndarray]) -> None:
+        self.pair_keys = pair_keys
+        self.data = data
+        # Per-pair counters by name, aligned with pair_keys, like the matrix counters of the recommender.
+        self.counters = counters
+
+    def __len__(self) -> int:
+        return len(self.pair_keys)
+
+    @classmethod
+    def empty(cls, data_dtype: numpy.dtype, counter_dtypes: dict[str, numpy.dtype]) -> "PendingPairs":
+        return cls(
+            numpy.empty(0, dtype=numpy.int64), 
+            numpy.empty(0, dtype=data_dtype), 
+            {counter_name: numpy.empty(0, dtype=counter_dtype) for counter_name, counter_dtype in counter_dtypes.items()}
+            )
+
+    def get_counter_dtypes(self) -> dict[str, numpy.dtype]:
+        return {counter_name: counter.dtype for counter_name, counter in self.counters.items()}
+
+    def get_positions(self, pair_keys: numpy.ndarray) -> numpy.ndarray:
+        if not len(self.pair_keys):
+            return numpy.full(len(pair_keys), EntityIndex.missing_position, dtype=numpy.int64)
+        positions = numpy.minimum(numpy.searchsorted(self.pair_keys, pair_keys), len(self.pair_keys) - 1)
+        return numpy.where(self.pair_keys[positions] == pair_keys, positions, EntityIndex.missing_position)
+
+    def set_pairs(self, pair_keys: numpy.ndarray, data: numpy.ndarray, counters: dict[str, numpy.ndarray]) -> "PendingPairs":
+        # Returns new pending pairs with these (unique) pairs set, overwriting those already pending; the cost grows
+        # with the pending pairs only, never with the matrix. The arrays of this object are left untouched.
+        positions = self.get_positions(pair_keys)
+        is_pending = positions != EntityIndex.missing_position
+        pair_order = numpy.argsort(pair_keys[~is_pending])
+        insert_positions = numpy.searchsorted(self.pair_keys, pair_keys[~is_pending][pair_order])
+
+        def set_values(pending_values: numpy.ndarray, values: numpy.ndarray) -> numpy.ndarray:
+            pending_values = pending_values.copy()
+            pending_values[positions[is_pending]] = values[is_pending]
+            return numpy.insert(pending_values, insert_positions, values[~is_pending][pair_order])
+
+        return PendingPairs(
+            numpy.insert(self.pair_keys, insert_positions, pair_keys[~is_pending][pair_order]),
+            set_values(self.data, data),
+            {counter_name: set_values(pending_counter, counters[counter_name]) for counter_name, pending_counter in self.counters.items()}
+            )
+
+    def get_row_positions(self, user_matrix_row_idx: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # (position in user_matrix_row_idx, pending position) of every pending pair of these rows; a row's pairs are
+        # contiguous because the keys are sorted by row first.
+        user_matrix_row_idx = numpy.asarray(user_matrix_row_idx, dtype=numpy.int64)
+        row_starts = numpy.searchsorted(self.pair_keys, user_matrix_row_idx << 32)
+        row_lengths = numpy.searchsorted(self.pair_keys, (user_matrix_row_idx + 1) << 32) - row_starts
+        pending_offsets = numpy.repeat(row_starts - numpy.cumsum(row_lengths) + row_lengths, row_lengths)
+        return numpy.repeat(numpy.arange(len(user_matrix_row_idx)), row_lengths), numpy.arange(row_lengths.sum()) + pending_offsets
+
+    def get_job_matrix_column_idx(self, positions: numpy.ndarray) -> numpy.ndarray:
+        return decode_pair_keys(self.pair_keys[positions])[1]
+
+    def is_due_for_merge(self, number_of_stored_pairs: int) -> bool:
+        return len(self.pair_keys) > max(self.merge_minimum, self.merge_fraction * number_of_stored_pairs)
@@ -0,0 +1,55 @@
+from entity_index import EntityIndex
+
+import numpy
+
+
+class PendingUserFactors:
+
+    # Factors re-solved by incremental updates, held next to the user factors until enough of them accumulate: requests
+    # may be gathering rows of the factor array at any time, so solved rows are never written into it. They are kept
+    # sorted by matrix row, applied whenever factors are gathered, and merged into a fresh copy of the factor array once
+    # they outgrow merge_fraction of the users.
+    merge_fraction: float = 1 / 64
+    merge_minimum: int = 1024
+
+    def __init__(self, user_matrix_row_idx: numpy.ndarray, factors: numpy.ndarray) -> None:
+        self.user_matrix_row_idx = user_matrix_row_idx
+        self.factors = factors
+
+    def __len__(self) -> int:
+        return len(self.user_matrix_row_idx)
+
+    @classmethod
+    def empty(cls, number_of_factors: int, factor_dtype: numpy.dtype) -> "PendingUserFactors":
+        return cls(numpy.empty(0, dtype=numpy.int64), numpy.empty((0, number_of_factors), dtype=factor_dtype))
+
+    def get_positions(self, user_matrix_row_idx: numpy.ndarray) -> numpy.ndarray:
+        if not len(self.user_matrix_row_idx):
+            return numpy.full(len(user_matrix_row_idx), EntityIndex.missing_position, dtype=numpy.int64)
+        positions = numpy.minimum(numpy.searchsorted(self.user_matrix_row_idx, user_matrix_row_idx), len(self.user_matrix_row_idx) - 1)
+        return numpy.where(self.user_matrix_row_idx[positions] == user_matrix_row_idx, positions, EntityIndex.missing_position)
+
+    def set_factors(self, user_matrix_row_idx: numpy.ndarray, factors: numpy.ndarray) -> "PendingUserFactors":
+        # Returns new pending factors with these (unique) rows set; the cost grows with the pending rows only.
+        positions = self.get_positions(user_matrix_row_idx)
+        is_pending = positions != EntityIndex.missing_position
+        pending_factors = self.factors.copy()
+        pending_factors[positions[is_pending]] = factors[is_pending]
+        new_row_order = numpy.argsort(user_matrix_row_idx[~is_pending])
+        new_user_matrix_row_idx = user_matrix_row_idx[~is_pending][new_row_order]
+        insert_positions = numpy.searchsorted(self.user_matrix_row_idx, new_user_matrix_row_idx)
+        return PendingUserFactors(
+            numpy.insert(self.user_matrix_row_idx, insert_positions, new_user_matrix_row_idx),
+            numpy.insert(pending_factors, insert_positions, factors[~is_pending][new_row_order], axis=0)
+            )
+
+    def apply(self, user_matrix_row_idx: numpy.ndarray, gathered_factors: numpy.ndarray) -> None:
+        # Overwrites the rows of gathered_factors (gathered from the factor array for user_matrix_row_idx) that are pending.
+        if not len(self.user_matrix_row_idx):
+            return
+        positions = self.get_positions(user_matrix_row_idx)
+        is_pending = positions != EntityIndex.missing_position
+        gathered_factors[is_pending] = self.factors[positions[is_pending]]
+
+    def is_due_for_merge(self, number_of_users: int) -> bool:
+        return len(self.user_matrix_row_idx) > max(self.merge_minimum, self.merge_fraction * number_of_users)
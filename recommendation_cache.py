@@ -0,0 +1,156 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Hashable
+
+import threading
+import time
+
+if TYPE_CHECKING:
+    from recommender import Recommender
+
+
+class RecommendationCache:
+
+    user_recommendations_kind: str = "user"
+    similar_jobs_kind: str = "job"
+
+    def __init__(self, max_entries: int = 100_000, ttl_seconds: float = 300.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        # Entries map (model key, kind, id, N) to (expiry time, response), least recently used first.
+        self.entries: OrderedDict[tuple, tuple[float, list[dict]]] = OrderedDict()
+        self.entry_keys_by_entity: dict[tuple[str, Hashable], set[tuple]] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: tuple) -> list[dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, response = entry
+            if expires_at <= self.clock():
+                self.remove_entry(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def put(self, key: tuple, response: list[dict]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            self.entries[key] = (self.clock() + self.ttl_seconds, response)
+            _, kind, entity_id, _ = key
+            self.entry_keys_by_entity.setdefault((kind, entity_id), set()).add(key)
+            while len(self.entries) > self.max_entries:
+                least_recently_used_key = next(iter(self.entries))
+                self.remove_entry(least_recently_used_key)
+                self.evictions += 1
+
+    def remove_entry(self, key: tuple) -> None:
+        del self.entries[key]
+        _, kind, entity_id, _ = key
+        entity_keys = self.entry_keys_by_entity[(kind, entity_id)]
+        entity_keys.discard(key)
+        if not entity_keys:
+            del self.entry_keys_by_entity[(kind, entity_id)]
+
+    def invalidate_entities(self, kind: str, entity_ids: list) -> None:
+        with self.lock:
+            for entity_id in entity_ids:
+                for key in self.entry_keys_by_entity.pop((kind, entity_id), ()):
+                    del self.entries[key]
+                    self.invalidations += 1
+
+    def invalidate_users(self, user_ids: list[int]) -> None:
+        self.invalidate_entities(self.user_recommendations_kind, user_ids)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.entry_keys_by_entity.clear()
+
+    def get_statistics(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            statistics = {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+            return statistics
+
+    @staticmethod
+    def get_model_key(recommender: "Recommender") -> tuple[str, int]:
+        # Updates keep the model version, so the update generation is part of the key: a request still running on the
+        # model before an update can only write entries that requests on the updated model never read.
+        return recommender.model_version, recommender.update_generation
+
+    def get_job_recommendations_for_single_user(self, recommender: "Recommender", user_id: int, number_of_recommendations: int = 10) -> list[dict]:
+        if not isinstance(user_id, int):
+            return recommender.get_job_recommendations_for_single_user(user_id, number_of_recommendations)
+        key = (self.get_model_key(recommender), self.user_recommendations_kind, user_id, number_of_recommendations)
+        response = self.get(key)
+        if response is None:
+            response = recommender.get_job_recommendations_for_single_user(user_id, number_of_recommendations)
+            # Empty responses (unknown users) are not cached so users added by an update are served right away.
+            if response:
+                self.put(key, response)
+        return response
+
+    def get_job_recommendations_for_bulk_users(self, recommender: "Recommender", user_ids: list[int], number_of_recommendations: int = 10) -> dict:
+        # Cached users are answered from the cache and all misses are scored together in one batched call.
+        if not isinstance(user_ids, list) or not all(isinstance(x, int) for x in user_ids):
+            return {}
+        model_key = self.get_model_key(recommender)
+        cached_responses = {}
+        missed_user_ids = []
+        for user_id in dict.fromkeys(user_ids):
+            response = self.get((model_key, self.user_recommendations_kind, user_id, number_of_recommendations))
+            if response is None:
+                missed_user_ids.append(user_id)
+            else:
+                cached_responses[user_id] = response
+        scored_responses = {}
+        if missed_user_ids:
+            scored_responses = recommender.get_job_recommendations_for_bulk_users(missed_user_ids, number_of_recommendations)
+            for user_id, response in scored_responses.items():
+                self.put((model_key, self.user_recommendations_kind, user_id, number_of_recommendations), response)
+        response = {}
+        for user_id in dict.fromkeys(user_ids):
+            if user_id in cached_responses:
+                response[user_id] = cached_responses[user_id]
+            elif user_id in scored_responses:
+                response[user_id] = scored_responses[user_id]
+        return response
+
+    def find_similar_jobs(self, recommender: "Recommender", job_id: int, number_of_recommendations: int = 10) -> list[dict]:
+        if not isinstance(job_id, int):
+            return recommender.find_similar_jobs(job_id, number_of_recommendations)
+        key = (self.get_model_key(recommender), self.similar_jobs_kind, job_id, number_of_recommendations)
+        response = self.get(key)
+        if response is None:
+            response = recommender.find_similar_jobs(job_id, number_of_recommendations)
+            if response:
+                self.put(key, response)
+        return response
@@ -1,11 +1,26 @@
-from utils.utils import nested_default_dict
+from utils.utils import append_rows, nested_default_dict, for_each_top_k_block, select_top_k
+from activity_cache import ActivityCache
+from entity_index import EntityIndex
+from pending_pairs import PendingPairs
+from pending_user_factors import PendingUserFactors
+from ann_index import IVFIndex
+from fallback_rankings import FallbackRankings, read_user_segments
+from sharded_scoring import ShardedScorer
+from time_decay import DecayedPairCounts, ScoreDecay
+from als_training import TrainingConfig, fit_als_model
+from metrics import metrics
+from ingestion import (
+    Activity, ActivityColumns, PairCounts, activity_columns_from_records, decode_pair_keys, encode_pair_keys, read_activity_columns, 
+    read_pair_counts_sharded
+    )
 
-from enum import Enum
+from datetime import datetime, timezone
 
+import copy
 import json
+import os
 import time
 import numpy
-import pandas
 import scipy
 from implicit.als import AlternatingLeastSquares
 
@@ -17,14 +32,103 @@ class Recommender:
     activity_type_key:str = "type"
     implicit_score_key: str = "implicit_score"
     recommendation_score_key: str = "score"
+    ingestion_modes: tuple[str, ...] = ("nested", "columnar", "sharded")
+    ingestion_mode: str = "nested"
+    artifact_format: int = 1
+    artifact_manifest_filename: str = "manifest.json"
+    latest_artifact_pointer_filename: str = "LATEST"
+    artifact_array_names: tuple[str, ...] = (
+        "user_factors", "item_factors", "matrix_data", "matrix_indices", "matrix_indptr", "user_ids", "job_ids"
+        )
+    optional_artifact_array_names: tuple[str, ...] = (
+        "similar_job_positions", "similar_job_scores", "matrix_impressions", "matrix_redirects", 
+        "matrix_latest_impression_weights", "matrix_latest_redirect_weights"
+        )
+    # Per-pair counters kept aligned with matrix_csr.data as matrix_<name>, so later activity can be folded in; decayed
+    # scores also need the weights of the latest impression and redirect of each pair for their floors.
+    pair_counter_names: tuple[str, ...] = ("impressions", "redirects")
+    decayed_pair_counter_names: tuple[str, ...] = ("latest_impression_weights", "latest_redirect_weights")
+    confidence_scale: float = 2.0
+    similar_job_positions: numpy.ndarray = None
+    similar_job_scores: numpy.ndarray = None
+    ann_index: IVFIndex = None
+    ann_index_parameters: dict = None
+    matrix_impressions: numpy.ndarray = None
+    matrix_redirects: numpy.ndarray = None
+    matrix_latest_impression_weights: numpy.ndarray = None
+    matrix_latest_redirect_weights: numpy.ndarray = None
+    matrix_pair_keys: numpy.ndarray = None
+    pending_pairs: PendingPairs = None
+    pending_user_factors: PendingUserFactors = None
+    item_factors_gram: numpy.ndarray = None
+    user_factors_gram: numpy.ndarray = None
+    training_config: TrainingConfig = None
+    training_report: dict = None
+    filter_seen_jobs: bool = True
+    scoring_block_size: int = 1024
+    job_availability: numpy.ndarray = None
+    unavailable_job_matrix_column_idx: numpy.ndarray = None
+    personalized_tier: str = "personalized"
+    similar_jobs_tier: str = "similar_jobs"
+    fallback_rankings: FallbackRankings = None
+    fallback_parameters: dict = None
+    sharded_scorer: ShardedScorer = None
+    score_decay: ScoreDecay = None
+    score_reference_time: float = None
+    decayed_pair_counts: DecayedPairCounts = None
+    # Events folded in by update_with_activities since the last refresh_score_window, which adds them to the window.
+    activity_columns_since_refresh: tuple[ActivityColumns, ...] = ()
+    # Incremental updates keep the model version; the generation counts the updates applied since it was trained.
+    update_generation: int = 0
     
-    def __init__(self, activities_filepath) -> None:
+    def __init__(
+            self, 
+            activities_filepath, 
+            ingestion_mode: str = "nested", 
+            number_of_workers: int = 1, 
+            chunk_size_bytes: int = 16 * 2**20,
+            cache_directory: str = None,
+            score_decay: ScoreDecay = None
+            ) -> None:
+        if ingestion_mode not in self.ingestion_modes:
+            raise ValueError(f"Unknown ingestion mode '{ingestion_mode}'. Expected one of {self.ingestion_modes}.")
+        if score_decay is not None and ingestion_mode != "columnar":
+            raise ValueError("Time-decayed scores need the event timestamps, which only the columnar ingestion mode keeps.")
         self.activities_filepath = activities_filepath
-        self.activities = nested_default_dict()
-        self.read_activity_data()
-        self.add_implicit_scores()
-        self.generate_user_job_triples()
-        self.get_unique_entities()
+        self.ingestion_mode = ingestion_mode
+        self.cache_directory = cache_directory
+        self.score_decay = score_decay
+        with metrics.time_stage("ingestion"):
+            if ingestion_mode == "columnar":
+                self.read_activity_columns()
+            elif ingestion_mode == "sharded":
+                self.read_activity_shards(number_of_workers, chunk_size_bytes)
+            else:
+                self.activities = nested_default_dict()
+                self.read_activity_data()
+        with metrics.time_stage("scoring"):
+            if ingestion_mode == "nested":
+                self.add_implicit_scores()
+                self.generate_user_job_triples()
+            else:
+                self.add_implicit_score_columns()
+            self.get_unique_entities()
+
+    @classmethod
+    def from_activity_columns(cls, activity_columns: ActivityColumns, score_decay: ScoreDecay = None) -> "Recommender":
+        # Builds a columnar recommender from events already in memory, e.g. one period of a temporal split.
+        recommender = cls.__new__(cls)
+        recommender.activities_filepath = None
+        recommender.ingestion_mode = "columnar"
+        recommender.cache_directory = None
+        recommender.score_decay = score_decay
+        with metrics.time_stage("ingestion"):
+            recommender.activity_columns = activity_columns
+            recommender.pair_counts = PairCounts.from_activity_columns(activity_columns)
+        with metrics.time_stage("scoring"):
+            recommender.add_implicit_score_columns()
+            recommender.get_unique_entities()
+        return recommender
 
     def read_activity_data(self) -> None:
         with open(self.activities_filepath) as input_file:
@@ -46,6 +150,57 @@ class Recommender:
                 implicit_score = Recommender.calculate_implicit_score(impression, redirect)
                 self.activities[user_id][job_id][self.implicit_score_key] = implicit_score
 
+    def read_activity_columns(self) -> None:
+        if self.cache_directory is not None:
+            self.activity_columns = ActivityCache(self.cache_directory).load(self.activities_filepath)
+        else:
+            self.activity_columns = read_activity_columns(self.activities_filepath)
+        self.pair_counts = PairCounts.from_activity_columns(self.activity_columns)
+
+    def read_activity_shards(self, number_of_workers: int, chunk_size_bytes: int) -> None:
+        self.pair_counts = read_pair_counts_sharded(self.activities_filepath, number_of_workers, chunk_size_bytes)
+
+    def add_implicit_score_columns(self) -> None:
+        if self.score_decay is not None:
+            self.decayed_pair_counts = DecayedPairCounts.from_activity_columns(self.activity_columns, self.score_decay)
+            self.add_decayed_implicit_score_columns()
+            return
+        self.pair_implicit_scores = Recommender.calculate_implicit_scores(
+            self.pair_counts.impressions, 
+            self.pair_counts.redirects
+            )
+
+    def add_decayed_implicit_score_columns(self) -> None:
+        # The pairs become those with events in the lookback window, and their counters the decayed event weights.
+        self.pair_counts = self.decayed_pair_counts.get_pair_counts()
+        self.score_reference_time = self.decayed_pair_counts.reference_time
+        self.pair_implicit_scores = Recommender.calculate_decayed_implicit_scores(
+            self.pair_counts.impressions, 
+            self.pair_counts.redirects, 
+            *self.decayed_pair_counts.get_latest_event_weights()
+            )
+
+    def refresh_score_window(self, reference_time: float, new_activity_columns: ActivityColumns = None) -> None:
+        # Sliding-window refresh of decayed scores: only the events entering or leaving the window are processed, the
+        # events folded in by update_with_activities since the last refresh included, and the history is not rejoined.
+        # The scored pairs and the matrix are then rebuilt for train_als_model on purpose: moving the reference time
+        # rescales every counter, and users and jobs whose events all left the window drop out, so every score and
+        # matrix position may change. That costs O(pairs in the window), below the retrain that has to follow.
+        with metrics.time_stage("scoring"):
+            entering_activity_columns = list(self.activity_columns_since_refresh)
+            if new_activity_columns is not None:
+                entering_activity_columns.append(new_activity_columns)
+            self.decayed_pair_counts.advance(
+                reference_time, 
+                ActivityColumns.concatenate(entering_activity_columns) if entering_activity_columns else None
+                )
+            self.activity_columns_since_refresh = ()
+            self.add_decayed_implicit_score_columns()
+            self.get_unique_entities()
+        self.build_sparse_matrix()
+        for counter_name in self.pair_counter_names + self.decayed_pair_counter_names:
+            setattr(self, f"matrix_{counter_name}", None)
+
     @staticmethod
     def calculate_implicit_score(impressions: int, redirects: int) -> int:    
         impressions = impressions if impressions is not None else 0
@@ -61,6 +216,35 @@ class Recommender:
             score = 1
         return score
 
+    @staticmethod
+    def calculate_implicit_scores(impressions: numpy.ndarray, redirects: numpy.ndarray) -> numpy.ndarray:
+        clipped_impressions = numpy.minimum(impressions, 10)
+        clipped_redirects = numpy.minimum(redirects, 10)
+        scaled_redirects = clipped_redirects * 2
+        overexposure_penalty = numpy.maximum(clipped_impressions - clipped_redirects, 0)
+        scores = scaled_redirects + clipped_impressions - overexposure_penalty
+        scores = numpy.where((scores < 2) & (redirects > 0), 2, scores)
+        scores = numpy.where((scores < 1) & (impressions > 0), 1, scores)
+        return scores
+
+    @staticmethod
+    def calculate_decayed_implicit_scores(
+            impressions: numpy.ndarray, 
+            redirects: numpy.ndarray, 
+            latest_impression_weights: numpy.ndarray, 
+            latest_redirect_weights: numpy.ndarray
+            ) -> numpy.ndarray:
+        # The rules of calculate_implicit_scores on decayed counters. The floors of 2 per redirected and 1 per impressed
+        # pair are scaled by the weight of its latest redirect and impression, so a single old impression decays too.
+        clipped_impressions = numpy.minimum(impressions, 10)
+        clipped_redirects = numpy.minimum(redirects, 10)
+        scaled_redirects = clipped_redirects * 2
+        overexposure_penalty = numpy.maximum(clipped_impressions - clipped_redirects, 0)
+        scores = scaled_redirects + clipped_impressions - overexposure_penalty
+        scores = numpy.where((scores < 2 * latest_redirect_weights) & (redirects > 0), 2 * latest_redirect_weights, scores)
+        scores = numpy.where((scores < latest_impression_weights) & (impressions > 0), latest_impression_weights, scores)
+        return scores
+
     def generate_user_job_triples(self) -> None:
         user_job_implicit_scores = []
         for user_id in self.activities.keys():
@@ -81,107 +265,855 @@ class Recommender:
         return user_job_triple
 
     def get_unique_entities(self) -> None:
-        unique_user_ids = set()
-        unique_job_ids = set()
-        for triple in self.user_job_implicit_scores:
-            unique_user_ids.add(triple[self.user_id_key])
-            unique_job_ids.add(triple[self.job_id_key])
-        unique_user_ids = list(unique_user_ids)
-        unique_user_ids.sort()
-        unique_job_ids = list(unique_job_ids)
-        unique_job_ids.sort()
-        entity_indices = {"unique_users": unique_user_ids, "unique_jobs": unique_job_ids}
+        user_ids, job_ids, _ = self.get_user_job_score_arrays()
+        entity_indices = {
+            "unique_users": numpy.unique(user_ids).tolist(), 
+            "unique_jobs": numpy.unique(job_ids).tolist()
+            }
         self.entity_indices = entity_indices
 
     def build_sparse_matrix(self) -> None:
-        zeroes_data = numpy.zeros((
-            len(self.entity_indices["unique_users"]), 
-            len(self.entity_indices["unique_jobs"])
-            ))
-        user_job_implicit_scores_df = pandas.DataFrame(
-            zeroes_data, 
-            index=self.entity_indices["unique_users"], 
-            columns=self.entity_indices["unique_jobs"], 
-            dtype=int
+        with metrics.time_stage("matrix_build"):
+            self.matrix_row_user_index = EntityIndex(self.entity_indices["unique_users"])
+            self.matrix_column_job_index = EntityIndex(self.entity_indices["unique_jobs"])
+            user_ids, job_ids, implicit_scores = self.get_user_job_score_arrays()
+            rows = self.matrix_row_user_index.get_positions(user_ids)
+            columns = self.matrix_column_job_index.get_positions(job_ids)
+            matrix_shape = (len(self.matrix_row_user_index), len(self.matrix_column_job_index))
+            matrix_coo = scipy.sparse.coo_matrix((implicit_scores, (rows, columns)), shape=matrix_shape)
+            self.matrix_csr = matrix_coo.tocsr()
+            self.matrix_csr.sum_duplicates()
+            self.matrix_pair_keys = None
+            self.pending_pairs = None
+
+    def get_user_job_score_arrays(self) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        if self.ingestion_mode != "nested":
+            scored_pairs = self.pair_implicit_scores > 0
+            return (
+                self.pair_counts.user_ids[scored_pairs].astype(numpy.int64), 
+                self.pair_counts.job_ids[scored_pairs].astype(numpy.int64), 
+                self.pair_implicit_scores[scored_pairs]
+                )
+        number_of_triples = len(self.user_job_implicit_scores)
+        user_ids = numpy.fromiter(
+            (triple[self.user_id_key] for triple in self.user_job_implicit_scores), 
+            dtype=numpy.int64, 
+            count=number_of_triples
+            )
+        job_ids = numpy.fromiter(
+            (triple[self.job_id_key] for triple in self.user_job_implicit_scores), 
+            dtype=numpy.int64, 
+            count=number_of_triples
             )
-        for user_job_score in self.user_job_implicit_scores:
-            user_id = user_job_score[Recommender.user_id_key]
-            job_id = user_job_score[Recommender.job_id_key]
-            implicit_score = user_job_score[Recommender.implicit_score_key]
-            user_job_implicit_scores_df.loc[user_id, job_id] = implicit_score
-
-        self.matrix_row_user_index = user_job_implicit_scores_df.index
-        self.matrix_column_job_index = user_job_implicit_scores_df.columns
-        matrix_implicit_scores = user_job_implicit_scores_df.to_numpy()
-        self.matrix_csr = scipy.sparse.csr_matrix(matrix_implicit_scores)
-
-    def train_als_model(self) -> None:
-        als_model = AlternatingLeastSquares(factors=64, regularization=0.05)
+        implicit_scores = numpy.fromiter(
+            (triple[self.implicit_score_key] for triple in self.user_job_implicit_scores), 
+            dtype=numpy.int64, 
+            count=number_of_triples
+            )
+        return user_ids, job_ids, implicit_scores
+
+    def train_als_model(self, training_config: TrainingConfig = None) -> None:
+        training_config = training_config or TrainingConfig()
         print("Start recommender model training. Should take ~ 15 seconds.")
         t0 = time.time()
-        als_model.fit(2 * self.matrix_csr)
+        with metrics.time_stage("training"):
+            als_model, training_report = fit_als_model(self.matrix_csr, training_config)
         t1 = time.time()
         print(f"Model training duration (seconds): {t1 - t0}") 
+        print(
+            f"Iterations run: {training_report['iterations_run']}, "
+            f"peak traced memory (MB): {training_report['peak_traced_memory_bytes'] / 2**20:.1f}"
+            )
         self.als_model = als_model
+        self.training_config = training_config
+        self.training_report = training_report
+        self.confidence_scale = training_config.confidence_scale
+        self.trained_at = t1
+        self.model_version = datetime.fromtimestamp(t1, timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        self.item_factors_gram = None
+        self.user_factors_gram = None
+        self.pending_user_factors = None
+
+    def save_model(self, artifacts_root: str) -> str:
+        self.merge_pending_updates()
+        artifact_directory = os.path.join(artifacts_root, self.model_version)
+        os.makedirs(artifact_directory, exist_ok=True)
+        arrays = {
+            "user_factors": numpy.ascontiguousarray(self.als_model.user_factors),
+            "item_factors": numpy.ascontiguousarray(self.als_model.item_factors),
+            "matrix_data": self.matrix_csr.data,
+            "matrix_indices": self.matrix_csr.indices,
+            "matrix_indptr": self.matrix_csr.indptr,
+            "user_ids": numpy.asarray(self.matrix_row_user_index, dtype=numpy.int64),
+            "job_ids": numpy.asarray(self.matrix_column_job_index, dtype=numpy.int64)
+        }
+        for array_name in self.optional_artifact_array_names:
+            if getattr(self, array_name) is not None:
+                arrays[array_name] = getattr(self, array_name)
+        if self.fallback_rankings is not None:
+            for array_name, array in self.fallback_rankings.arrays.items():
+                arrays[f"fallback_{array_name}"] = array
+        if self.ann_index is not None:
+            for array_name, array in self.ann_index.arrays.items():
+                arrays[f"ann_{array_name}"] = array
+        for array_name, array in arrays.items():
+            numpy.save(os.path.join(artifact_directory, f"{array_name}.npy"), array)
+        manifest = {
+            "artifact_format": self.artifact_format,
+            "model_version": self.model_version,
+            "trained_at": self.trained_at,
+            "factors": self.als_model.factors,
+            "regularization": self.als_model.regularization,
+            "confidence_scale": self.confidence_scale,
+            "training_config": self.training_config.to_dict() if self.training_config is not None else None,
+            "training_report": self.training_report,
+            "matrix_shape": list(self.matrix_csr.shape),
+            "ann_index_parameters": self.ann_index_parameters,
+            "fallback_parameters": self.fallback_parameters,
+            "score_decay": self.score_decay.to_dict() if self.score_decay is not None else None,
+            "score_reference_time": self.score_reference_time
+        }
+        with open(os.path.join(artifact_directory, self.artifact_manifest_filename), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=4)
+        # The pointer is replaced atomically so readers never see a partially written version.
+        latest_pointer_filepath = os.path.join(artifacts_root, self.latest_artifact_pointer_filename)
+        with open(latest_pointer_filepath + ".tmp", "w") as pointer_file:
+            pointer_file.write(self.model_version)
+        os.replace(latest_pointer_filepath + ".tmp", latest_pointer_filepath)
+        return artifact_directory
+
+    @classmethod
+    def load_model(cls, artifacts_root: str, model_version: str = None) -> "Recommender":
+        if model_version is None:
+            with open(os.path.join(artifacts_root, cls.latest_artifact_pointer_filename)) as pointer_file:
+                model_version = pointer_file.read().strip()
+        artifact_directory = os.path.join(artifacts_root, model_version)
+        with open(os.path.join(artifact_directory, cls.artifact_manifest_filename)) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest["artifact_format"] != cls.artifact_format:
+            raise ValueError(f"Unsupported artifact format {manifest['artifact_format']} in {artifact_directory}.")
+        arrays = {
+            array_name: numpy.load(os.path.join(artifact_directory, f"{array_name}.npy"), mmap_mode="r")
+            for array_name in cls.artifact_array_names
+            }
+        fallback_array_names = tuple(f"fallback_{array_name}" for array_name in FallbackRankings.array_names)
+        ann_array_names = tuple(f"ann_{array_name}" for array_name in IVFIndex.array_names)
+        for array_name in cls.optional_artifact_array_names + fallback_array_names + ann_array_names:
+            array_filepath = os.path.join(artifact_directory, f"{array_name}.npy")
+            if os.path.exists(array_filepath):
+                arrays[array_name] = numpy.load(array_filepath, mmap_mode="r")
+        recommender = cls.__new__(cls)
+        recommender.activities_filepath = None
+        recommender.entity_indices = {
+            "unique_users": arrays["user_ids"].tolist(), 
+            "unique_jobs": arrays["job_ids"].tolist()
+            }
+        recommender.matrix_row_user_index = EntityIndex(arrays["user_ids"])
+        recommender.matrix_column_job_index = EntityIndex(arrays["job_ids"])
+        recommender.matrix_csr = scipy.sparse.csr_matrix(
+            (arrays["matrix_data"], arrays["matrix_indices"], arrays["matrix_indptr"]), 
+            shape=tuple(manifest["matrix_shape"]), 
+            copy=False
+            )
+        als_model = AlternatingLeastSquares(
+            factors=manifest["factors"], 
+            regularization=manifest["regularization"], 
+            dtype=arrays["user_factors"].dtype
+            )
+        als_model.user_factors = arrays["user_factors"]
+        als_model.item_factors = arrays["item_factors"]
+        recommender.als_model = als_model
+        recommender.similar_job_positions = arrays.get("similar_job_positions")
+        recommender.similar_job_scores = arrays.get("similar_job_scores")
+        for counter_name in cls.pair_counter_names + cls.decayed_pair_counter_names:
+            setattr(recommender, f"matrix_{counter_name}", arrays.get(f"matrix_{counter_name}"))
+        recommender.confidence_scale = manifest.get("confidence_scale", cls.confidence_scale)
+        if manifest.get("training_config") is not None:
+            recommender.training_config = TrainingConfig.from_dict(manifest["training_config"])
+        recommender.training_report = manifest.get("training_report")
+        if manifest.get("score_decay") is not None:
+            recommender.score_decay = ScoreDecay.from_dict(manifest["score_decay"])
+            recommender.score_reference_time = manifest["score_reference_time"]
+        recommender.trained_at = manifest["trained_at"]
+        recommender.model_version = manifest["model_version"]
+        if manifest.get("ann_index_parameters") is not None and all(array_name in arrays for array_name in ann_array_names):
+            # The inverted lists saved with the model are memory-mapped, so loading does not rerun k-means.
+            recommender.ann_index_parameters = manifest["ann_index_parameters"]
+            recommender.ann_index = IVFIndex.from_arrays(
+                {array_name: arrays[f"ann_{array_name}"] for array_name in IVFIndex.array_names}, 
+                **recommender.ann_index_parameters
+                )
+        elif manifest.get("ann_index_parameters") is not None:
+            recommender.enable_ann_index(**manifest["ann_index_parameters"])
+        if manifest.get("fallback_parameters") is not None:
+            recommender.fallback_parameters = manifest["fallback_parameters"]
+            recommender.fallback_rankings = FallbackRankings({
+                array_name: arrays[f"fallback_{array_name}"] 
+                for array_name in FallbackRankings.array_names 
+                if f"fallback_{array_name}" in arrays
+                })
+        return recommender
+
+    def get_pair_count_arrays(self) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        if self.ingestion_mode != "nested":
+            return self.pair_counts.user_ids, self.pair_counts.job_ids, self.pair_counts.impressions, self.pair_counts.redirects
+        pair_activities = [
+            (user_id, job_id, job_activities) 
+            for user_id, user_activities in self.activities.items() 
+            for job_id, job_activities in user_activities.items()
+            ]
+        number_of_pairs = len(pair_activities)
+        user_ids = numpy.fromiter((user_id for user_id, _, _ in pair_activities), dtype=numpy.int64, count=number_of_pairs)
+        job_ids = numpy.fromiter((job_id for _, job_id, _ in pair_activities), dtype=numpy.int64, count=number_of_pairs)
+        impressions = numpy.fromiter(
+            (job_activities.get(Activity.IMPRESSION.name.lower()) or 0 for _, _, job_activities in pair_activities), 
+            dtype=numpy.int64, 
+            count=number_of_pairs
+            )
+        redirects = numpy.fromiter(
+            (job_activities.get(Activity.REDIRECT.name.lower()) or 0 for _, _, job_activities in pair_activities), 
+            dtype=numpy.int64, 
+            count=number_of_pairs
+            )
+        return user_ids, job_ids, impressions, redirects
+
+    def build_matrix_pair_counts(self) -> None:
+        # Raw impression/redirect counters aligned with matrix_csr.data, so later activity can be folded in incrementally.
+        user_ids, job_ids, impressions, redirects = self.get_pair_count_arrays()
+        pair_counters = {"impressions": impressions, "redirects": redirects}
+        if self.score_decay is not None:
+            # Decayed counters are floats relative to score_reference_time, as are the latest event weights.
+            pair_counters["latest_impression_weights"], pair_counters["latest_redirect_weights"] = self.decayed_pair_counts.get_latest_event_weights()
+        is_scored = (impressions + redirects) > 0
+        data_positions = self.get_matrix_data_positions(
+            self.matrix_row_user_index.get_positions(user_ids[is_scored]),
+            self.matrix_column_job_index.get_positions(job_ids[is_scored])
+            )
+        for counter_name, pair_counter in pair_counters.items():
+            matrix_counter = numpy.zeros(self.matrix_csr.nnz, dtype=pair_counter.dtype)
+            matrix_counter[data_positions] = pair_counter[is_scored]
+            setattr(self, f"matrix_{counter_name}", matrix_counter)
+
+    def get_pair_counter_names(self) -> tuple[str, ...]:
+        return self.pair_counter_names + (self.decayed_pair_counter_names if self.score_decay is not None else ())
+
+    def calculate_pair_implicit_scores(self, pair_counters: dict[str, numpy.ndarray]) -> numpy.ndarray:
+        if self.score_decay is not None:
+            return Recommender.calculate_decayed_implicit_scores(
+                pair_counters["impressions"], 
+                pair_counters["redirects"], 
+                pair_counters["latest_impression_weights"], 
+                pair_counters["latest_redirect_weights"]
+                )
+        return Recommender.calculate_implicit_scores(pair_counters["impressions"], pair_counters["redirects"])
+
+    def get_matrix_pair_keys(self) -> numpy.ndarray:
+        # Cached so that updates touching only stored pairs cost O(batch * log(nnz)).
+        if self.matrix_pair_keys is None:
+            matrix_rows = numpy.repeat(numpy.arange(self.matrix_csr.shape[0]), numpy.diff(self.matrix_csr.indptr))
+            self.matrix_pair_keys = encode_pair_keys(matrix_rows, self.matrix_csr.indices)
+        return self.matrix_pair_keys
+
+    def get_matrix_data_positions(self, user_matrix_row_idx: numpy.ndarray, job_matrix_column_idx: numpy.ndarray) -> numpy.ndarray:
+        # The CSR matrix is canonical (rows in order, sorted column indices), so its pair keys are sorted.
+        matrix_pair_keys = self.get_matrix_pair_keys()
+        pair_keys = encode_pair_keys(user_matrix_row_idx, job_matrix_column_idx)
+        data_positions = numpy.minimum(numpy.searchsorted(matrix_pair_keys, pair_keys), max(len(matrix_pair_keys) - 1, 0))
+        is_stored = matrix_pair_keys[data_positions] == pair_keys if len(matrix_pair_keys) else numpy.zeros(len(pair_keys), dtype=bool)
+        return numpy.where(is_stored, data_positions, EntityIndex.missing_position)
+
+    def update_with_activities(self, activities: list[dict], full_retrain: bool = False) -> dict:
+        # Folds a batch of new activity events into the model without a full retrain: counters and implicit scores of
+        # the touched pairs are recomputed, and only the affected users (and any new jobs) are re-solved against the
+        # fixed factors of the other side. Nothing a request may be reading is written in place: touched pairs wait in
+        # pending_pairs, re-solved users in pending_user_factors, and new users and jobs grow into spare capacity past
+        # the served length, so a failed update leaves the model as it was. Apart from an occasional merge of the
+        # pending values into fresh arrays, the cost grows with the batch, not with the dataset.
+        if self.matrix_impressions is None:
+            # Loaded models have no activities to rebuild the counters from; they need artifacts saved with them.
+            if not hasattr(self, "pair_counts") and not hasattr(self, "activities"):
+                raise ValueError(
+                    f"Model {self.model_version} has no pair counters (matrix_impressions.npy) to fold updates into; retrain it."
+                    )
+            self.build_matrix_pair_counts()
+        batch_activity_columns = activity_columns_from_records(activities)
+        if self.score_decay is None:
+            batch_pair_counts = PairCounts.from_activity_columns(batch_activity_columns)
+        else:
+            if self.matrix_latest_impression_weights is None:
+                raise ValueError(
+                    f"Model {self.model_version} has no latest event weights (matrix_latest_impression_weights.npy) to decay updates with; retrain it."
+                    )
+            # New activity is decayed like the events of the window; events without a timestamp count at the reference time.
+            batch_activity_columns.timestamps = numpy.where(
+                numpy.isnan(batch_activity_columns.timestamps), 
+                self.score_reference_time, 
+                batch_activity_columns.timestamps
+                )
+            batch_decayed_pair_counts = DecayedPairCounts.from_new_events(batch_activity_columns, self.score_decay, self.score_reference_time)
+            batch_pair_counts = batch_decayed_pair_counts.get_pair_counts()
+        is_counted = (batch_pair_counts.impressions + batch_pair_counts.redirects) > 0
+        user_ids = batch_pair_counts.user_ids[is_counted].astype(numpy.int64)
+        job_ids = batch_pair_counts.job_ids[is_counted].astype(numpy.int64)
+        batch_pair_counters = {"impressions": batch_pair_counts.impressions[is_counted], "redirects": batch_pair_counts.redirects[is_counted]}
+        if self.score_decay is not None:
+            latest_impression_weights, latest_redirect_weights = batch_decayed_pair_counts.get_latest_event_weights()
+            batch_pair_counters["latest_impression_weights"] = latest_impression_weights[is_counted]
+            batch_pair_counters["latest_redirect_weights"] = latest_redirect_weights[is_counted]
+        if self.pending_pairs is None:
+            self.pending_pairs = PendingPairs.empty(
+                self.matrix_csr.data.dtype, 
+                {counter_name: getattr(self, f"matrix_{counter_name}").dtype for counter_name in self.get_pair_counter_names()}
+                )
+        if self.pending_user_factors is None:
+            self.pending_user_factors = PendingUserFactors.empty(self.als_model.user_factors.shape[1], self.als_model.user_factors.dtype)
+        new_user_ids = self.get_new_entity_ids(self.matrix_row_user_index, user_ids)
+        new_job_ids = self.get_new_entity_ids(self.matrix_column_job_index, job_ids)
+        # Factors and the availability mask grow before the new ids are added to the indices, so every position an
+        # index returns has a factor row.
+        self.grow_factors(len(new_user_ids), len(new_job_ids))
+        if self.job_availability is not None and len(new_job_ids):
+            # Jobs first seen in an update are open: they just received activity.
+            self.job_availability = append_rows(self.job_availability, numpy.ones(len(new_job_ids), dtype=bool))
+        self.matrix_row_user_index = self.matrix_row_user_index.append(new_user_ids) if len(new_user_ids) else self.matrix_row_user_index
+        self.matrix_column_job_index = self.matrix_column_job_index.append(new_job_ids) if len(new_job_ids) else self.matrix_column_job_index
+        user_matrix_row_idx = self.matrix_row_user_index.get_positions(user_ids)
+        job_matrix_column_idx = self.matrix_column_job_index.get_positions(job_ids)
+        # Counters continue from the pending values of a pair, or else from its stored values.
+        pair_keys = encode_pair_keys(user_matrix_row_idx, job_matrix_column_idx)
+        pending_positions = self.pending_pairs.get_positions(pair_keys)
+        is_pending = pending_positions != EntityIndex.missing_position
+        data_positions = self.get_matrix_data_positions(user_matrix_row_idx, job_matrix_column_idx)
+        is_stored = ~is_pending & (data_positions != EntityIndex.missing_position)
+        pair_counters = {}
+        for counter_name, batch_pair_counter in batch_pair_counters.items():
+            matrix_counter = getattr(self, f"matrix_{counter_name}")
+            previous_pair_counter = numpy.zeros(len(pair_keys), dtype=matrix_counter.dtype)
+            previous_pair_counter[is_pending] = self.pending_pairs.counters[counter_name][pending_positions[is_pending]]
+            previous_pair_counter[is_stored] = matrix_counter[data_positions[is_stored]]
+            # Counts add up; the weight of the latest event is the larger one.
+            if counter_name in self.decayed_pair_counter_names:
+                pair_counters[counter_name] = numpy.maximum(previous_pair_counter, batch_pair_counter)
+            else:
+                pair_counters[counter_name] = previous_pair_counter + batch_pair_counter
+        implicit_scores = self.calculate_pair_implicit_scores(pair_counters).astype(self.matrix_csr.data.dtype)
+        self.pending_pairs = self.pending_pairs.set_pairs(pair_keys, implicit_scores, pair_counters)
+        updated_user_matrix_row_idx = numpy.unique(user_matrix_row_idx)
+        if full_retrain:
+            self.merge_pending_pairs()
+            self.train_als_model(self.training_config)
+            if self.similar_job_positions is not None:
+                self.build_similar_jobs_table(self.similar_job_positions.shape[1])
+            if self.ann_index_parameters is not None:
+                self.enable_ann_index(**self.ann_index_parameters)
+            if self.sharded_scorer is not None:
+                self.enable_sharded_scoring(len(self.sharded_scorer))
+        else:
+            self.fold_in_user_factors(updated_user_matrix_row_idx)
+            new_job_matrix_column_idx = self.matrix_column_job_index.get_positions(new_job_ids)
+            if len(new_job_matrix_column_idx):
+                self.fold_in_new_job_factors(new_job_matrix_column_idx, user_matrix_row_idx, job_matrix_column_idx, implicit_scores)
+                # Users who interacted with new jobs were solved against their zero placeholders; solve them once more.
+                self.fold_in_user_factors(numpy.unique(user_matrix_row_idx[numpy.isin(job_matrix_column_idx, new_job_matrix_column_idx)]))
+                if self.ann_index is not None:
+                    self.ann_index.add_items(self.als_model.item_factors[new_job_matrix_column_idx])
+            if self.pending_pairs.is_due_for_merge(self.matrix_csr.nnz):
+                self.merge_pending_pairs()
+            if self.pending_user_factors.is_due_for_merge(len(self.matrix_row_user_index)):
+                self.merge_pending_user_factors()
+            # Shards are shared with the served model, so they only receive the new jobs once nothing else can fail.
+            if self.sharded_scorer is not None and len(new_job_matrix_column_idx):
+                self.sharded_scorer.add_items(self.als_model.item_factors[new_job_matrix_column_idx])
+        # The entity_indices lists are shared with the served model too; they are not read when serving.
+        self.entity_indices["unique_users"].extend(new_user_ids.tolist())
+        self.entity_indices["unique_jobs"].extend(new_job_ids.tolist())
+        if self.decayed_pair_counts is not None:
+            self.activity_columns_since_refresh = self.activity_columns_since_refresh + (batch_activity_columns,)
+        self.update_generation += 1
+        update_summary = {
+            "updated_user_ids": self.matrix_row_user_index.get_entity_ids(updated_user_matrix_row_idx).tolist(),
+            "new_user_ids": new_user_ids.tolist(),
+            "new_job_ids": new_job_ids.tolist()
+        }
+        return update_summary
+
+    def copy_for_update(self) -> "Recommender":
+        # A copy to apply an update to while requests keep reading this model. Updates never write into arrays this
+        # model reads: everything they change (indices, pending pairs and user factors, merged matrix and factors,
+        # Gram matrices, availability mask, ANN lists) is rebound on the copy only, and grown arrays share spare
+        # capacity past this model's length.
+        recommender = copy.copy(self)
+        recommender.als_model = copy.copy(self.als_model)
+        recommender.ann_index = copy.copy(self.ann_index)
+        return recommender
+
+    @staticmethod
+    def get_new_entity_ids(entity_index: EntityIndex, entity_ids: numpy.ndarray) -> numpy.ndarray:
+        return numpy.unique(entity_ids[entity_index.get_positions(entity_ids) == EntityIndex.missing_position])
+
+    def merge_pending_updates(self) -> None:
+        self.merge_pending_pairs()
+        self.merge_pending_user_factors()
+
+    def merge_pending_pairs(self) -> None:
+        # Splices every new pending pair into fresh CSR arrays at its sorted position in one pass, keeping the matrix
+        # canonical, overwrites the pending values of stored pairs, and grows the matrix to the users and jobs added
+        # since the last merge.
+        matrix_shape = (len(self.matrix_row_user_index), len(self.matrix_column_job_index))
+        has_pending_pairs = self.pending_pairs is not None and len(self.pending_pairs) > 0
+        if not has_pending_pairs and matrix_shape == self.matrix_csr.shape:
+            return
+        pending_pairs = self.pending_pairs if has_pending_pairs else PendingPairs.empty(self.matrix_csr.data.dtype, {})
+        pending_user_matrix_row_idx, pending_job_matrix_column_idx = decode_pair_keys(pending_pairs.pair_keys)
+        stored_positions = self.get_matrix_data_positions(pending_user_matrix_row_idx, pending_job_matrix_column_idx)
+        is_stored = stored_positions != EntityIndex.missing_position
+        insert_positions = numpy.searchsorted(self.get_matrix_pair_keys(), pending_pairs.pair_keys[~is_stored])
+        # Stored pairs move right by the number of pairs inserted before them.
+        stored_positions = stored_positions[is_stored] + numpy.searchsorted(insert_positions, stored_positions[is_stored], side="right")
+        matrix_indptr = numpy.concatenate([
+            self.matrix_csr.indptr, 
+            numpy.full(matrix_shape[0] - self.matrix_csr.shape[0], self.matrix_csr.indptr[-1], dtype=self.matrix_csr.indptr.dtype)
+            ])
+        inserted_pairs_per_row = numpy.bincount(pending_user_matrix_row_idx[~is_stored], minlength=matrix_shape[0])
+        matrix_indptr = matrix_indptr + numpy.concatenate([[0], numpy.cumsum(inserted_pairs_per_row)])
+        matrix_data = numpy.insert(self.matrix_csr.data, insert_positions, pending_pairs.data[~is_stored])
+        matrix_data[stored_positions] = pending_pairs.data[is_stored]
+        matrix_indices = numpy.insert(self.matrix_csr.indices, insert_positions, pending_job_matrix_column_idx[~is_stored])
+        for counter_name, pending_counter in pending_pairs.counters.items():
+            matrix_counter = numpy.insert(getattr(self, f"matrix_{counter_name}"), insert_positions, pending_counter[~is_stored])
+            matrix_counter[stored_positions] = pending_counter[is_stored]
+            setattr(self, f"matrix_{counter_name}", matrix_counter)
+        self.matrix_pair_keys = numpy.insert(self.matrix_pair_keys, insert_positions, pending_pairs.pair_keys[~is_stored])
+        self.matrix_csr = scipy.sparse.csr_matrix((matrix_data, matrix_indices, matrix_indptr), shape=matrix_shape)
+        if self.pending_pairs is not None:
+            self.pending_pairs = PendingPairs.empty(self.pending_pairs.data.dtype, self.pending_pairs.get_counter_dtypes())
+
+    def merge_pending_user_factors(self) -> None:
+        # Writes the re-solved factors into a fresh copy of the factor array; the copy is bound before the pending
+        # factors are dropped, so concurrent readers see the new factors either way.
+        if self.pending_user_factors is None or not len(self.pending_user_factors):
+            return
+        user_factors = numpy.array(self.als_model.user_factors)
+        user_factors[self.pending_user_factors.user_matrix_row_idx] = self.pending_user_factors.factors
+        self.als_model.user_factors = user_factors
+        self.als_model._user_norms = None
+        self.als_model._XtX = None
+        self.pending_user_factors = PendingUserFactors.empty(user_factors.shape[1], user_factors.dtype)
+
+    def grow_factors(self, number_of_new_users: int, number_of_new_jobs: int) -> None:
+        # New entities start at zero and are filled in by the fold-in solves.
+        if number_of_new_users:
+            user_factors = self.als_model.user_factors
+            self.als_model.user_factors = append_rows(
+                user_factors, numpy.zeros((number_of_new_users, user_factors.shape[1]), dtype=user_factors.dtype)
+                )
+        if number_of_new_jobs:
+            item_factors = self.als_model.item_factors
+            self.als_model.item_factors = append_rows(
+                item_factors, numpy.zeros((number_of_new_jobs, item_factors.shape[1]), dtype=item_factors.dtype)
+                )
+        # implicit caches norms and Gram matrices of the factors; they are stale once factors change.
+        self.als_model._user_norms = self.als_model._item_norms = None
+        self.als_model._XtX = self.als_model._YtY = None
+
+    def get_user_row_pairs(self, user_matrix_row: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Job columns and implicit scores of one user's stored and pending pairs; users added since the last merge lie
+        # beyond the matrix rows and only have pending pairs.
+        row_start, row_end = 0, 0
+        if user_matrix_row < self.matrix_csr.shape[0]:
+            row_start, row_end = self.matrix_csr.indptr[user_matrix_row], self.matrix_csr.indptr[user_matrix_row + 1]
+        job_matrix_column_idx = self.matrix_csr.indices[row_start:row_end]
+        implicit_scores = self.matrix_csr.data[row_start:row_end]
+        if self.pending_pairs is not None and len(self.pending_pairs):
+            _, pending_positions = self.pending_pairs.get_row_positions(numpy.array([user_matrix_row]))
+            if len(pending_positions):
+                pending_job_matrix_column_idx = self.pending_pairs.get_job_matrix_column_idx(pending_positions)
+                # Pending values supersede the stored values of the same pairs.
+                is_stored_only = ~numpy.isin(job_matrix_column_idx, pending_job_matrix_column_idx)
+                job_matrix_column_idx = numpy.concatenate([job_matrix_column_idx[is_stored_only], pending_job_matrix_column_idx])
+                implicit_scores = numpy.concatenate([implicit_scores[is_stored_only], self.pending_pairs.data[pending_positions]])
+        return job_matrix_column_idx, implicit_scores
+
+    def get_user_factors(self, user_matrix_row_idx: numpy.ndarray) -> numpy.ndarray:
+        # Gathers a copy of the factor rows with the factors re-solved since the last merge applied.
+        user_factors = self.als_model.user_factors[user_matrix_row_idx]
+        if self.pending_user_factors is not None:
+            self.pending_user_factors.apply(user_matrix_row_idx, user_factors)
+        return user_factors
+
+    def fold_in_user_factors(self, user_matrix_row_idx: numpy.ndarray) -> None:
+        # Least-squares fold-in as in the ALS user step: A = YtY + reg * I + sum((c - 1) * y yT), b = sum(c * y). The
+        # solved factors go to pending_user_factors and the Gram matrices are rebound, never written in place.
+        item_factors = self.als_model.item_factors
+        if self.item_factors_gram is None:
+            self.item_factors_gram = item_factors.T.astype(numpy.float64) @ item_factors
+        if self.user_factors_gram is None:
+            self.merge_pending_user_factors()
+            self.user_factors_gram = self.als_model.user_factors.T.astype(numpy.float64) @ self.als_model.user_factors
+        regularized_gram = self.item_factors_gram + self.als_model.regularization * numpy.eye(item_factors.shape[1])
+        previous_user_factors = self.get_user_factors(user_matrix_row_idx).astype(numpy.float64)
+        solved_user_factors = numpy.empty_like(previous_user_factors)
+        for position, user_matrix_row in enumerate(user_matrix_row_idx):
+            liked_job_matrix_column_idx, implicit_scores = self.get_user_row_pairs(user_matrix_row)
+            liked_item_factors = item_factors[liked_job_matrix_column_idx].astype(numpy.float64)
+            confidences = self.confidence_scale * implicit_scores
+            solved_user_factors[position] = numpy.linalg.solve(
+                regularized_gram + (liked_item_factors.T * (confidences - 1)) @ liked_item_factors, 
+                liked_item_factors.T @ confidences
+                )
+        self.user_factors_gram = self.user_factors_gram + solved_user_factors.T @ solved_user_factors - previous_user_factors.T @ previous_user_factors
+        self.pending_user_factors = self.pending_user_factors.set_factors(
+            user_matrix_row_idx, 
+            solved_user_factors.astype(self.als_model.user_factors.dtype)
+            )
+
+    def fold_in_new_job_factors(
+            self, 
+            new_job_matrix_column_idx: numpy.ndarray, 
+            user_matrix_row_idx: numpy.ndarray, 
+            job_matrix_column_idx: numpy.ndarray, 
+            implicit_scores: numpy.ndarray
+            ) -> None:
+        # Jobs seen for the first time only have activity from this batch, so their columns come from the batch pairs.
+        # Their factor rows lie in the capacity grown past the served length, so they are written directly.
+        item_factors = self.als_model.item_factors
+        regularized_gram = self.user_factors_gram + self.als_model.regularization * numpy.eye(item_factors.shape[1])
+        for job_matrix_column in new_job_matrix_column_idx:
+            is_job_pair = job_matrix_column_idx == job_matrix_column
+            liking_user_factors = self.get_user_factors(user_matrix_row_idx[is_job_pair]).astype(numpy.float64)
+            confidences = self.confidence_scale * implicit_scores[is_job_pair]
+            item_factor = numpy.linalg.solve(
+                regularized_gram + (liking_user_factors.T * (confidences - 1)) @ liking_user_factors, 
+                liking_user_factors.T @ confidences
+                )
+            item_factors[job_matrix_column] = item_factor
+            self.item_factors_gram = self.item_factors_gram + numpy.outer(item_factor, item_factor)
+
+    def build_similar_jobs_table(self, number_of_neighbours: int = 10, block_size: int = 1024, number_of_workers: int = None) -> None:
+        item_factors = numpy.asarray(self.als_model.item_factors, dtype=numpy.float32)
+        item_norms = numpy.linalg.norm(item_factors, axis=1)
+        item_norms[item_norms == 0] = 1e-10
+        normalized_item_factors = item_factors / item_norms[:, numpy.newaxis]
+        number_of_neighbours = min(number_of_neighbours, len(item_factors))
+        similar_job_positions = numpy.empty((len(item_factors), number_of_neighbours), dtype=numpy.int32)
+        similar_job_scores = numpy.empty((len(item_factors), number_of_neighbours), dtype=numpy.float32)
+
+        def store_neighbours(block_start: int, block_end: int, positions: numpy.ndarray, scores: numpy.ndarray) -> None:
+            similar_job_positions[block_start:block_end] = positions
+            similar_job_scores[block_start:block_end] = scores
+
+        for_each_top_k_block(
+            normalized_item_factors, 
+            normalized_item_factors, 
+            number_of_neighbours, 
+            store_neighbours, 
+            block_size, 
+            number_of_workers
+            )
+        self.similar_job_positions = similar_job_positions
+        self.similar_job_scores = similar_job_scores
+
+    def build_fallback_rankings(
+            self, 
+            users_filepath: str = None, 
+            segment_attribute: str = None, 
+            recent_window_seconds: float = 7 * 24 * 3600, 
+            ranking_size: int = FallbackRankings.ranking_size
+            ) -> None:
+        user_segments = None
+        segment_values = None
+        if users_filepath is not None and segment_attribute is not None:
+            segment_user_ids, segment_user_codes, segment_values = read_user_segments(users_filepath, segment_attribute)
+            user_segments = (segment_user_ids, segment_user_codes)
+        self.fallback_rankings = FallbackRankings.build(
+            self.matrix_csr, 
+            self.matrix_row_user_index.get_entity_ids(numpy.arange(len(self.matrix_row_user_index))), 
+            self.get_recent_job_scores(recent_window_seconds), 
+            user_segments, 
+            ranking_size
+            )
+        self.fallback_parameters = {
+            "segment_attribute": segment_attribute if user_segments is not None else None,
+            "segment_values": segment_values,
+            "recent_window_seconds": recent_window_seconds,
+            "ranking_size": ranking_size
+        }
+
+    def get_recent_job_scores(self, recent_window_seconds: float) -> numpy.ndarray:
+        # Only columnar ingestion keeps per-event timestamps; without them there is no recent-popularity tier.
+        activity_columns = getattr(self, "activity_columns", None)
+        # Decayed models keep the events of their score window, which refresh_score_window slides without rejoining
+        # the history; the recent window is cut from those.
+        if self.decayed_pair_counts is not None:
+            activity_columns = self.decayed_pair_counts.window_activity_columns
+        if activity_columns is None or not len(activity_columns) or numpy.isnan(activity_columns.timestamps).all():
+            return None
+        # The window ends at the latest event rather than the wall clock, so rebuilding from the same data is reproducible.
+        is_recent = activity_columns.timestamps >= numpy.nanmax(activity_columns.timestamps) - recent_window_seconds
+        recent_pair_counts = PairCounts.from_activity_columns(ActivityColumns(
+            activity_columns.user_ids[is_recent], 
+            activity_columns.job_ids[is_recent], 
+            activity_columns.type_codes[is_recent], 
+            activity_columns.timestamps[is_recent]
+            ))
+        job_matrix_column_idx = self.matrix_column_job_index.get_positions(recent_pair_counts.job_ids.astype(numpy.int64))
+        is_known_job = job_matrix_column_idx != EntityIndex.missing_position
+        implicit_scores = Recommender.calculate_implicit_scores(recent_pair_counts.impressions, recent_pair_counts.redirects)
+        return numpy.bincount(
+            job_matrix_column_idx[is_known_job], 
+            weights=implicit_scores[is_known_job], 
+            minlength=self.matrix_csr.shape[1]
+            )
+
+    def enable_ann_index(self, number_of_clusters: int = None, number_of_probes: int = 8, kmeans_iterations: int = 10, seed: int = 0) -> None:
+        self.ann_index_parameters = {
+            "number_of_clusters": number_of_clusters,
+            "number_of_probes": number_of_probes,
+            "kmeans_iterations": kmeans_iterations,
+            "seed": seed
+        }
+        self.ann_index = IVFIndex(self.als_model.item_factors, **self.ann_index_parameters)
+
+    def disable_ann_index(self) -> None:
+        self.ann_index = None
+        self.ann_index_parameters = None
+
+    def enable_sharded_scoring(self, number_of_shards: int) -> None:
+        # Exact scoring is scattered over worker processes that each hold a slice of the item factors.
+        self.disable_sharded_scoring()
+        self.sharded_scorer = ShardedScorer(self.als_model.item_factors, number_of_shards)
+
+    def disable_sharded_scoring(self) -> None:
+        if self.sharded_scorer is not None:
+            self.sharded_scorer.close()
+            self.sharded_scorer = None
+
+    def load_job_catalog(self, jobs_filepath: str, now: float = None) -> None:
+        # Jobs missing from the catalog or past their optional `expires_at` timestamp are closed.
+        now = time.time() if now is None else now
+        open_job_ids = []
+        with open(jobs_filepath) as input_file:
+            for line in input_file:
+                if not line.strip():
+                    continue
+                job = json.loads(line)
+                if job.get("expires_at") is None or job["expires_at"] > now:
+                    open_job_ids.append(job[Recommender.job_id_key])
+        self.job_availability = numpy.zeros(len(self.matrix_column_job_index), dtype=bool)
+        self.set_job_availability(open_job_ids, True)
+
+    def set_job_availability(self, job_ids: list[int], is_available: bool) -> int:
+        # Availability is a boolean mask over the matrix columns, so opening or closing jobs never needs a retrain.
+        job_matrix_column_idx = self.matrix_column_job_index.get_positions(job_ids)
+        job_matrix_column_idx = job_matrix_column_idx[job_matrix_column_idx != EntityIndex.missing_position]
+        job_availability = numpy.ones(len(self.matrix_column_job_index), dtype=bool) if self.job_availability is None else self.job_availability.copy()
+        job_availability[job_matrix_column_idx] = is_available
+        # The mask and its closed positions are rebound together, so concurrent requests see either state, never a mix.
+        self.job_availability = job_availability
+        self.unavailable_job_matrix_column_idx = numpy.flatnonzero(~job_availability)
+        return len(job_matrix_column_idx)
+
+    def get_seen_job_positions(self, user_matrix_row_idx: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # (position in user_matrix_row_idx, job column) of every stored and pending pair, gathered straight from the CSR
+        # arrays; rows of users added since the last merge are past the matrix and clipped to empty CSR rows.
+        number_of_matrix_rows = self.matrix_csr.shape[0]
+        row_starts = self.matrix_csr.indptr[numpy.minimum(user_matrix_row_idx, number_of_matrix_rows)]
+        row_lengths = self.matrix_csr.indptr[numpy.minimum(user_matrix_row_idx + 1, number_of_matrix_rows)] - row_starts
+        data_offsets = numpy.repeat(row_starts - numpy.cumsum(row_lengths) + row_lengths, row_lengths)
+        data_positions = numpy.arange(row_lengths.sum()) + data_offsets
+        seen_query_positions = numpy.repeat(numpy.arange(len(user_matrix_row_idx)), row_lengths)
+        seen_job_matrix_column_idx = self.matrix_csr.indices[data_positions]
+        if self.pending_pairs is not None and len(self.pending_pairs):
+            pending_query_positions, pending_positions = self.pending_pairs.get_row_positions(user_matrix_row_idx)
+            seen_query_positions = numpy.concatenate([seen_query_positions, pending_query_positions])
+            seen_job_matrix_column_idx = numpy.concatenate([seen_job_matrix_column_idx, self.pending_pairs.get_job_matrix_column_idx(pending_positions)])
+        return seen_query_positions, seen_job_matrix_column_idx
+
+    def mask_ineligible_jobs(self, user_matrix_row_idx: numpy.ndarray, scores: numpy.ndarray) -> None:
+        if self.unavailable_job_matrix_column_idx is not None and len(self.unavailable_job_matrix_column_idx):
+            scores[:, self.unavailable_job_matrix_column_idx] = -numpy.inf
+        if self.filter_seen_jobs:
+            scores[self.get_seen_job_positions(user_matrix_row_idx)] = -numpy.inf
+
+    def get_eligible_job_mask(self, user_matrix_row: int, job_matrix_column_idx: numpy.ndarray) -> numpy.ndarray:
+        is_eligible = numpy.ones(len(job_matrix_column_idx), dtype=bool)
+        if self.job_availability is not None:
+            is_eligible &= self.job_availability[job_matrix_column_idx]
+        if self.filter_seen_jobs:
+            _, seen_job_matrix_column_idx = self.get_seen_job_positions(numpy.array([user_matrix_row]))
+            is_eligible &= ~numpy.isin(job_matrix_column_idx, seen_job_matrix_column_idx)
+        return is_eligible
+
+    def score_user_rows(self, user_matrix_row_idx: numpy.ndarray, number_of_recommendations: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Seen and closed jobs are masked to -inf before the top-k selection, so users get number_of_recommendations
+        # eligible jobs whenever that many exist; rows with fewer are padded with -inf scores.
+        if self.ann_index is not None:
+            return self.ann_index.search(
+                self.get_user_factors(user_matrix_row_idx), 
+                number_of_recommendations, 
+                lambda query_idx, job_matrix_column_idx: self.get_eligible_job_mask(user_matrix_row_idx[query_idx], job_matrix_column_idx)
+                )
+        if self.sharded_scorer is not None:
+            excluded_rows, excluded_columns = (
+                self.get_seen_job_positions(user_matrix_row_idx) 
+                if self.filter_seen_jobs 
+                else (numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.int32))
+                )
+            sharded_result = self.sharded_scorer.search(
+                self.get_user_factors(user_matrix_row_idx), 
+                number_of_recommendations, 
+                excluded_rows, 
+                excluded_columns, 
+                self.unavailable_job_matrix_column_idx
+                )
+            if sharded_result is not None:
+                return self.drop_jobs_added_later(*sharded_result)
+        item_factors_transposed = self.als_model.item_factors.T
+        ids, scores = [], []
+        for block_start in range(0, len(user_matrix_row_idx), self.scoring_block_size):
+            block_user_matrix_row_idx = user_matrix_row_idx[block_start:block_start + self.scoring_block_size]
+            block_scores = self.get_user_factors(block_user_matrix_row_idx) @ item_factors_transposed
+            self.mask_ineligible_jobs(block_user_matrix_row_idx, block_scores)
+            block_ids, block_top_scores = select_top_k(block_scores, number_of_recommendations)
+            ids.append(block_ids)
+            scores.append(block_top_scores)
+        return numpy.concatenate(ids), numpy.concatenate(scores)
+
+    def drop_jobs_added_later(self, job_matrix_column_idx: numpy.ndarray, scores: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Shards are shared by every copy of a model, so they may already hold jobs an update added to a newer copy.
+        is_added_later = job_matrix_column_idx >= len(self.matrix_column_job_index)
+        if not is_added_later.any():
+            return job_matrix_column_idx, scores
+        scores = numpy.where(is_added_later, -numpy.inf, scores).astype(scores.dtype)
+        descending_order = numpy.argsort(-scores, axis=1, kind="stable")
+        return numpy.take_along_axis(job_matrix_column_idx, descending_order, axis=1), numpy.take_along_axis(scores, descending_order, axis=1)
 
     def get_job_recommendations_for_single_user(self, user_id: int, number_of_recommendations: int = 10) -> list[dict]:
         response = []
-        if isinstance(user_id, int) and user_id in self.entity_indices["unique_users"]:
+        if isinstance(user_id, int) and user_id in self.matrix_row_user_index:
             user_matrix_row_idx = self.matrix_row_user_index.get_loc(user_id)
-            ids, scores = self.als_model.recommend(
-                user_matrix_row_idx, 
-                self.matrix_csr[user_matrix_row_idx], 
-                N=number_of_recommendations, 
-                filter_already_liked_items=False
-            )
-            for job_idx, score in zip(ids, scores):
-                recommendation = {
-                    Recommender.job_id_key: self.matrix_column_job_index[job_idx].item(),
-                    Recommender.recommendation_score_key: score.item() 
-                    }
-                response.append(recommendation)
+            ids, scores = self.score_user_rows(numpy.array([user_matrix_row_idx]), number_of_recommendations)
+            response = self.generate_recommendations(ids[0], scores[0])
+        elif isinstance(user_id, int) and self.fallback_rankings is not None:
+            tier = self.fallback_rankings.get_user_tiers([user_id])[0]
+            response = self.get_fallback_recommendations(tier, number_of_recommendations, user_id)
         return response
 
     def get_job_recommendations_for_bulk_users(self, user_ids: list[int], number_of_recommendations: int = 10) -> dict:
         response = {}
         if isinstance(user_ids, list) and all(isinstance(x, int) for x in user_ids):
-            user_ids_verified = [user_id for user_id in user_ids if user_id in self.entity_indices["unique_users"]]
-            user_matrix_row_idx = [self.matrix_row_user_index.get_loc(user_id) for user_id in user_ids_verified]
-            ids, scores = self.als_model.recommend(
-                user_matrix_row_idx, 
-                self.matrix_csr[user_matrix_row_idx], 
-                N=number_of_recommendations, 
-                filter_already_liked_items=False
-            )
-            
-            for user_id, job_ids, scores in zip(user_ids_verified, ids, scores):
-                user_response = []
-                for job_idx, score in zip(job_ids, scores):
-                    recommendation = {
-                        Recommender.job_id_key: self.matrix_column_job_index[job_idx].item(),
-                        Recommender.recommendation_score_key: score.item() 
-                        }
-                    user_response.append(recommendation)    
-                response[user_id] = user_response
+            user_matrix_row_idx = self.matrix_row_user_index.get_positions(user_ids)
+            is_known_user = user_matrix_row_idx != EntityIndex.missing_position
+            if is_known_user.any():
+                ids, scores = self.score_user_rows(user_matrix_row_idx[is_known_user], number_of_recommendations)
+                known_user_ids = self.matrix_row_user_index.get_entity_ids(user_matrix_row_idx[is_known_user]).tolist()
+                for user_id, job_ids, scores in zip(known_user_ids, ids, scores):
+                    response[user_id] = self.generate_recommendations(job_ids, scores)
+            if self.fallback_rankings is not None and not is_known_user.all():
+                # Unknown ids stay Python ints: ids outside int64 are unknown users too.
+                unknown_user_ids = [user_ids[position] for position in numpy.flatnonzero(~is_known_user).tolist()]
+                for user_id, tier in zip(unknown_user_ids, self.fallback_rankings.get_user_tiers(unknown_user_ids)):
+                    response[user_id] = self.get_fallback_recommendations(tier, number_of_recommendations, user_id)
         return response
 
-    def find_similar_jobs(self, job_id: int) -> list[dict]:
+    def get_job_recommendation_arrays_for_bulk_users(
+            self, 
+            user_ids: list[int], 
+            number_of_recommendations: int = 10
+            ) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        # The recommendations of get_job_recommendations_for_bulk_users as arrays, in request order, without a dict per
+        # job: the served user ids, and per user a row of job ids padded with -1 and of scores padded with -inf.
+        # Ids outside int64 cannot be written to the int64 user id column and are left out like unserved users.
+        user_ids, is_in_range = EntityIndex.to_entity_ids(user_ids)
+        user_ids = user_ids[is_in_range]
+        user_matrix_row_idx = self.matrix_row_user_index.get_positions(user_ids)
+        is_known_user = user_matrix_row_idx != EntityIndex.missing_position
+        number_of_recommendations = min(number_of_recommendations, len(self.matrix_column_job_index))
+        job_ids = numpy.full((len(user_ids), number_of_recommendations), -1, dtype=numpy.int64)
+        scores = numpy.full((len(user_ids), number_of_recommendations), -numpy.inf, dtype=numpy.float32)
+        if is_known_user.any():
+            job_matrix_column_idx, known_user_scores = self.score_user_rows(user_matrix_row_idx[is_known_user], number_of_recommendations)
+            is_recommended = known_user_scores > -numpy.inf
+            number_of_columns = known_user_scores.shape[1]
+            job_ids[is_known_user, :number_of_columns] = numpy.where(
+                is_recommended, 
+                self.matrix_column_job_index.get_entity_ids(job_matrix_column_idx), 
+                -1
+                )
+            scores[is_known_user, :number_of_columns] = known_user_scores
+        if self.fallback_rankings is None:
+            return user_ids[is_known_user], job_ids[is_known_user], scores[is_known_user]
+        unknown_user_positions = numpy.flatnonzero(~is_known_user)
+        unknown_user_tiers = self.fallback_rankings.get_user_tiers(user_ids[unknown_user_positions]) if len(unknown_user_positions) else []
+        for position, user_id, tier in zip(unknown_user_positions.tolist(), user_ids[unknown_user_positions].tolist(), unknown_user_tiers):
+            fallback_job_matrix_column_idx, fallback_scores = self.get_fallback_ranking(tier, number_of_recommendations, user_id)
+            job_ids[position, :len(fallback_scores)] = self.matrix_column_job_index.get_entity_ids(fallback_job_matrix_column_idx)
+            scores[position, :len(fallback_scores)] = fallback_scores
+        return user_ids, job_ids, scores
+
+    def get_fallback_ranking(self, tier: str, number_of_recommendations: int, user_id: int = None) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Rankings are precomputed, so a fallback response is a slice of at most ranking_size closed-job checks.
+        job_matrix_column_idx, scores = self.fallback_rankings.get_ranking(tier, user_id)
+        is_eligible = job_matrix_column_idx != -1
+        if self.job_availability is not None:
+            is_eligible &= self.job_availability[job_matrix_column_idx]
+        return job_matrix_column_idx[is_eligible][:number_of_recommendations], scores[is_eligible][:number_of_recommendations]
+
+    def get_fallback_recommendations(self, tier: str, number_of_recommendations: int, user_id: int = None) -> list[dict]:
+        return self.generate_recommendations(*self.get_fallback_ranking(tier, number_of_recommendations, user_id))
+
+    def get_recommendation_tiers(self, user_ids: list[int]) -> list[str]:
+        # The tier that serves each user: personalized for users the model knows, a fallback tier (or None) otherwise.
+        is_known_user = self.matrix_row_user_index.get_positions(user_ids) != EntityIndex.missing_position
+        tiers = numpy.where(is_known_user, self.personalized_tier, None).astype(object)
+        if self.fallback_rankings is not None and not is_known_user.all():
+            unknown_user_positions = numpy.flatnonzero(~is_known_user)
+            tiers[unknown_user_positions] = self.fallback_rankings.get_user_tiers([user_ids[position] for position in unknown_user_positions.tolist()])
+        return tiers.tolist()
+
+    def get_similar_jobs_tier(self, job_id: int) -> str:
+        if job_id in self.matrix_column_job_index:
+            return self.similar_jobs_tier
+        return self.fallback_rankings.default_tier if self.fallback_rankings is not None else None
+
+    def get_similar_job_ranking(self, job_idx: int, number_of_recommendations: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Closed jobs are skipped like in every other ranking: the table row is filtered first, and when too few of its
+        # neighbours are open the exact search runs with the closed jobs filtered out.
+        job_availability = self.job_availability
+        if (
+                self.similar_job_positions is not None 
+                and job_idx < len(self.similar_job_positions) 
+                and number_of_recommendations <= self.similar_job_positions.shape[1]
+                ):
+            similar_jobs_idx = self.similar_job_positions[job_idx]
+            scores = self.similar_job_scores[job_idx]
+            if job_availability is not None:
+                is_available = job_availability[similar_jobs_idx]
+                similar_jobs_idx, scores = similar_jobs_idx[is_available], scores[is_available]
+            if len(similar_jobs_idx) >= number_of_recommendations:
+                return similar_jobs_idx[:number_of_recommendations], scores[:number_of_recommendations]
+        unavailable_job_matrix_column_idx = None if job_availability is None else numpy.flatnonzero(~job_availability)
+        return self.als_model.similar_items(job_idx, N=number_of_recommendations, filter_items=unavailable_job_matrix_column_idx)
+
+    def find_similar_jobs(self, job_id: int, number_of_recommendations: int = 10) -> list[dict]:
         response = []
-        if isinstance(job_id, int) and job_id in self.entity_indices["unique_jobs"]:
+        if isinstance(job_id, int) and job_id in self.matrix_column_job_index:
             job_idx = self.matrix_column_job_index.get_loc(job_id)
-            similar_jobs_idx, scores = self.als_model.similar_items(job_idx)
-            for job_idx, score in zip(similar_jobs_idx, scores):
-                recommendation = {
-                    Recommender.job_id_key: self.matrix_column_job_index[job_idx].item(),
-                    Recommender.recommendation_score_key: score.item()
-                    }
-                response.append(recommendation)
+            response = self.generate_recommendations(*self.get_similar_job_ranking(job_idx, number_of_recommendations))
+        elif isinstance(job_id, int) and self.fallback_rankings is not None:
+            # Jobs the model has never seen have no factors; popular jobs stand in for their neighbours.
+            response = self.get_fallback_recommendations(self.fallback_rankings.default_tier, number_of_recommendations)
         return response
 
-
-class Activity(Enum):
-    IMPRESSION = 1
-    REDIRECT = 2
+    def generate_recommendations(self, job_matrix_column_idx: numpy.ndarray, scores: numpy.ndarray) -> list[dict]:
+        is_eligible = scores > -numpy.inf
+        job_matrix_column_idx, scores = job_matrix_column_idx[is_eligible], scores[is_eligible]
+        job_ids = self.matrix_column_job_index.get_entity_ids(job_matrix_column_idx).tolist()
+        recommendations = [
+            {Recommender.job_id_key: job_id, Recommender.recommendation_score_key: score} 
+            for job_id, score in zip(job_ids, scores.tolist())
+            ]
+        return recommendations
 
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+from utils.utils import select_top_k
+
+from multiprocessing.connection import Connection
+
+import multiprocessing
+import threading
+import numpy
+
+
+def run_scoring_shard(connection: Connection, item_factors_source, shard_start: int, shard_end: int) -> None:
+    # A shard holds only its own slice of the item factors. Memory-mapped artifacts are sliced by path, so the
+    # coordinator never has to read or send the whole matrix.
+    if isinstance(item_factors_source, str):
+        item_factors = numpy.array(numpy.load(item_factors_source, mmap_mode="r")[shard_start:shard_end])
+    else:
+        item_factors = item_factors_source
+    item_factors_transposed = numpy.ascontiguousarray(item_factors.T)
+    connection.send(item_factors_transposed.shape[1])
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        command, payload = message
+        if command == "search":
+            query_factors, k, excluded_rows, excluded_columns, unavailable_columns = payload
+            scores = query_factors @ item_factors_transposed
+            # Exclusions arrive as global job columns; each shard masks the ones in its range before its top-k.
+            is_in_shard = (excluded_columns >= shard_start) & (excluded_columns < shard_end)
+            scores[excluded_rows[is_in_shard], excluded_columns[is_in_shard] - shard_start] = -numpy.inf
+            if unavailable_columns is not None:
+                is_in_shard = (unavailable_columns >= shard_start) & (unavailable_columns < shard_end)
+                scores[:, unavailable_columns[is_in_shard] - shard_start] = -numpy.inf
+            positions, top_k_scores = select_top_k(scores, k)
+            connection.send((positions + shard_start, top_k_scores))
+        elif command == "add_items":
+            item_factors_transposed = numpy.ascontiguousarray(numpy.concatenate([item_factors_transposed, payload.T], axis=1))
+            shard_end += len(payload)
+            connection.send(item_factors_transposed.shape[1])
+    connection.close()
+
+
+class ShardedScorer:
+
+    def __init__(self, item_factors: numpy.ndarray, number_of_shards: int) -> None:
+        number_of_items = len(item_factors)
+        number_of_shards = max(1, min(number_of_shards, number_of_items))
+        # Shards are spawned, not forked, so they never inherit the server's threads or its copy of the factors.
+        context = multiprocessing.get_context("spawn")
+        item_factors_filepath = item_factors.filename if isinstance(item_factors, numpy.memmap) else None
+        self.shard_boundaries = numpy.linspace(0, number_of_items, number_of_shards + 1).astype(numpy.int64)
+        self.connections: list[Connection] = []
+        self.processes: list[multiprocessing.Process] = []
+        for shard_start, shard_end in zip(self.shard_boundaries[:-1].tolist(), self.shard_boundaries[1:].tolist()):
+            connection, shard_connection = context.Pipe()
+            item_factors_source = item_factors_filepath or numpy.array(item_factors[shard_start:shard_end])
+            process = context.Process(
+                target=run_scoring_shard,
+                args=(shard_connection, item_factors_source, shard_start, shard_end),
+                name=f"scoring-shard-{len(self.processes)}",
+                daemon=True
+                )
+            process.start()
+            shard_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        for connection in self.connections:
+            connection.recv()
+        # One query is in flight at a time: every shard answers in the order it was asked.
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def search(
+            self,
+            query_factors: numpy.ndarray,
+            k: int,
+            excluded_rows: numpy.ndarray,
+            excluded_columns: numpy.ndarray,
+            unavailable_columns: numpy.ndarray = None
+            ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Returns None once closed, so callers holding a swapped-out model can fall back to scoring locally.
+        query_factors = numpy.ascontiguousarray(query_factors)
+        with self.lock:
+            if self.closed:
+                return None
+            for connection in self.connections:
+                connection.send(("search", (query_factors, k, excluded_rows, excluded_columns, unavailable_columns)))
+            shard_results = [connection.recv() for connection in self.connections]
+        # Each shard's top k holds every item of the global top k that lives in that shard, so merging is exact.
+        candidate_positions = numpy.concatenate([positions for positions, _ in shard_results], axis=1)
+        candidate_scores = numpy.concatenate([scores for _, scores in shard_results], axis=1)
+        top_k_candidates, top_k_scores = select_top_k(candidate_scores, k)
+        return numpy.take_along_axis(candidate_positions, top_k_candidates, axis=1), top_k_scores
+
+    def add_items(self, item_factors: numpy.ndarray) -> None:
+        # New items take the next global positions, so they join the last shard.
+        with self.lock:
+            self.connections[-1].send(("add_items", numpy.ascontiguousarray(item_factors)))
+            self.connections[-1].recv()
+            self.shard_boundaries[-1] += len(item_factors)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            for connection in self.connections:
+                connection.send(None)
+                connection.close()
+        for process in self.processes:
+            process.join()
@@ -0,0 +1,71 @@
+from ingestion import Activity, ActivityColumns
+
+import argparse
+import numpy
+
+
+def sample_power_law_ranks(random_generator: numpy.random.Generator, number_of_items: int, exponent: float, size: int) -> numpy.ndarray:
+    # P(rank r) is proportional to r ** -exponent over a finite catalogue, unlike numpy's unbounded zipf.
+    rank_weights = numpy.arange(1, number_of_items + 1, dtype=numpy.float64) ** -exponent
+    cumulative_weights = numpy.cumsum(rank_weights)
+    uniform_samples = random_generator.random(size) * cumulative_weights[-1]
+    return numpy.searchsorted(cumulative_weights, uniform_samples, side="right")
+
+
+def generate_activity_columns(
+        number_of_users: int = 10_000,
+        number_of_jobs: int = 5_000,
+        number_of_events: int = 100_000,
+        job_popularity_exponent: float = 1.1,
+        user_activity_exponent: float = 0.8,
+        redirect_share: float = 0.2,
+        start_timestamp: float = 1.6e9,
+        duration_seconds: float = 30 * 24 * 3600,
+        seed: int = 0
+        ) -> ActivityColumns:
+    random_generator = numpy.random.default_rng(seed)
+    # Ids are shuffled so popularity does not correlate with id order, as in the real dataset.
+    user_ids = random_generator.permutation(number_of_users).astype(ActivityColumns.user_id_dtype) + 1
+    job_ids = random_generator.permutation(number_of_jobs).astype(ActivityColumns.job_id_dtype) + 1
+    event_user_ids = user_ids[sample_power_law_ranks(random_generator, number_of_users, user_activity_exponent, number_of_events)]
+    event_job_ids = job_ids[sample_power_law_ranks(random_generator, number_of_jobs, job_popularity_exponent, number_of_events)]
+    is_redirect = random_generator.random(number_of_events) < redirect_share
+    type_codes = numpy.where(is_redirect, Activity.REDIRECT.value, Activity.IMPRESSION.value).astype(ActivityColumns.type_code_dtype)
+    timestamps = start_timestamp + numpy.sort(random_generator.random(number_of_events)) * duration_seconds
+    return ActivityColumns(event_user_ids, event_job_ids, type_codes, timestamps.astype(ActivityColumns.timestamp_dtype))
+
+
+def write_activities(activities_filepath: str, activity_columns: ActivityColumns) -> None:
+    activity_type_names = {activity.value: activity.name.lower() for activity in Activity}
+    with open(activities_filepath, "w") as output_file:
+        for timestamp, job_id, user_id, type_code in zip(
+                activity_columns.timestamps.tolist(),
+                activity_columns.job_ids.tolist(),
+                activity_columns.user_ids.tolist(),
+                activity_columns.type_codes.tolist()
+                ):
+            output_file.write(f'{{"timestamp": {timestamp!r}, "job_id": {job_id}, "user_id": {user_id}, "type": "{activity_type_names[type_code]}"}}\n')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a deterministic synthetic activities.jsonl with power-law popularity.")
+    parser.add_argument("--output", default="dataset/synthetic_activities.jsonl")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--jobs", type=int, default=5_000)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--job-popularity-exponent", type=float, default=1.1)
+    parser.add_argument("--user-activity-exponent", type=float, default=0.8)
+    parser.add_argument("--redirect-share", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    activity_columns = generate_activity_columns(
+        args.users,
+        args.jobs,
+        args.events,
+        args.job_popularity_exponent,
+        args.user_activity_exponent,
+        args.redirect_share,
+        seed=args.seed
+        )
+    write_activities(args.output, activity_columns)
+    print(f"{len(activity_columns)} activities written to {args.output}")
@@ -0,0 +1,40 @@
+import copy
+import json
+
+import numpy
+import pytest
+
+from recommender import Recommender
+
+
+def write_random_activities(activities_filepath, number_of_activities=3000, seed=7) -> None:
+    random_generator = numpy.random.default_rng(seed)
+    with open(activities_filepath, "w") as output_file:
+        for _ in range(number_of_activities):
+            activity = {
+                "timestamp": float(random_generator.uniform(1.6e9, 1.7e9)),
+                "job_id": int(random_generator.integers(100, 140)),
+                "user_id": int(random_generator.integers(1000, 1060)),
+                "type": str(random_generator.choice(["impression", "impression", "impression", "redirect"]))
+            }
+            output_file.write(json.dumps(activity) + "\n")
+
+@pytest.fixture()
+def random_activities_filepath(tmp_path):
+    activities_filepath = tmp_path / "activities.jsonl"
+    write_random_activities(activities_filepath)
+    return str(activities_filepath)
+
+@pytest.fixture(scope="session")
+def trained_recommender(tmp_path_factory):
+    activities_filepath = tmp_path_factory.mktemp("trained_recommender") / "activities.jsonl"
+    write_random_activities(activities_filepath)
+    recommender = Recommender(str(activities_filepath), ingestion_mode="columnar")
+    recommender.build_sparse_matrix()
+    recommender.train_als_model()
+    return recommender
+
+@pytest.fixture()
+def recommender(trained_recommender):
+    # A deep copy of the session model for tests that change it: its arrays are copied too, so nothing leaks between tests.
+    return copy.deepcopy(trained_recommender)
@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import json
+import multiprocessing
+import os
+
+import numpy
+import pytest
+
+import activity_cache
+from activity_cache import ActivityCache
+from ingestion import read_activity_columns
+
+
+def write_activities(activities_filepath, activities, mode="w") -> None:
+    with open(activities_filepath, mode) as output_file:
+        for activity in activities:
+            output_file.write(json.dumps(activity) + "\n")
+
+def generate_activities(number_of_activities, seed) -> list[dict]:
+    random_generator = numpy.random.default_rng(seed)
+    activities = [
+        {
+            "timestamp": float(random_generator.uniform(1.6e9, 1.7e9)),
+            "job_id": int(random_generator.integers(100, 140)),
+            "user_id": int(random_generator.integers(1000, 1060)),
+            "type": str(random_generator.choice(["impression", "redirect"]))
+        }
+        for _ in range(number_of_activities)
+    ]
+    return activities
+
+def assert_same_columns(activity_columns, expected_activity_columns) -> None:
+    assert activity_columns.user_ids.tolist() == expected_activity_columns.user_ids.tolist()
+    assert activity_columns.job_ids.tolist() == expected_activity_columns.job_ids.tolist()
+    assert activity_columns.type_codes.tolist() == expected_activity_columns.type_codes.tolist()
+    assert activity_columns.timestamps.tolist() == expected_activity_columns.timestamps.tolist()
+
+@pytest.fixture()
+def activities_filepath(tmp_path):
+    activities_filepath = str(tmp_path / "activities.jsonl")
+    write_activities(activities_filepath, generate_activities(500, seed=1))
+    return activities_filepath
+
+@pytest.fixture()
+def parse_counter(monkeypatch):
+    calls = []
+    read_columns = activity_cache.read_activity_columns_in_byte_range
+    def counting_read_columns(activities_filepath, shard_start, shard_end, chunk_size_bytes):
+        calls.append((shard_start, shard_end))
+        return read_columns(activities_filepath, shard_start, shard_end, chunk_size_bytes)
+    monkeypatch.setattr(activity_cache, "read_activity_columns_in_byte_range", counting_read_columns)
+    return calls
+
+
+# Test a cold cache parses the log and matches direct parsing:
+def test_cold_cache_matches_parsed_columns(activities_filepath, tmp_path) -> None:
+    activity_columns = ActivityCache(str(tmp_path / "cache")).load(activities_filepath)
+    assert_same_columns(activity_columns, read_activity_columns(activities_filepath))
+    assert activity_columns.user_ids.dtype == numpy.int32
+    assert activity_columns.type_codes.dtype == numpy.uint8
+
+# Test a warm cache is memory-mapped without parsing:
+def test_warm_cache_is_memory_mapped_without_parsing(activities_filepath, tmp_path, parse_counter) -> None:
+    ActivityCache(str(tmp_path / "cache")).load(activities_filepath)
+    activity_columns = ActivityCache(str(tmp_path / "cache")).load(activities_filepath)
+    assert len(parse_counter) == 1
+    assert isinstance(activity_columns.user_ids, numpy.memmap)
+    assert_same_columns(activity_columns, read_activity_columns(activities_filepath))
+
+# Test appended lines are parsed incrementally:
+test_validation_modes = ["metadata", "content"]
+@pytest.mark.parametrize("validation", test_validation_modes)
+def test_appended_tail_is_parsed_incrementally(activities_filepath, tmp_path, parse_counter, validation) -> None:
+    cache = ActivityCache(str(tmp_path / "cache"), validation=validation)
+    cache.load(activities_filepath)
+    parsed_bytes = os.path.getsize(activities_filepath)
+    write_activities(activities_filepath, generate_activities(50, seed=2), mode="a")
+    activity_columns = cache.load(activities_filepath)
+    assert parse_counter[-1] == (parsed_bytes, os.path.getsize(activities_filepath))
+    assert_same_columns(activity_columns, read_activity_columns(activities_filepath))
+
+# Test a rewritten log invalidates the cache:
+def test_rewritten_log_rebuilds_cache(activities_filepath, tmp_path, parse_counter) -> None:
+    cache = ActivityCache(str(tmp_path / "cache"))
+    cache.load(activities_filepath)
+    write_activities(activities_filepath, generate_activities(600, seed=3))
+    activity_columns = cache.load(activities_filepath)
+    assert parse_counter[-1][0] == 0
+    assert_same_columns(activity_columns, read_activity_columns(activities_filepath))
+
+# Test incremental mode can be switched off:
+def test_non_incremental_load_rebuilds_cache(activities_filepath, tmp_path, parse_counter) -> None:
+    cache = ActivityCache(str(tmp_path / "cache"))
+    cache.load(activities_filepath)
+    write_activities(activities_filepath, generate_activities(10, seed=4), mode="a")
+    activity_columns = cache.load(activities_filepath, incremental=False)
+    assert parse_counter[-1][0] == 0
+    assert_same_columns(activity_columns, read_activity_columns(activities_filepath))
+
+# Test processes loading one cache directory together each get every activity exactly once:
+def load_number_of_activities(cache_directory, activities_filepath) -> int:
+    return len(ActivityCache(cache_directory).load(activities_filepath))
+
+def test_concurrent_loads_share_one_cache(activities_filepath, tmp_path) -> None:
+    cache_directory = str(tmp_path / "cache")
+    with ProcessPoolExecutor(max_workers=6, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for number_of_appended_activities in (0, 300):
+            write_activities(activities_filepath, generate_activities(number_of_appended_activities, seed=5), mode="a")
+            expected_number_of_activities = len(read_activity_columns(activities_filepath))
+            number_of_activities = list(executor.map(load_number_of_activities, [cache_directory] * 6, [activities_filepath] * 6))
+            assert number_of_activities == [expected_number_of_activities] * 6
+    assert_same_columns(ActivityCache(cache_directory).load(activities_filepath), read_activity_columns(activities_filepath))
@@ -0,0 +1,62 @@
+import numpy
+import pytest
+from implicit.als import AlternatingLeastSquares
+
+from als_training import TrainingConfig, build_confidence_matrix, fit_als_model
+from recommender import Recommender
+
+
+# Test the confidence matrix scales float32 values and shares the index arrays of the score matrix:
+def test_confidence_matrix_shares_indices(trained_recommender) -> None:
+    matrix_csr = trained_recommender.matrix_csr
+    original_data = matrix_csr.data.copy()
+    confidence_matrix = build_confidence_matrix(matrix_csr, 2.0)
+    assert confidence_matrix.dtype == numpy.float32
+    assert numpy.shares_memory(confidence_matrix.indices, matrix_csr.indices)
+    assert numpy.shares_memory(confidence_matrix.indptr, matrix_csr.indptr)
+    numpy.testing.assert_array_equal(confidence_matrix.data, 2.0 * original_data)
+    numpy.testing.assert_array_equal(matrix_csr.data, original_data)
+
+# Test training with the default config matches fitting implicit on the scaled matrix copy:
+def test_fit_matches_scaled_copy(trained_recommender) -> None:
+    training_config = TrainingConfig(random_state=3, number_of_threads=1)
+    als_model, _ = fit_als_model(trained_recommender.matrix_csr, training_config)
+    expected_als_model = AlternatingLeastSquares(factors=64, regularization=0.05, random_state=3, num_threads=1)
+    expected_als_model.fit(2 * trained_recommender.matrix_csr)
+    numpy.testing.assert_allclose(als_model.user_factors, expected_als_model.user_factors, rtol=1e-4, atol=1e-5)
+    numpy.testing.assert_allclose(als_model.item_factors, expected_als_model.item_factors, rtol=1e-4, atol=1e-5)
+
+# Test the report carries duration, peak memory and the loss of every iteration:
+def test_training_report_tracks_loss(trained_recommender) -> None:
+    training_config = TrainingConfig(factors=8, iterations=4, track_loss=True, factor_dtype="float64")
+    als_model, training_report = fit_als_model(trained_recommender.matrix_csr, training_config)
+    assert als_model.user_factors.dtype == numpy.float64
+    assert als_model.user_factors.shape[1] == 8
+    assert training_report["iterations_run"] == 4
+    assert len(training_report["losses"]) == 4
+    assert training_report["training_seconds"] > 0
+    assert training_report["peak_traced_memory_bytes"] > 0
+    assert training_report["stopped_early"] is False
+
+# Test training stops once the loss improvement stalls:
+def test_early_stopping(trained_recommender) -> None:
+    training_config = TrainingConfig(factors=8, iterations=15, early_stopping_tolerance=1.0, early_stopping_patience=2)
+    als_model, training_report = fit_als_model(trained_recommender.matrix_csr, training_config)
+    assert training_report["stopped_early"] is True
+    assert training_report["iterations_run"] == 3
+    assert als_model.user_factors.shape == (trained_recommender.matrix_csr.shape[0], 8)
+
+# Test unknown factor dtypes are rejected:
+def test_unknown_factor_dtype() -> None:
+    with pytest.raises(ValueError):
+        TrainingConfig(factor_dtype="float16")
+
+# Test the training config and report are saved with the model:
+def test_training_config_is_saved(recommender, tmp_path) -> None:
+    recommender.train_als_model(TrainingConfig(factors=16, iterations=3, confidence_scale=3.0))
+    recommender.save_model(str(tmp_path))
+    loaded_recommender = Recommender.load_model(str(tmp_path))
+    assert loaded_recommender.training_config.to_dict() == recommender.training_config.to_dict()
+    assert loaded_recommender.training_report == recommender.training_report
+    assert loaded_recommender.confidence_scale == 3.0
+    assert loaded_recommender.als_model.factors == 16
@@ -0,0 +1,64 @@
+import numpy
+import pytest
+
+from ann_index import IVFIndex
+from recommender import Recommender
+from utils.utils import select_top_k
+
+
+@pytest.fixture(scope="module")
+def clustered_factors():
+    random_generator = numpy.random.default_rng(3)
+    cluster_centers = random_generator.standard_normal((20, 16)).astype(numpy.float32)
+    item_factors = cluster_centers[random_generator.integers(0, 20, 4000)] + 0.3 * random_generator.standard_normal((4000, 16), dtype=numpy.float32)
+    query_factors = cluster_centers[random_generator.integers(0, 20, 200)] + 0.3 * random_generator.standard_normal((200, 16), dtype=numpy.float32)
+    return item_factors, query_factors
+
+
+# Test probing every cluster reproduces the exact scan:
+def test_probing_all_clusters_matches_exact_scan(clustered_factors) -> None:
+    item_factors, query_factors = clustered_factors
+    ann_index = IVFIndex(item_factors, number_of_clusters=16, number_of_probes=16)
+    positions, scores = ann_index.search(query_factors, 10)
+    expected_positions, expected_scores = select_top_k(query_factors @ item_factors.T, 10)
+    assert positions.tolist() == expected_positions.tolist()
+    numpy.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+# Test a partial probe keeps high recall on clustered factors:
+def test_partial_probe_keeps_high_recall(clustered_factors) -> None:
+    item_factors, query_factors = clustered_factors
+    ann_index = IVFIndex(item_factors, number_of_clusters=64, number_of_probes=8)
+    positions, _ = ann_index.search(query_factors, 10)
+    expected_positions, _ = select_top_k(query_factors @ item_factors.T, 10)
+    recall = numpy.mean([len(set(found) & set(expected)) / 10 for found, expected in zip(positions.tolist(), expected_positions.tolist())])
+    assert recall > 0.9
+
+# Test every query gets exactly k results even when probed clusters are small:
+def test_search_returns_exactly_k_results(clustered_factors) -> None:
+    item_factors, query_factors = clustered_factors
+    ann_index = IVFIndex(item_factors[:50], number_of_clusters=40, number_of_probes=1)
+    positions, _ = ann_index.search(query_factors, 10)
+    assert positions.shape == (len(query_factors), 10)
+    assert all(len(set(row)) == 10 for row in positions.tolist())
+
+# Test the recommender serves through the ANN index and keeps it across save and load:
+def test_recommender_serves_through_ann_index(recommender, trained_recommender, tmp_path, monkeypatch) -> None:
+    recommender.enable_ann_index(number_of_clusters=6, number_of_probes=6)
+    user_ids = recommender.entity_indices["unique_users"][:5]
+    response = recommender.get_job_recommendations_for_bulk_users(user_ids)
+    expected_response = trained_recommender.get_job_recommendations_for_bulk_users(user_ids)
+    for user_id in user_ids:
+        assert [recommendation["job_id"] for recommendation in response[user_id]] == [recommendation["job_id"] for recommendation in expected_response[user_id]]
+    recommender.save_model(str(tmp_path))
+
+    def fail_train_centroids(*args) -> None:
+        raise AssertionError("k-means reran on load")
+
+    monkeypatch.setattr(IVFIndex, "train_centroids", fail_train_centroids)
+    loaded_recommender = Recommender.load_model(str(tmp_path))
+    assert loaded_recommender.ann_index is not None
+    assert isinstance(loaded_recommender.ann_index.sorted_item_factors, numpy.memmap)
+    assert loaded_recommender.get_job_recommendations_for_bulk_users(user_ids) == response
+    assert len(loaded_recommender.get_job_recommendations_for_single_user(user_ids[0])) == 10
+    loaded_recommender.disable_ann_index()
+    assert loaded_recommender.ann_index is None
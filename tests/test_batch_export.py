@@ -0,0 +1,45 @@
+import json
+
+import numpy
+import pytest
+
+from als_training import TrainingConfig
+from batch_export import export_recommendations
+from recommender import Recommender
+from utils.utils import select_top_k
+
+
+# Test top-k selection returns the k highest scores per row in descending order:
+def test_select_top_k_returns_descending_top_scores() -> None:
+    scores = numpy.array([[0.1, 0.9, 0.5, 0.7], [3.0, 1.0, 2.0, 0.0]], dtype=numpy.float32)
+    positions, top_scores = select_top_k(scores, 2)
+    assert positions.tolist() == [[1, 3], [0, 2]]
+    numpy.testing.assert_allclose(top_scores, [[0.9, 0.7], [3.0, 2.0]])
+    positions, _ = select_top_k(scores, 10)
+    assert positions.shape == (2, 4)
+
+# Test exported recommendations match bulk recommendations for every user:
+test_export_settings = [
+    (7, 1),
+    (16, 3)
+]
+@pytest.mark.parametrize("block_size, number_of_workers", test_export_settings)
+def test_exported_recommendations_match_bulk_recommendations(random_activities_filepath, tmp_path, block_size, number_of_workers) -> None:
+    # A seeded model keeps near-tied scores, which export and bulk scoring compute with different BLAS blocks, in one order.
+    recommender = Recommender(random_activities_filepath, ingestion_mode="columnar")
+    recommender.build_sparse_matrix()
+    recommender.train_als_model(TrainingConfig(random_state=42))
+    output_directory = export_recommendations(recommender, str(tmp_path), 5, block_size, number_of_workers)
+    user_ids = numpy.load(f"{output_directory}/user_ids.npy")
+    job_ids = numpy.load(f"{output_directory}/job_ids.npy", mmap_mode="r")
+    scores = numpy.load(f"{output_directory}/scores.npy", mmap_mode="r")
+    assert user_ids.tolist() == recommender.entity_indices["unique_users"]
+    assert job_ids.dtype == numpy.int32 and scores.dtype == numpy.float32
+    expected_response = recommender.get_job_recommendations_for_bulk_users(user_ids.tolist(), 5)
+    for user_id, user_job_ids, user_scores in zip(user_ids.tolist(), job_ids, scores):
+        expected_recommendations = expected_response[user_id]
+        is_exported = user_job_ids != -1
+        assert user_job_ids[is_exported].tolist() == [recommendation["job_id"] for recommendation in expected_recommendations]
+        assert user_scores[is_exported].tolist() == pytest.approx([recommendation["score"] for recommendation in expected_recommendations], abs=1e-6)
+    with open(f"{output_directory}/manifest.json") as manifest_file:
+        assert json.load(manifest_file)["number_of_users"] == len(user_ids)
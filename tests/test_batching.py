@@ -0,0 +1,67 @@
+import asyncio
+
+from batching import RecommendationBatcher
+
+
+class RecordingScorer:
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.models = []
+
+    def __call__(self, model: str, user_ids: list[int], number_of_recommendations: int) -> dict:
+        self.batches.append(list(user_ids))
+        self.models.append(model)
+        if -1 in user_ids:
+            raise RuntimeError("scoring failed")
+        return {user_id: [{"job_id": user_id * 10, "score": float(number_of_recommendations)}] for user_id in user_ids if user_id != 0}
+
+
+async def submit_concurrently(batcher, user_ids, number_of_recommendations=10, model="v1"):
+    return await asyncio.gather(*(batcher.submit(model, user_id, number_of_recommendations) for user_id in user_ids), return_exceptions=True)
+
+
+# Test concurrent requests are coalesced into one scoring call:
+def test_concurrent_requests_are_scored_in_one_batch() -> None:
+    scorer = RecordingScorer()
+    batcher = RecommendationBatcher(scorer, batch_window_seconds=0.01, max_batch_size=64)
+    responses = asyncio.run(submit_concurrently(batcher, [1, 2, 3, 2]))
+    assert scorer.batches == [[1, 2, 3]]
+    assert responses == [[{"job_id": 10, "score": 10.0}], [{"job_id": 20, "score": 10.0}], [{"job_id": 30, "score": 10.0}], [{"job_id": 20, "score": 10.0}]]
+
+# Test batches are cut at the maximum batch size:
+def test_batches_are_capped_at_max_batch_size() -> None:
+    scorer = RecordingScorer()
+    batcher = RecommendationBatcher(scorer, batch_window_seconds=0.01, max_batch_size=2)
+    asyncio.run(submit_concurrently(batcher, [1, 2, 3, 4, 5]))
+    assert scorer.batches == [[1, 2], [3, 4], [5]]
+
+# Test requests with different result sizes are batched separately:
+def test_requests_are_batched_per_number_of_recommendations() -> None:
+    scorer = RecordingScorer()
+    batcher = RecommendationBatcher(scorer, batch_window_seconds=0.01)
+    async def submit_mixed_sizes():
+        return await asyncio.gather(batcher.submit("v1", 1, 5), batcher.submit("v1", 2, 10))
+    responses = asyncio.run(submit_mixed_sizes())
+    assert sorted(scorer.batches) == [[1], [2]]
+    assert responses == [[{"job_id": 10, "score": 5.0}], [{"job_id": 20, "score": 10.0}]]
+
+# Test requests are scored on the model they were submitted with, even when a newer model is batched meanwhile:
+def test_requests_are_batched_per_model() -> None:
+    scorer = RecordingScorer()
+    batcher = RecommendationBatcher(scorer, batch_window_seconds=0.01)
+    async def submit_across_swap():
+        return await asyncio.gather(submit_concurrently(batcher, [1, 2], model="v1"), submit_concurrently(batcher, [2, 3], model="v2"))
+    asyncio.run(submit_across_swap())
+    assert sorted(zip(scorer.models, scorer.batches)) == [("v1", [1, 2]), ("v2", [2, 3])]
+
+# Test unknown users receive an empty response:
+def test_unknown_users_receive_empty_response() -> None:
+    batcher = RecommendationBatcher(RecordingScorer(), batch_window_seconds=0.001)
+    assert asyncio.run(submit_concurrently(batcher, [0])) == [[]]
+
+# Test scoring errors reach every caller in the batch:
+def test_scoring_errors_reach_every_caller() -> None:
+    batcher = RecommendationBatcher(RecordingScorer(), batch_window_seconds=0.001)
+    responses = asyncio.run(submit_concurrently(batcher, [1, -1]))
+    assert all(isinstance(response, RuntimeError) for response in responses)
@@ -0,0 +1,83 @@
+import json
+
+import numpy
+import pytest
+
+from bulk_serialization import decode_binary_recommendations, iter_encoded_recommendations
+from recommender import Recommender
+
+
+unknown_user_id = 999_999
+
+@pytest.fixture()
+def recommender(recommender):
+    recommender.build_fallback_rankings(recent_window_seconds=30 * 24 * 3600)
+    # Closed jobs leave some users with fewer than N eligible jobs, so padded rows are exercised too.
+    recommender.set_job_availability(recommender.entity_indices["unique_jobs"][5:], False)
+    return recommender
+
+def encode(recommender: Recommender, user_ids: list[int], response_format: str, **kwargs) -> bytes:
+    return b"".join(iter_encoded_recommendations(recommender, user_ids, response_format, **kwargs))
+
+def assert_same_jobs(recommendations: list[dict], expected_recommendations: list[dict]) -> None:
+    # Chunks are scored by smaller matrix products, so float32 scores may differ in their last bits.
+    assert [recommendation["job_id"] for recommendation in recommendations] == [recommendation["job_id"] for recommendation in expected_recommendations]
+    assert [recommendation["score"] for recommendation in recommendations] == pytest.approx([recommendation["score"] for recommendation in expected_recommendations], rel=1e-5, abs=1e-6)
+
+
+# Test the JSON body is the default bulk response, across chunks and with tiers:
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+def test_json_matches_default_response(recommender, chunk_size) -> None:
+    user_ids = recommender.entity_indices["unique_users"] + [unknown_user_id]
+    expected_response = json.loads(json.dumps(recommender.get_job_recommendations_for_bulk_users(user_ids, 8)))
+    response = json.loads(encode(recommender, user_ids, "json", number_of_recommendations=8, chunk_size=chunk_size))
+    assert list(response) == list(expected_response)
+    for user_id, recommendations in response.items():
+        assert_same_jobs(recommendations, expected_response[user_id])
+    tiers = dict(zip(user_ids, recommender.get_recommendation_tiers(user_ids)))
+    response = json.loads(encode(recommender, user_ids, "json", number_of_recommendations=8, include_tiers=True, chunk_size=chunk_size))
+    assert {user_id: user_response["tier"] for user_id, user_response in response.items()} == {str(user_id): tier for user_id, tier in tiers.items()}
+    for user_id, user_response in response.items():
+        assert_same_jobs(user_response["jobs"], expected_response[user_id])
+    assert json.loads(encode(recommender, [], "json")) == {}
+
+# Test NDJSON has one line per user in request order:
+def test_ndjson_lines(recommender) -> None:
+    user_ids = [unknown_user_id] + recommender.entity_indices["unique_users"][::-1]
+    expected_response = json.loads(json.dumps(recommender.get_job_recommendations_for_bulk_users(user_ids)))
+    lines = [json.loads(line) for line in encode(recommender, user_ids, "ndjson", include_tiers=True, chunk_size=10).decode().splitlines()]
+    assert [line["user_id"] for line in lines] == user_ids
+    for line in lines:
+        assert_same_jobs(line["jobs"], expected_response[str(line["user_id"])])
+    assert lines[0]["tier"] == "recent_popularity"
+
+# Test the binary body decodes to the same ids and float32 scores, padded with -1 and -inf:
+def test_binary_round_trip(recommender) -> None:
+    user_ids = recommender.entity_indices["unique_users"] + [unknown_user_id]
+    expected_response = recommender.get_job_recommendations_for_bulk_users(user_ids, 8)
+    decoded_user_ids, job_ids, scores = decode_binary_recommendations(encode(recommender, user_ids, "binary", number_of_recommendations=8, chunk_size=16))
+    assert decoded_user_ids.tolist() == user_ids
+    assert job_ids.shape == scores.shape == (len(user_ids), 8)
+    for user_id, user_job_ids, user_scores in zip(user_ids, job_ids, scores):
+        recommendations = expected_response[user_id]
+        assert_same_jobs(
+            [{"job_id": job_id, "score": score} for job_id, score in zip(user_job_ids[:len(recommendations)].tolist(), user_scores[:len(recommendations)].tolist())],
+            recommendations
+            )
+        assert (user_job_ids[len(recommendations):] == -1).all() and numpy.isneginf(user_scores[len(recommendations):]).all()
+    with pytest.raises(ValueError):
+        decode_binary_recommendations(b"{}" + bytes(32))
+
+# Test repeated user ids are encoded once, in order of first occurrence, even across chunks:
+@pytest.mark.parametrize("response_format", ["json", "ndjson", "binary"])
+def test_duplicate_user_ids_are_encoded_once(recommender, response_format) -> None:
+    unique_user_ids = recommender.entity_indices["unique_users"][:5] + [unknown_user_id]
+    user_ids = unique_user_ids + unique_user_ids[::-1] + unique_user_ids[:2]
+    body = encode(recommender, user_ids, response_format, chunk_size=4)
+    if response_format == "json":
+        encoded_user_ids = [int(user_id) for user_id, _ in json.loads(body, object_pairs_hook=list)]
+    elif response_format == "ndjson":
+        encoded_user_ids = [json.loads(line)["user_id"] for line in body.decode().splitlines()]
+    else:
+        encoded_user_ids = decode_binary_recommendations(body)[0].tolist()
+    assert encoded_user_ids == unique_user_ids
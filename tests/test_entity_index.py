@@ -0,0 +1,56 @@
+import numpy
+import pytest
+
+from entity_index import EntityIndex
+
+
+@pytest.fixture()
+def entity_index():
+    return EntityIndex([40, 10, 30, 20])
+
+
+# Test ids are translated to positions in bulk, with missing ids flagged:
+def test_positions_are_looked_up_in_bulk(entity_index) -> None:
+    positions = entity_index.get_positions(numpy.array([20, 99, 40, 5, 10]))
+    assert positions.tolist() == [3, EntityIndex.missing_position, 0, EntityIndex.missing_position, 1]
+
+# Test positions are translated back to ids in bulk:
+def test_entity_ids_are_looked_up_in_bulk(entity_index) -> None:
+    entity_ids = entity_index.get_entity_ids(numpy.array([[3, 0], [2, 1]]))
+    assert entity_ids.tolist() == [[20, 40], [30, 10]]
+
+# Test single-id lookups behave like a pandas index:
+def test_single_lookups_follow_pandas_index_semantics(entity_index) -> None:
+    assert entity_index.get_loc(30) == 2
+    assert entity_index[2].item() == 30
+    assert 30 in entity_index
+    assert 31 not in entity_index
+    assert list(entity_index) == [40, 10, 30, 20]
+    with pytest.raises(KeyError):
+        entity_index.get_loc(31)
+
+# Test an empty index finds nothing:
+def test_empty_index_finds_nothing() -> None:
+    entity_index = EntityIndex([])
+    assert entity_index.get_positions(numpy.array([1, 2])).tolist() == [EntityIndex.missing_position] * 2
+    assert 1 not in entity_index
+
+# Test appending returns a new index, leaving the previous one unchanged, before and after the side table is merged:
+@pytest.mark.parametrize("merge_minimum", [0, 1024])
+def test_append_returns_new_index(entity_index, monkeypatch, merge_minimum) -> None:
+    monkeypatch.setattr(EntityIndex, "merge_minimum", merge_minimum)
+    appended_index = entity_index.append(numpy.array([25, 5]))
+    appended_index = appended_index.append(numpy.array([50]))
+    assert appended_index.get_positions(numpy.array([5, 50, 25, 40, 99])).tolist() == [5, 6, 4, 0, EntityIndex.missing_position]
+    assert list(appended_index) == [40, 10, 30, 20, 25, 5, 50]
+    assert len(entity_index) == 4 and 25 not in entity_index
+    assert len(appended_index.appended_sorted_entity_ids) == (0 if merge_minimum == 0 else 3)
+
+# Test ids outside the int64 range are reported missing instead of overflowing:
+def test_out_of_range_ids_are_missing() -> None:
+    entity_index = EntityIndex([0, 1, 2])
+    assert 2**70 not in entity_index
+    assert -2**70 not in entity_index
+    assert entity_index.get_positions([2, 2**70, -2**70, 0]).tolist() == [2, EntityIndex.missing_position, EntityIndex.missing_position, 0]
+    with pytest.raises(KeyError):
+        entity_index.get_loc(2**70)
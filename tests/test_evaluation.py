@@ -0,0 +1,88 @@
+import csv
+from types import SimpleNamespace
+
+import numpy
+import pytest
+import scipy.sparse
+
+from evaluation import build_relevance_matrix, evaluate_recommender, grid_search, split_activities_by_timestamp
+from ingestion import read_activity_columns
+from recommender import Recommender
+
+
+@pytest.fixture()
+def split_activities(random_activities_filepath):
+    return split_activities_by_timestamp(read_activity_columns(random_activities_filepath), test_fraction=0.25)
+
+# Test the split puts every event before the boundary into train and the rest into test:
+def test_split_by_timestamp(random_activities_filepath) -> None:
+    activity_columns = read_activity_columns(random_activities_filepath)
+    train_columns, test_columns = split_activities_by_timestamp(activity_columns, test_fraction=0.25)
+    assert len(train_columns) + len(test_columns) == len(activity_columns)
+    assert abs(len(test_columns) / len(activity_columns) - 0.25) < 0.01
+    assert train_columns.timestamps.max() < test_columns.timestamps.min()
+    boundary = float(numpy.median(activity_columns.timestamps))
+    train_columns, test_columns = split_activities_by_timestamp(activity_columns, test_start_timestamp=boundary)
+    assert (train_columns.timestamps < boundary).all() and (test_columns.timestamps >= boundary).all()
+
+# Test precision, recall and NDCG on a hand-built case where training items are excluded:
+def test_metrics_on_hand_built_case() -> None:
+    recommender = SimpleNamespace(
+        als_model=SimpleNamespace(
+            user_factors=numpy.array([[4, 3, 2, 1], [1, 2, 3, 4]], dtype=numpy.float32),
+            item_factors=numpy.eye(4, dtype=numpy.float32)
+            ),
+        matrix_csr=scipy.sparse.csr_matrix(([1.0], ([0], [0])), shape=(2, 4))
+        )
+    relevance_matrix = scipy.sparse.csr_matrix(([1.0, 1.0, 1.0], ([0, 1, 1], [2, 0, 3])), shape=(2, 4))
+    evaluation = evaluate_recommender(recommender, relevance_matrix, k=2)
+    # User 0 gets [1, 2] (item 0 was seen in training) and hits at rank 2; user 1 gets [3, 2] and hits at rank 1.
+    discount = 1 / numpy.log2(3)
+    assert evaluation["precision_at_2"] == pytest.approx(0.5)
+    assert evaluation["recall_at_2"] == pytest.approx(0.75)
+    assert evaluation["ndcg_at_2"] == pytest.approx((discount + 1 / (1 + discount)) / 2)
+    assert evaluation["number_of_test_users"] == 2
+
+# Test a test period without known users or jobs fails with a clear error instead of NaN metrics:
+def test_evaluation_without_test_users(split_activities) -> None:
+    train_activity_columns, test_activity_columns = split_activities
+    recommender = Recommender.from_activity_columns(train_activity_columns)
+    recommender.build_sparse_matrix()
+    recommender.train_als_model()
+    test_activity_columns.user_ids[:] = -1
+    with pytest.raises(ValueError, match="No test users"):
+        evaluate_recommender(recommender, build_relevance_matrix(recommender, test_activity_columns))
+
+# Test the batched evaluation matches a per-user loop over the scores:
+def test_batched_matches_per_user_loop(split_activities) -> None:
+    train_columns, test_columns = split_activities
+    recommender = Recommender.from_activity_columns(train_columns)
+    recommender.build_sparse_matrix()
+    recommender.train_als_model()
+    relevance_matrix = build_relevance_matrix(recommender, test_columns)
+    evaluation = evaluate_recommender(recommender, relevance_matrix, k=5, block_size=7)
+    precisions, recalls = [], []
+    for user_matrix_row_idx in numpy.flatnonzero(numpy.diff(relevance_matrix.indptr)):
+        scores = recommender.als_model.item_factors @ recommender.als_model.user_factors[user_matrix_row_idx]
+        scores[recommender.matrix_csr[user_matrix_row_idx].indices] = -numpy.inf
+        top_k_positions = numpy.argsort(-scores, kind="stable")[:5]
+        relevant_positions = relevance_matrix[user_matrix_row_idx].indices
+        number_of_hits = numpy.isin(top_k_positions, relevant_positions).sum()
+        precisions.append(number_of_hits / 5)
+        recalls.append(number_of_hits / len(relevant_positions))
+    assert evaluation["number_of_test_users"] == len(precisions) > 0
+    assert evaluation["precision_at_5"] == pytest.approx(numpy.mean(precisions))
+    assert evaluation["recall_at_5"] == pytest.approx(numpy.mean(recalls))
+
+# Test the grid search evaluates every combination and writes one table row each:
+def test_grid_search_writes_results_table(split_activities, tmp_path) -> None:
+    train_columns, test_columns = split_activities
+    results_filepath = tmp_path / "results.csv"
+    parameter_grid = {"factors": [4, 8], "regularization": [0.01, 0.1], "iterations": [2]}
+    results = grid_search(train_columns, test_columns, parameter_grid, k=5, number_of_workers=2, results_filepath=str(results_filepath))
+    assert len(results) == 4
+    with open(results_filepath) as results_file:
+        rows = list(csv.DictReader(results_file))
+    assert [(int(row["factors"]), float(row["regularization"])) for row in rows] == [(4, 0.01), (4, 0.1), (8, 0.01), (8, 0.1)]
+    assert all(float(row["training_seconds"]) > 0 for row in rows)
+    assert all(0 <= float(row["ndcg_at_5"]) <= 1 for row in rows)
@@ -0,0 +1,102 @@
+import json
+
+import numpy
+import pytest
+
+from fallback_rankings import FallbackRankings
+from ingestion import ActivityColumns, PairCounts
+from recommender import Recommender
+
+
+unknown_user_id = 999_999
+
+@pytest.fixture()
+def recommender(recommender):
+    recommender.build_fallback_rankings(recent_window_seconds=30 * 24 * 3600)
+    return recommender
+
+@pytest.fixture()
+def users_filepath(trained_recommender, tmp_path):
+    # Known users alternate between two segments; the unknown user signed up in segment "b".
+    users_filepath = tmp_path / "users.jsonl"
+    with open(users_filepath, "w") as output_file:
+        for position, user_id in enumerate(trained_recommender.entity_indices["unique_users"]):
+            output_file.write(json.dumps({"user_id": user_id, "degree_subject": "ab"[position % 2], "languages": ["en"]}) + "\n")
+        output_file.write(json.dumps({"user_id": unknown_user_id, "degree_subject": "b"}) + "\n")
+        output_file.write(json.dumps({"user_id": unknown_user_id + 1, "degree_subject": "c"}) + "\n")
+    return str(users_filepath)
+
+def get_recommended_job_ids(recommendations: list[dict]) -> list[int]:
+    return [recommendation["job_id"] for recommendation in recommendations]
+
+def rank_job_ids(recommender: Recommender, job_scores: numpy.ndarray, number_of_recommendations: int) -> list[int]:
+    return recommender.matrix_column_job_index.get_entity_ids(numpy.argsort(-job_scores, kind="stable")[:number_of_recommendations]).tolist()
+
+
+# Test the global ranking orders jobs by their summed implicit scores:
+def test_global_popularity_ranking(recommender) -> None:
+    del recommender.activity_columns
+    recommender.build_fallback_rankings()
+    job_scores = numpy.asarray(recommender.matrix_csr.sum(axis=0)).ravel()
+    assert recommender.get_recommendation_tiers([unknown_user_id]) == ["global_popularity"]
+    response = recommender.get_job_recommendations_for_single_user(unknown_user_id, 5)
+    assert get_recommended_job_ids(response) == rank_job_ids(recommender, job_scores, 5)
+
+# Test the recent ranking only counts events inside the window ending at the latest event:
+def test_recent_popularity_ranking(recommender) -> None:
+    activity_columns = recommender.activity_columns
+    is_recent = activity_columns.timestamps >= activity_columns.timestamps.max() - 30 * 24 * 3600
+    recent_pair_counts = PairCounts.from_activity_columns(ActivityColumns(
+        activity_columns.user_ids[is_recent], activity_columns.job_ids[is_recent],
+        activity_columns.type_codes[is_recent], activity_columns.timestamps[is_recent]
+        ))
+    implicit_scores = Recommender.calculate_implicit_scores(recent_pair_counts.impressions, recent_pair_counts.redirects)
+    job_matrix_column_idx = recommender.matrix_column_job_index.get_positions(recent_pair_counts.job_ids.astype(numpy.int64))
+    job_scores = numpy.bincount(job_matrix_column_idx, weights=implicit_scores, minlength=recommender.matrix_csr.shape[1])
+    number_of_recent_jobs = int((job_scores > 0).sum())
+    assert 0 < number_of_recent_jobs
+    assert recommender.get_recommendation_tiers([unknown_user_id]) == ["recent_popularity"]
+    response = recommender.get_job_recommendations_for_single_user(unknown_user_id, 100)
+    assert get_recommended_job_ids(response) == rank_job_ids(recommender, job_scores, number_of_recent_jobs)
+
+# Test users with a segment get their segment's ranking, and segments without activity fall through:
+def test_segment_ranking(recommender, users_filepath) -> None:
+    recommender.build_fallback_rankings(users_filepath, "degree_subject")
+    segment_rows = numpy.arange(1, recommender.matrix_csr.shape[0], 2)
+    job_scores = numpy.asarray(recommender.matrix_csr[segment_rows].sum(axis=0)).ravel()
+    tiers = recommender.get_recommendation_tiers([unknown_user_id, unknown_user_id + 1, recommender.entity_indices["unique_users"][0]])
+    assert tiers == ["segment", "recent_popularity", "personalized"]
+    response = recommender.get_job_recommendations_for_single_user(unknown_user_id, 5)
+    assert get_recommended_job_ids(response) == rank_job_ids(recommender, job_scores, 5)
+    assert recommender.fallback_parameters["segment_values"] == ["a", "b", "c"]
+    # Ids outside int64 cannot have a segment and get the default tier.
+    assert recommender.get_recommendation_tiers([2**70]) == ["recent_popularity"]
+    assert recommender.get_job_recommendations_for_bulk_users([2**70], 5) == {2**70: recommender.get_job_recommendations_for_single_user(2**70, 5)}
+    assert len(recommender.get_job_recommendations_for_single_user(2**70, 5)) == 5
+
+# Test the bulk path serves unknown users instead of dropping them, in request order:
+def test_bulk_serves_unknown_users(recommender) -> None:
+    known_user_id = recommender.entity_indices["unique_users"][0]
+    response = recommender.get_job_recommendations_for_bulk_users([unknown_user_id, known_user_id], 5)
+    assert list(response) == [known_user_id, unknown_user_id]
+    assert response[unknown_user_id] == recommender.get_job_recommendations_for_single_user(unknown_user_id, 5)
+    assert response[known_user_id] == recommender.get_job_recommendations_for_single_user(known_user_id, 5)
+
+# Test closed jobs are skipped and unknown jobs get popular jobs as neighbours:
+def test_fallback_skips_closed_jobs_and_serves_unknown_jobs(recommender) -> None:
+    top_job_ids = get_recommended_job_ids(recommender.get_job_recommendations_for_single_user(unknown_user_id, 3))
+    recommender.set_job_availability(top_job_ids[:1], False)
+    job_ids = get_recommended_job_ids(recommender.get_job_recommendations_for_single_user(unknown_user_id, 3))
+    assert job_ids[:2] == top_job_ids[1:] and top_job_ids[0] not in job_ids
+    assert recommender.get_similar_jobs_tier(unknown_user_id) == "recent_popularity"
+    assert get_recommended_job_ids(recommender.find_similar_jobs(unknown_user_id, 3)) == job_ids
+
+# Test the rankings are saved with the model and serve the same responses after loading:
+def test_fallback_rankings_are_saved(recommender, users_filepath, tmp_path) -> None:
+    recommender.build_fallback_rankings(users_filepath, "degree_subject")
+    recommender.save_model(str(tmp_path))
+    loaded_recommender = Recommender.load_model(str(tmp_path))
+    user_ids = [unknown_user_id, unknown_user_id + 1]
+    assert loaded_recommender.get_recommendation_tiers(user_ids) == recommender.get_recommendation_tiers(user_ids)
+    assert loaded_recommender.get_job_recommendations_for_bulk_users(user_ids) == recommender.get_job_recommendations_for_bulk_users(user_ids)
+    assert set(FallbackRankings.array_names) == set(loaded_recommender.fallback_rankings.arrays)
@@ -0,0 +1,68 @@
+import json
+
+import numpy
+import pandas
+import pytest
+
+from funnel_statistics import calculate_funnel_statistics, calculate_funnel_statistics_from_file
+from train import train_and_save_model
+
+
+@pytest.fixture()
+def activities_df(random_activities_filepath):
+    return pandas.read_json(random_activities_filepath, lines=True)
+
+
+# Test the per-job max interactions match the dense crosstabs of the EDA:
+def test_per_job_max_matches_crosstabs(random_activities_filepath, activities_df) -> None:
+    funnel_statistics = calculate_funnel_statistics_from_file(random_activities_filepath)
+    for counter_name, type_df in (
+            ("total", activities_df),
+            ("impressions", activities_df[activities_df["type"] == "impression"]),
+            ("redirects", activities_df[activities_df["type"] == "redirect"])
+            ):
+        max_interactions = pandas.crosstab(type_df.user_id, type_df.job_id).max()
+        summary = funnel_statistics["per_job_max_pair_interactions"][counter_name]
+        assert summary["count"] == len(max_interactions)
+        assert summary["mean"] == pytest.approx(max_interactions.mean())
+        assert summary["p50"] == pytest.approx(max_interactions.quantile(q=0.5))
+        assert summary["p95"] == pytest.approx(max_interactions.quantile(q=0.95))
+        assert summary["p99"] == pytest.approx(max_interactions.quantile(q=0.99))
+        assert summary["max"] == max_interactions.max()
+
+# Test the funnel counts of users, jobs and pairs match set arithmetic over the raw events:
+def test_funnel_counts(random_activities_filepath, activities_df) -> None:
+    funnel_statistics = calculate_funnel_statistics_from_file(random_activities_filepath, number_of_workers=2)
+    assert funnel_statistics["events"]["total"] == len(activities_df)
+    assert funnel_statistics["events"]["redirects"] == (activities_df["type"] == "redirect").sum()
+    for entity_name, id_column in (("users", "user_id"), ("jobs", "job_id")):
+        impressed = set(activities_df.loc[activities_df["type"] == "impression", id_column])
+        redirected = set(activities_df.loc[activities_df["type"] == "redirect", id_column])
+        entity_funnel = funnel_statistics[entity_name]
+        assert entity_funnel["engaged"] == len(impressed | redirected)
+        assert entity_funnel["impressed_never_redirected"] == len(impressed - redirected)
+        assert entity_funnel["redirected_without_impression"] == len(redirected - impressed)
+    pair_type_counts = pandas.crosstab([activities_df.user_id, activities_df.job_id], activities_df.type)
+    assert funnel_statistics["pairs"]["count"] == len(pair_type_counts)
+    assert funnel_statistics["pairs"]["redirected_without_impression"] == ((pair_type_counts["redirect"] > 0) & (pair_type_counts["impression"] == 0)).sum()
+
+# Test hand-counted pairs, including a redirect without any impression:
+def test_hand_counted_pairs() -> None:
+    funnel_statistics = calculate_funnel_statistics(
+        user_ids=numpy.array([1, 1, 2, 3]),
+        job_ids=numpy.array([10, 11, 10, 12]),
+        impressions=numpy.array([3, 1, 5, 0]),
+        redirects=numpy.array([1, 0, 0, 2])
+        )
+    assert funnel_statistics["users"]["impressed_never_redirected"] == 1
+    assert funnel_statistics["users"]["redirected_without_impression"] == 1
+    assert funnel_statistics["jobs"]["redirected_without_impression"] == 1
+    assert funnel_statistics["per_job_max_pair_interactions"]["total"]["max"] == 5
+    assert funnel_statistics["per_job_max_pair_interactions"]["redirects"]["count"] == 2
+    assert funnel_statistics["events"]["redirect_share"] == pytest.approx(3 / 12)
+
+# Test every training run writes the statistics next to the model artifacts:
+def test_training_writes_funnel_statistics(random_activities_filepath, tmp_path) -> None:
+    artifact_directory = train_and_save_model(random_activities_filepath, str(tmp_path))
+    with open(f"{artifact_directory}/funnel_statistics.json") as statistics_file:
+        assert json.load(statistics_file) == json.loads(json.dumps(calculate_funnel_statistics_from_file(random_activities_filepath)))
@@ -0,0 +1,207 @@
+import json
+
+import numpy
+import pytest
+
+from pending_pairs import PendingPairs
+from pending_user_factors import PendingUserFactors
+from recommender import Recommender
+
+
+def read_activity_records(activities_filepath) -> list[dict]:
+    with open(activities_filepath) as input_file:
+        return [json.loads(line) for line in input_file]
+
+def write_activity_records(activities_filepath, activities: list[dict]) -> None:
+    with open(activities_filepath, "w") as output_file:
+        for activity in activities:
+            output_file.write(json.dumps(activity) + "\n")
+
+def train_recommender(activities_filepath, ingestion_mode="columnar") -> Recommender:
+    recommender = Recommender(str(activities_filepath), ingestion_mode=ingestion_mode)
+    recommender.build_sparse_matrix()
+    recommender.train_als_model()
+    return recommender
+
+def get_matrix_cells(recommender: Recommender) -> dict:
+    # Pairs touched by updates wait next to the matrix until merged.
+    recommender.merge_pending_updates()
+    matrix_coo = recommender.matrix_csr.tocoo()
+    user_ids = recommender.matrix_row_user_index.get_entity_ids(matrix_coo.row).tolist()
+    job_ids = recommender.matrix_column_job_index.get_entity_ids(matrix_coo.col).tolist()
+    return dict(zip(zip(user_ids, job_ids), matrix_coo.data.tolist()))
+
+@pytest.fixture()
+def split_activities(random_activities_filepath, tmp_path):
+    activities = read_activity_records(random_activities_filepath)
+    new_activities = [
+        {"timestamp": 1.7e9, "job_id": 500, "user_id": 1001, "type": "redirect"},
+        {"timestamp": 1.7e9, "job_id": 500, "user_id": 1002, "type": "impression"},
+        {"timestamp": 1.7e9, "job_id": 101, "user_id": 5000, "type": "impression"},
+        {"timestamp": 1.7e9, "job_id": 102, "user_id": 5000, "type": "redirect"}
+        ]
+    initial_activities_filepath = tmp_path / "initial_activities.jsonl"
+    write_activity_records(initial_activities_filepath, activities[:2500])
+    full_activities_filepath = tmp_path / "full_activities.jsonl"
+    write_activity_records(full_activities_filepath, activities + new_activities)
+    return initial_activities_filepath, full_activities_filepath, activities[2500:] + new_activities
+
+
+# Test an incremental update yields the same matrix and indices as building from the full log:
+@pytest.mark.parametrize("ingestion_mode", ["nested", "columnar"])
+def test_update_matches_matrix_built_from_full_log(split_activities, ingestion_mode) -> None:
+    initial_activities_filepath, full_activities_filepath, batch_activities = split_activities
+    recommender = train_recommender(initial_activities_filepath, ingestion_mode)
+    update_summary = recommender.update_with_activities(batch_activities)
+    expected_recommender = Recommender(str(full_activities_filepath), ingestion_mode=ingestion_mode)
+    expected_recommender.build_sparse_matrix()
+    assert update_summary["new_user_ids"] == [5000]
+    assert update_summary["new_job_ids"] == [500]
+    assert get_matrix_cells(recommender) == get_matrix_cells(expected_recommender)
+    assert sorted(recommender.entity_indices["unique_users"]) == expected_recommender.entity_indices["unique_users"]
+    assert sorted(recommender.entity_indices["unique_jobs"]) == expected_recommender.entity_indices["unique_jobs"]
+    assert recommender.als_model.user_factors.shape[0] == recommender.matrix_csr.shape[0]
+    assert recommender.als_model.item_factors.shape[0] == recommender.matrix_csr.shape[1]
+
+# Test the fold-in solve matches implicit's own least-squares user recalculation:
+def test_fold_in_matches_implicit_recalculate_user(split_activities) -> None:
+    initial_activities_filepath, _, batch_activities = split_activities
+    recommender = train_recommender(initial_activities_filepath)
+    known_job_activities = [activity for activity in batch_activities if activity["job_id"] < 500 and activity["user_id"] < 5000]
+    update_summary = recommender.update_with_activities(known_job_activities)
+    recommender.merge_pending_updates()
+    user_matrix_row_idx = recommender.matrix_row_user_index.get_positions(numpy.array(update_summary["updated_user_ids"]))
+    for user_matrix_row in user_matrix_row_idx[:10]:
+        expected_user_factor = recommender.als_model.recalculate_user(
+            user_matrix_row, 
+            recommender.confidence_scale * recommender.matrix_csr[user_matrix_row]
+            )
+        numpy.testing.assert_allclose(recommender.als_model.user_factors[user_matrix_row], expected_user_factor, rtol=1e-3, atol=1e-4)
+
+# Test new users and jobs are served right after an update:
+def test_update_serves_new_users_and_jobs(split_activities) -> None:
+    initial_activities_filepath, _, batch_activities = split_activities
+    recommender = train_recommender(initial_activities_filepath)
+    recommender.build_similar_jobs_table()
+    recommender.enable_ann_index(number_of_clusters=4, number_of_probes=4)
+    recommender.update_with_activities(batch_activities)
+    assert len(recommender.get_job_recommendations_for_single_user(5000)) == 10
+    assert len(recommender.find_similar_jobs(500)) == 10
+    assert 500 in recommender.matrix_column_job_index
+
+# Test a model loaded from memory-mapped artifacts can be updated and saved again:
+def test_update_loaded_model(split_activities, tmp_path) -> None:
+    initial_activities_filepath, full_activities_filepath, batch_activities = split_activities
+    recommender = train_recommender(initial_activities_filepath)
+    recommender.build_matrix_pair_counts()
+    recommender.save_model(str(tmp_path / "artifacts"))
+    loaded_recommender = Recommender.load_model(str(tmp_path / "artifacts"))
+    loaded_recommender.update_with_activities(batch_activities)
+    expected_recommender = Recommender(str(full_activities_filepath), ingestion_mode="columnar")
+    expected_recommender.build_sparse_matrix()
+    assert get_matrix_cells(loaded_recommender) == get_matrix_cells(expected_recommender)
+    assert len(loaded_recommender.get_job_recommendations_for_single_user(5000)) == 10
+
+# Test a full retrain after an update covers the grown matrix:
+def test_update_with_full_retrain(split_activities) -> None:
+    initial_activities_filepath, _, batch_activities = split_activities
+    recommender = train_recommender(initial_activities_filepath)
+    initial_model_version = recommender.model_version
+    recommender.update_with_activities(batch_activities, full_retrain=True)
+    assert recommender.model_version != initial_model_version
+    assert recommender.als_model.user_factors.shape[0] == recommender.matrix_csr.shape[0]
+    assert len(recommender.get_job_recommendations_for_single_user(5000)) == 10
+
+# Test a loaded model saved without pair counters rejects updates with a clear error:
+def test_update_loaded_model_without_pair_counters(split_activities, tmp_path) -> None:
+    initial_activities_filepath, _, batch_activities = split_activities
+    recommender = train_recommender(initial_activities_filepath)
+    recommender.save_model(str(tmp_path / "artifacts"))
+    loaded_recommender = Recommender.load_model(str(tmp_path / "artifacts"))
+    with pytest.raises(ValueError, match="no pair counters"):
+        loaded_recommender.update_with_activities(batch_activities)
+
+# Test pending pairs are masked and folded in before they are merged, and merged once due:
+def test_pending_pairs_are_served_before_merge(split_activities, monkeypatch) -> None:
+    initial_activities_filepath, full_activities_filepath, batch_activities = split_activities
+    recommender = train_recommender(initial_activities_filepath)
+    recommender.update_with_activities(batch_activities)
+    assert len(recommender.pending_pairs) > 0
+    assert recommender.matrix_csr.shape[0] < len(recommender.matrix_row_user_index)
+    user_matrix_row = recommender.matrix_row_user_index.get_loc(5000)
+    _, seen_job_matrix_column_idx = recommender.get_seen_job_positions(numpy.array([user_matrix_row]))
+    assert sorted(recommender.matrix_column_job_index.get_entity_ids(seen_job_matrix_column_idx).tolist()) == [101, 102]
+    recommended_job_ids = [recommendation["job_id"] for recommendation in recommender.get_job_recommendations_for_single_user(5000, 50)]
+    assert 101 not in recommended_job_ids and 102 not in recommended_job_ids
+    monkeypatch.setattr(PendingPairs, "merge_minimum", 0)
+    recommender.update_with_activities([{"user_id": 5000, "job_id": 103, "type": "impression"}])
+    assert len(recommender.pending_pairs) == 0
+    expected_recommender = Recommender(str(full_activities_filepath), ingestion_mode="columnar")
+    expected_recommender.build_sparse_matrix()
+    expected_cells = get_matrix_cells(expected_recommender)
+    expected_cells[(5000, 103)] = 1
+    assert get_matrix_cells(recommender) == expected_cells
+
+# Test re-solved user factors are served from the side table before merge, and merged once due:
+def test_pending_user_factors_are_served_before_merge(split_activities, monkeypatch) -> None:
+    initial_activities_filepath, _, batch_activities = split_activities
+    recommender = train_recommender(initial_activities_filepath)
+    trained_user_factors = recommender.als_model.user_factors.copy()
+    update_summary = recommender.update_with_activities(batch_activities)
+    user_matrix_row_idx = recommender.matrix_row_user_index.get_positions(numpy.array(update_summary["updated_user_ids"]))
+    user_matrix_row_idx = user_matrix_row_idx[user_matrix_row_idx < len(trained_user_factors)]
+    assert len(recommender.pending_user_factors) > 0
+    numpy.testing.assert_array_equal(recommender.als_model.user_factors[user_matrix_row_idx], trained_user_factors[user_matrix_row_idx])
+    pending_user_factors = recommender.get_user_factors(user_matrix_row_idx)
+    assert not numpy.allclose(pending_user_factors, trained_user_factors[user_matrix_row_idx])
+    monkeypatch.setattr(PendingUserFactors, "merge_minimum", 0)
+    recommender.update_with_activities([{"user_id": 5000, "job_id": 103, "type": "impression"}])
+    assert len(recommender.pending_user_factors) == 0
+    numpy.testing.assert_array_equal(recommender.als_model.user_factors[user_matrix_row_idx], pending_user_factors)
+
+# Test an update never writes into the arrays of the model it was copied from:
+def test_update_leaves_copied_model_unchanged(split_activities) -> None:
+    initial_activities_filepath, _, batch_activities = split_activities
+    recommender = train_recommender(initial_activities_filepath)
+    recommender.update_with_activities(batch_activities[:100])
+    served_arrays = {
+        "user_factors": recommender.als_model.user_factors,
+        "item_factors": recommender.als_model.item_factors,
+        "matrix_data": recommender.matrix_csr.data,
+        "matrix_impressions": recommender.matrix_impressions,
+        "matrix_redirects": recommender.matrix_redirects,
+        "pending_data": recommender.pending_pairs.data,
+        "pending_user_factors": recommender.pending_user_factors.factors,
+        "user_factors_gram": recommender.user_factors_gram,
+        "item_factors_gram": recommender.item_factors_gram
+    }
+    served_values = {array_name: array.copy() for array_name, array in served_arrays.items()}
+    served_recommendations = recommender.get_job_recommendations_for_single_user(1001)
+    updated_recommender = recommender.copy_for_update()
+    updated_recommender.update_with_activities(batch_activities[100:])
+    for array_name, array in served_arrays.items():
+        numpy.testing.assert_array_equal(array, served_values[array_name], err_msg=array_name)
+    assert recommender.get_job_recommendations_for_single_user(1001) == served_recommendations
+    assert updated_recommender.get_job_recommendations_for_single_user(1001) != served_recommendations
+
+# Test an update that fails partway leaves the model as it was, so retrying it counts the batch once:
+def test_failed_update_can_be_retried(split_activities, monkeypatch) -> None:
+    initial_activities_filepath, _, batch_activities = split_activities
+    recommender = train_recommender(initial_activities_filepath)
+    expected_recommender = recommender.copy_for_update()
+    expected_recommender.update_with_activities(batch_activities)
+
+    def fail_fold_in(*args) -> None:
+        raise RuntimeError("fold-in failed")
+
+    failing_recommender = recommender.copy_for_update()
+    with monkeypatch.context() as patch:
+        patch.setattr(Recommender, "fold_in_new_job_factors", fail_fold_in)
+        with pytest.raises(RuntimeError):
+            failing_recommender.update_with_activities(batch_activities)
+    retried_recommender = recommender.copy_for_update()
+    retried_recommender.update_with_activities(batch_activities)
+    assert get_matrix_cells(retried_recommender) == get_matrix_cells(expected_recommender)
+    numpy.testing.assert_allclose(retried_recommender.als_model.user_factors, expected_recommender.als_model.user_factors)
+    assert recommender.pending_pairs is None
+    assert recommender.update_generation == 0
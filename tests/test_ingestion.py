@@ -0,0 +1,110 @@
+import numpy
+import pytest
+
+from ingestion import PairCounts, read_activity_columns, read_pair_counts_sharded, split_into_byte_range_shards
+from recommender import Recommender
+
+
+@pytest.fixture(scope='module')
+def activity_columns():
+    return read_activity_columns("tests/test_data/test_activities.jsonl")
+
+
+# Test activity lines are parsed into typed columns:
+def test_activity_columns_are_typed(activity_columns) -> None:
+    assert len(activity_columns) == 5
+    assert activity_columns.user_ids.dtype == numpy.int32
+    assert activity_columns.job_ids.dtype == numpy.int32
+    assert activity_columns.type_codes.dtype == numpy.uint8
+    assert activity_columns.timestamps.dtype == numpy.float64
+    assert activity_columns.type_codes.tolist() == [1, 1, 1, 2, 1]
+
+# Test activities are counted per user-job pair:
+def test_pair_counts_group_activities_by_pair(activity_columns) -> None:
+    pair_counts = PairCounts.from_activity_columns(activity_columns)
+    assert pair_counts.user_ids.tolist() == [31004, 65794]
+    assert pair_counts.job_ids.tolist() == [20515, 16588]
+    assert pair_counts.impressions.tolist() == [1, 3]
+    assert pair_counts.redirects.tolist() == [0, 1]
+
+# Test merging partial pair counts sums shared pairs:
+def test_merged_pair_counts_sum_shared_pairs(activity_columns) -> None:
+    pair_counts = PairCounts.from_activity_columns(activity_columns)
+    merged_pair_counts = PairCounts.merge([pair_counts, pair_counts])
+    assert merged_pair_counts.user_ids.tolist() == pair_counts.user_ids.tolist()
+    assert merged_pair_counts.impressions.tolist() == [2, 6]
+    assert merged_pair_counts.redirects.tolist() == [0, 2]
+
+# Test vectorized implicit scores match the scalar rules:
+def test_vectorized_implicit_scores_match_scalar_implicit_score() -> None:
+    impressions, redirects = numpy.meshgrid(numpy.arange(25), numpy.arange(25))
+    impressions = impressions.ravel()
+    redirects = redirects.ravel()
+    implicit_scores = Recommender.calculate_implicit_scores(impressions, redirects)
+    expected_implicit_scores = [
+        Recommender.calculate_implicit_score(impression, redirect) 
+        for impression, redirect in zip(impressions.tolist(), redirects.tolist())
+        ]
+    assert implicit_scores.tolist() == expected_implicit_scores
+
+# Test columnar ingestion produces the same pair scores as nested ingestion:
+def test_columnar_ingestion_matches_nested_ingestion(random_activities_filepath) -> None:
+    nested_recommender = Recommender(random_activities_filepath)
+    columnar_recommender = Recommender(random_activities_filepath, ingestion_mode="columnar")
+    nested_recommender.build_sparse_matrix()
+    columnar_recommender.build_sparse_matrix()
+    assert columnar_recommender.entity_indices == nested_recommender.entity_indices
+    assert (columnar_recommender.matrix_csr != nested_recommender.matrix_csr).nnz == 0
+    for user_id, job_id, implicit_score in zip(*columnar_recommender.get_user_job_score_arrays()):
+        assert nested_recommender.activities[user_id][job_id][Recommender.implicit_score_key] == implicit_score
+
+# Test columnar ingestion through the binary cache produces the same matrix as nested ingestion:
+def test_cached_columnar_ingestion_matches_nested_ingestion(random_activities_filepath, tmp_path) -> None:
+    nested_recommender = Recommender(random_activities_filepath)
+    nested_recommender.build_sparse_matrix()
+    for _ in range(2):
+        cached_recommender = Recommender(random_activities_filepath, ingestion_mode="columnar", cache_directory=str(tmp_path / "cache"))
+        cached_recommender.build_sparse_matrix()
+        assert cached_recommender.entity_indices == nested_recommender.entity_indices
+        assert (cached_recommender.matrix_csr != nested_recommender.matrix_csr).nnz == 0
+
+# Test byte-range shards cover the file and start on line boundaries:
+def test_byte_range_shards_start_on_line_boundaries(random_activities_filepath) -> None:
+    byte_ranges = split_into_byte_range_shards(random_activities_filepath, 7)
+    with open(random_activities_filepath, "rb") as input_file:
+        file_bytes = input_file.read()
+    assert byte_ranges[0][0] == 0
+    assert byte_ranges[-1][1] == len(file_bytes)
+    for (_, previous_shard_end), (shard_start, _) in zip(byte_ranges[:-1], byte_ranges[1:]):
+        assert previous_shard_end == shard_start
+        assert file_bytes[shard_start - 1:shard_start] == b"\n"
+
+# Test sharded pair counts match single-pass pair counts for any worker count and chunk size:
+sharded_ingestion_settings = [
+    (1, 16 * 2**20),
+    (2, 4096),
+    (4, 333),
+    (3, 50)
+]
+@pytest.mark.parametrize("number_of_workers, chunk_size_bytes", sharded_ingestion_settings)
+def test_sharded_pair_counts_match_columnar_pair_counts(random_activities_filepath, number_of_workers, chunk_size_bytes) -> None:
+    expected_pair_counts = PairCounts.from_activity_columns(read_activity_columns(random_activities_filepath))
+    pair_counts = read_pair_counts_sharded(random_activities_filepath, number_of_workers, chunk_size_bytes)
+    assert pair_counts.user_ids.tolist() == expected_pair_counts.user_ids.tolist()
+    assert pair_counts.job_ids.tolist() == expected_pair_counts.job_ids.tolist()
+    assert pair_counts.impressions.tolist() == expected_pair_counts.impressions.tolist()
+    assert pair_counts.redirects.tolist() == expected_pair_counts.redirects.tolist()
+
+# Test sharded ingestion produces the same matrix as nested ingestion:
+def test_sharded_ingestion_matches_nested_ingestion(random_activities_filepath) -> None:
+    nested_recommender = Recommender(random_activities_filepath)
+    sharded_recommender = Recommender(random_activities_filepath, ingestion_mode="sharded", number_of_workers=2, chunk_size_bytes=1024)
+    nested_recommender.build_sparse_matrix()
+    sharded_recommender.build_sparse_matrix()
+    assert sharded_recommender.entity_indices == nested_recommender.entity_indices
+    assert (sharded_recommender.matrix_csr != nested_recommender.matrix_csr).nnz == 0
+
+# Test unknown ingestion modes are rejected:
+def test_unknown_ingestion_mode_raises_value_error() -> None:
+    with pytest.raises(ValueError):
+        Recommender("tests/test_data/test_activities.jsonl", ingestion_mode="dense")
@@ -0,0 +1,71 @@
+import json
+
+import numpy
+
+from recommender import Recommender
+
+
+def get_recommended_job_ids(recommendations: list[dict]) -> list[int]:
+    return [recommendation["job_id"] for recommendation in recommendations]
+
+def get_seen_job_ids(recommender: Recommender, user_id: int) -> set[int]:
+    user_matrix_row_idx = recommender.matrix_row_user_index.get_loc(user_id)
+    return set(recommender.matrix_column_job_index.get_entity_ids(recommender.matrix_csr[user_matrix_row_idx].indices).tolist())
+
+
+# Test seen jobs are excluded and the remaining top N match a brute-force ranking of the unseen jobs:
+def test_seen_jobs_are_excluded(recommender) -> None:
+    user_ids = recommender.entity_indices["unique_users"][:10]
+    bulk_response = recommender.get_job_recommendations_for_bulk_users(user_ids, 5)
+    for user_id in user_ids:
+        user_matrix_row_idx = recommender.matrix_row_user_index.get_loc(user_id)
+        scores = recommender.als_model.item_factors @ recommender.als_model.user_factors[user_matrix_row_idx]
+        scores[recommender.matrix_csr[user_matrix_row_idx].indices] = -numpy.inf
+        expected_job_ids = recommender.matrix_column_job_index.get_entity_ids(numpy.argsort(-scores, kind="stable")[:5]).tolist()
+        single_user_job_ids = get_recommended_job_ids(recommender.get_job_recommendations_for_single_user(user_id, 5))
+        assert single_user_job_ids == get_recommended_job_ids(bulk_response[user_id]) == expected_job_ids
+        assert not set(single_user_job_ids) & get_seen_job_ids(recommender, user_id)
+
+# Test users get fewer results only when fewer eligible jobs exist, and seen jobs come back when filtering is off:
+def test_results_are_capped_by_eligible_jobs(recommender) -> None:
+    user_id = recommender.entity_indices["unique_users"][0]
+    number_of_unseen_jobs = len(recommender.matrix_column_job_index) - len(get_seen_job_ids(recommender, user_id))
+    assert len(recommender.get_job_recommendations_for_single_user(user_id, 100)) == number_of_unseen_jobs
+    recommender.filter_seen_jobs = False
+    assert len(recommender.get_job_recommendations_for_single_user(user_id, 100)) == len(recommender.matrix_column_job_index)
+
+# Test closing and reopening jobs takes effect without retraining:
+def test_job_availability_updates(recommender) -> None:
+    user_id = recommender.entity_indices["unique_users"][0]
+    top_job_ids = get_recommended_job_ids(recommender.get_job_recommendations_for_single_user(user_id, 3))
+    assert recommender.set_job_availability(top_job_ids[:2] + [999_999], False) == 2
+    job_ids = get_recommended_job_ids(recommender.get_job_recommendations_for_single_user(user_id, 3))
+    assert len(job_ids) == 3 and not set(job_ids) & set(top_job_ids[:2])
+    assert job_ids[0] == top_job_ids[2]
+    recommender.set_job_availability(top_job_ids[:2], True)
+    assert get_recommended_job_ids(recommender.get_job_recommendations_for_single_user(user_id, 3)) == top_job_ids
+
+# Test the catalog closes jobs that are missing or expired:
+def test_load_job_catalog(recommender, tmp_path) -> None:
+    job_ids = recommender.entity_indices["unique_jobs"]
+    jobs_filepath = tmp_path / "jobs.jsonl"
+    with open(jobs_filepath, "w") as output_file:
+        for job_id in job_ids[:20]:
+            output_file.write(json.dumps({"job_id": job_id, "description": "", "expires_at": 2e9}) + "\n")
+        output_file.write(json.dumps({"job_id": job_ids[20], "description": "", "expires_at": 1e9}) + "\n")
+        output_file.write(json.dumps({"job_id": job_ids[21], "description": ""}) + "\n")
+    recommender.load_job_catalog(str(jobs_filepath), now=1.5e9)
+    open_job_ids = set(job_ids[:20]) | {job_ids[21]}
+    assert recommender.job_availability.sum() == len(open_job_ids)
+    bulk_response = recommender.get_job_recommendations_for_bulk_users(recommender.entity_indices["unique_users"], 3)
+    assert all(set(get_recommended_job_ids(recommendations)) <= open_job_ids for recommendations in bulk_response.values())
+
+# Test the ANN path applies the same masks and still returns N results:
+def test_ann_index_filters_jobs(recommender) -> None:
+    recommender.enable_ann_index(number_of_clusters=6, number_of_probes=1)
+    user_id = recommender.entity_indices["unique_users"][0]
+    closed_job_ids = recommender.entity_indices["unique_jobs"][:10]
+    recommender.set_job_availability(closed_job_ids, False)
+    job_ids = get_recommended_job_ids(recommender.get_job_recommendations_for_single_user(user_id, 5))
+    assert len(job_ids) == 5
+    assert not set(job_ids) & (get_seen_job_ids(recommender, user_id) | set(closed_job_ids))
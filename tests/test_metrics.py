@@ -0,0 +1,94 @@
+import time
+
+import numpy
+import pytest
+
+from metrics import Histogram, MetricsRegistry, metrics
+from recommender import Recommender
+
+
+@pytest.fixture()
+def enabled_global_metrics():
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+
+
+# Test histograms render cumulative Prometheus buckets per label set:
+def test_histogram_renders_cumulative_buckets() -> None:
+    histogram = Histogram("request_latency_seconds", "Request latency.", (0.1, 1.0), ("path",))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, ("/a",))
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP request_latency_seconds Request latency.", "# TYPE request_latency_seconds histogram"]
+    assert 'request_latency_seconds_bucket{path="/a",le="0.1"} 1' in lines
+    assert 'request_latency_seconds_bucket{path="/a",le="1.0"} 3' in lines
+    assert 'request_latency_seconds_bucket{path="/a",le="+Inf"} 4' in lines
+    assert 'request_latency_seconds_sum{path="/a"} 4.05' in lines
+    assert 'request_latency_seconds_count{path="/a"} 4' in lines
+
+# Test stages record duration, RSS and traced peak memory when enabled:
+def test_time_stage_records_duration_and_peak_memory() -> None:
+    registry = MetricsRegistry()
+    registry.enable(trace_memory=True)
+    try:
+        with registry.time_stage("matrix_build"):
+            numpy.ones(2**20)
+    finally:
+        registry.disable()
+    assert registry.stage_durations.get_count(("matrix_build",)) == 1
+    assert registry.stage_peak_traced_memory["matrix_build"] >= 8 * 2**20
+    assert registry.stage_max_rss["matrix_build"] > 0
+    rendered_metrics = registry.render()
+    assert 'recommender_stage_last_duration_seconds{stage="matrix_build"}' in rendered_metrics
+    assert "recommender_process_max_rss_bytes" in rendered_metrics
+
+# Test the recommender reports its pipeline stages to the shared registry, leaving query latency to the request histogram:
+def test_recommender_stages_are_recorded(enabled_global_metrics, recommender) -> None:
+    recommender.get_job_recommendations_for_single_user(recommender.entity_indices["unique_users"][0])
+    recommender.build_sparse_matrix()
+    assert enabled_global_metrics.stage_durations.get_count(("scoring",)) == 0
+    assert enabled_global_metrics.stage_durations.get_count(("matrix_build",)) >= 1
+    Recommender.from_activity_columns(recommender.activity_columns)
+    assert enabled_global_metrics.stage_durations.get_count(("ingestion",)) >= 1
+    assert enabled_global_metrics.stage_durations.get_count(("scoring",)) == 1
+
+# Test nothing is recorded while disabled:
+def test_disabled_registry_records_nothing() -> None:
+    registry = MetricsRegistry()
+    with registry.time_stage("scoring"):
+        pass
+    registry.observe_request("/recommend/jobs_single_user/", 0.01)
+    registry.observe_batch_size("bulk_endpoint", 10)
+    assert registry.stage_durations.series == {}
+    assert registry.request_latencies.series == {}
+    assert registry.batch_sizes.series == {}
+
+# Test disabled instrumentation costs well under a microsecond-scale budget per call:
+def test_disabled_overhead_is_negligible() -> None:
+    registry = MetricsRegistry()
+    number_of_calls = 100_000
+    t0 = time.perf_counter()
+    for _ in range(number_of_calls):
+        with registry.time_stage("scoring"):
+            pass
+        registry.observe_request("/recommend/jobs_single_user/", 0.0)
+    seconds_per_call = (time.perf_counter() - t0) / number_of_calls
+    # A single-user query takes hundreds of microseconds; disabled instrumentation must stay a tiny fraction of it.
+    assert seconds_per_call < 5e-6
+
+# Test the sampling profiler captures the stacks running while it is enabled:
+def test_profile_collects_collapsed_stacks() -> None:
+    registry = MetricsRegistry()
+
+    def busy_wait(duration_seconds: float) -> None:
+        deadline = time.perf_counter() + duration_seconds
+        while time.perf_counter() < deadline:
+            pass
+
+    with registry.profile("/recommend/jobs_single_user/", interval_seconds=0.001):
+        busy_wait(0.05)
+    profile = registry.profiles[0]
+    assert profile["label"] == "/recommend/jobs_single_user/"
+    assert profile["number_of_samples"] > 0
+    assert any("busy_wait" in stack for stack in profile["collapsed_stacks"])
@@ -0,0 +1,42 @@
+import numpy
+import pytest
+
+from recommender import Recommender
+
+
+@pytest.fixture(scope="module")
+def artifacts_root(trained_recommender, tmp_path_factory):
+    artifacts_root = tmp_path_factory.mktemp("artifacts")
+    trained_recommender.save_model(str(artifacts_root))
+    return str(artifacts_root)
+
+@pytest.fixture(scope="module")
+def loaded_recommender(artifacts_root):
+    return Recommender.load_model(artifacts_root)
+
+
+# Test artifacts are written into a versioned directory and marked as latest:
+def test_saved_artifacts_are_versioned(trained_recommender, artifacts_root) -> None:
+    with open(f"{artifacts_root}/{Recommender.latest_artifact_pointer_filename}") as pointer_file:
+        assert pointer_file.read() == trained_recommender.model_version
+
+# Test loaded factors are read-only memory maps:
+def test_loaded_factors_are_read_only_memory_maps(loaded_recommender) -> None:
+    for factors in (loaded_recommender.als_model.user_factors, loaded_recommender.als_model.item_factors):
+        assert isinstance(factors, numpy.memmap)
+        assert not factors.flags.writeable
+
+# Test a loaded model keeps the trained model's state:
+def test_loaded_model_matches_trained_model(trained_recommender, loaded_recommender) -> None:
+    assert loaded_recommender.model_version == trained_recommender.model_version
+    assert loaded_recommender.entity_indices == trained_recommender.entity_indices
+    assert (loaded_recommender.matrix_csr != trained_recommender.matrix_csr).nnz == 0
+    numpy.testing.assert_array_equal(loaded_recommender.als_model.item_factors, trained_recommender.als_model.item_factors)
+
+# Test a loaded model serves the same recommendations:
+def test_loaded_model_serves_same_recommendations(trained_recommender, loaded_recommender) -> None:
+    user_ids = trained_recommender.entity_indices["unique_users"][:5]
+    job_id = trained_recommender.entity_indices["unique_jobs"][0]
+    assert loaded_recommender.get_job_recommendations_for_single_user(user_ids[0]) == trained_recommender.get_job_recommendations_for_single_user(user_ids[0])
+    assert loaded_recommender.get_job_recommendations_for_bulk_users(user_ids) == trained_recommender.get_job_recommendations_for_bulk_users(user_ids)
+    assert loaded_recommender.find_similar_jobs(job_id) == trained_recommender.find_similar_jobs(job_id)
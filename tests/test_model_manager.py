@@ -0,0 +1,154 @@
+import threading
+
+import pytest
+
+from metrics import metrics
+from model_manager import ModelManager
+from recommender import Recommender
+from train import training_stages
+
+
+@pytest.fixture()
+def model_manager(random_activities_filepath, tmp_path):
+    model_manager = ModelManager(str(tmp_path / "artifacts"), random_activities_filepath)
+    yield model_manager
+    model_manager.stop()
+
+
+# Test the first start trains in a separate process and serves the saved model:
+def test_load_or_train_trains_when_no_artifacts(model_manager) -> None:
+    recommender = model_manager.load_or_train()
+    model_info = model_manager.get_model_info()
+    assert isinstance(recommender, Recommender)
+    assert model_info["model_version"] == recommender.model_version
+    assert model_info["trained_at"] == recommender.trained_at
+    assert model_info["retraining"] is False
+
+# Test stages timed in the spawned training process reach the served model through its training report:
+def test_training_stage_metrics_reach_served_model(random_activities_filepath, tmp_path) -> None:
+    metrics.enable()
+    try:
+        model_manager = ModelManager(str(tmp_path / "artifacts"), random_activities_filepath)
+    finally:
+        metrics.disable()
+    try:
+        model_manager.load_or_train()
+    finally:
+        model_manager.stop()
+    training_report = model_manager.get_model_info()["training_report"]
+    assert set(training_report["stage_durations"]) == set(training_stages)
+    assert set(training_report["stage_max_rss_bytes"]) == set(training_stages)
+    assert all(duration > 0 for duration in training_report["stage_durations"].values())
+
+# Test a retrain swaps the served model while references held by running requests keep their version:
+def test_retrain_swaps_model_atomically(model_manager) -> None:
+    previous_recommender = model_manager.load_or_train()
+    user_id = previous_recommender.entity_indices["unique_users"][0]
+    retrain_future = model_manager.retrain()
+    assert model_manager.retrain() is retrain_future
+    new_model_version = retrain_future.result(timeout=120)
+    assert new_model_version != previous_recommender.model_version
+    assert model_manager.recommender.model_version == new_model_version
+    assert len(previous_recommender.get_job_recommendations_for_single_user(user_id)) == 10
+    assert len(model_manager.recommender.get_job_recommendations_for_single_user(user_id)) == 10
+
+# Test a failed retrain keeps serving the current model:
+def test_failed_retrain_keeps_current_model(model_manager) -> None:
+    recommender = model_manager.load_or_train()
+    model_manager.activities_filepath = "missing_activities.jsonl"
+    with pytest.raises(FileNotFoundError):
+        model_manager.retrain().result(timeout=120)
+    assert model_manager.recommender is recommender
+    assert "FileNotFoundError" in model_manager.get_model_info()["last_retrain_error"]
+
+# Test scheduled retraining swaps in new versions in the background:
+def test_scheduled_retraining(model_manager) -> None:
+    initial_model_version = model_manager.load_or_train().model_version
+    model_manager.retrain_interval_seconds = 0.01
+    model_manager.start()
+    model_manager.stop_event.wait(0.05)
+    model_manager.retrain().result(timeout=120)
+    assert model_manager.recommender.model_version != initial_model_version
+
+# Test swaps and incremental updates notify their listeners:
+def test_swap_and_update_listeners(model_manager) -> None:
+    swapped_model_versions = []
+    update_summaries = []
+    model_manager.swap_listeners.append(lambda recommender: swapped_model_versions.append(recommender.model_version))
+    model_manager.update_listeners.append(update_summaries.append)
+    recommender = model_manager.load_or_train()
+    user_id = recommender.entity_indices["unique_users"][0]
+    job_id = recommender.entity_indices["unique_jobs"][0]
+    model_manager.update_with_activities([{"user_id": user_id, "job_id": job_id, "type": "redirect"}])
+    assert swapped_model_versions == [recommender.model_version]
+    assert update_summaries[0]["updated_user_ids"] == [user_id]
+    assert model_manager.recommender.model_version == recommender.model_version
+    assert (recommender.update_generation, model_manager.recommender.update_generation) == (0, 1)
+
+# Test requests served during incremental updates see each update whole and earlier models stay unchanged:
+def test_updates_are_published_whole(model_manager) -> None:
+    initial_recommender = model_manager.load_or_train()
+    initial_number_of_users = len(initial_recommender.matrix_row_user_index)
+    added_user_ids = []
+    request_errors = []
+    stop_requests = threading.Event()
+
+    def serve_requests() -> None:
+        while not stop_requests.is_set():
+            if added_user_ids:
+                try:
+                    model_manager.recommender.get_job_recommendations_for_single_user(added_user_ids[-1])
+                except Exception as error:
+                    request_errors.append(error)
+
+    request_threads = [threading.Thread(target=serve_requests) for _ in range(4)]
+    for request_thread in request_threads:
+        request_thread.start()
+    try:
+        for offset in range(300):
+            user_id, job_id = 5000 + offset, 5000 + offset
+            model_manager.update_with_activities([{"user_id": user_id, "job_id": job_id, "type": "redirect"}])
+            added_user_ids.append(user_id)
+    finally:
+        stop_requests.set()
+        for request_thread in request_threads:
+            request_thread.join()
+    assert request_errors == []
+    assert len(initial_recommender.matrix_row_user_index) == initial_number_of_users
+    assert 5000 not in initial_recommender.matrix_row_user_index
+    assert 5299 in model_manager.recommender.matrix_row_user_index
+
+# Test background loading reports warming up until the first model is swapped in, keeping earlier availability changes:
+def test_background_loading_readiness(model_manager) -> None:
+    assert model_manager.get_readiness() == {"ready": False, "model_version": None, "loading": False, "loading_error": None}
+    model_manager.load_in_background()
+    assert model_manager.set_job_availability([100], False) == 0
+    model_manager.loading_thread.join(timeout=120)
+    readiness = model_manager.get_readiness()
+    assert readiness["ready"] and not readiness["loading"]
+    assert readiness["model_version"] == model_manager.recommender.model_version
+    recommender = model_manager.recommender
+    assert not recommender.job_availability[recommender.matrix_column_job_index.get_loc(100)]
+
+# Test a failed background load stays not ready and reports the error:
+def test_failed_background_loading(tmp_path) -> None:
+    model_manager = ModelManager(str(tmp_path / "artifacts"), "missing_activities.jsonl")
+    try:
+        model_manager.load_in_background().join(timeout=120)
+        readiness = model_manager.get_readiness()
+        assert not readiness["ready"]
+        assert "FileNotFoundError" in readiness["loading_error"]
+    finally:
+        model_manager.stop()
+
+# Test the ANN switch is persisted with trained artifacts and serves every later load through the index:
+def test_ann_index_is_persisted_with_artifacts(random_activities_filepath, tmp_path) -> None:
+    ann_index_parameters = {"number_of_clusters": 6, "number_of_probes": 6}
+    model_manager = ModelManager(str(tmp_path / "artifacts"), random_activities_filepath, ann_index_parameters=ann_index_parameters)
+    try:
+        recommender = model_manager.load_or_train()
+        assert recommender.ann_index is not None
+        assert recommender.ann_index_parameters["number_of_clusters"] == 6
+        assert Recommender.load_model(str(tmp_path / "artifacts")).ann_index is not None
+    finally:
+        model_manager.stop()
@@ -0,0 +1,129 @@
+import pytest
+
+from recommendation_cache import RecommendationCache
+from recommender import Recommender
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingRecommender:
+
+    def __init__(self, recommender: Recommender, model_version: str = "v1") -> None:
+        self.recommender = recommender
+        self.model_version = model_version
+        self.update_generation = 0
+        self.scored_user_ids = []
+        self.similar_job_ids = []
+
+    def get_job_recommendations_for_single_user(self, user_id, number_of_recommendations=10):
+        self.scored_user_ids.append([user_id])
+        return self.recommender.get_job_recommendations_for_single_user(user_id, number_of_recommendations)
+
+    def get_job_recommendations_for_bulk_users(self, user_ids, number_of_recommendations=10):
+        self.scored_user_ids.append(list(user_ids))
+        return self.recommender.get_job_recommendations_for_bulk_users(user_ids, number_of_recommendations)
+
+    def find_similar_jobs(self, job_id, number_of_recommendations=10):
+        self.similar_job_ids.append(job_id)
+        return self.recommender.find_similar_jobs(job_id, number_of_recommendations)
+
+
+@pytest.fixture()
+def counting_recommender(trained_recommender):
+    return CountingRecommender(trained_recommender)
+
+
+# Test repeated single-user requests are served from the cache:
+def test_single_user_hits_cache(counting_recommender, trained_recommender) -> None:
+    cache = RecommendationCache()
+    user_id = trained_recommender.entity_indices["unique_users"][0]
+    first_response = cache.get_job_recommendations_for_single_user(counting_recommender, user_id)
+    second_response = cache.get_job_recommendations_for_single_user(counting_recommender, user_id)
+    assert first_response == second_response == trained_recommender.get_job_recommendations_for_single_user(user_id)
+    assert counting_recommender.scored_user_ids == [[user_id]]
+    assert cache.get_statistics()["hits"] == 1
+    assert cache.get_statistics()["misses"] == 1
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_id, number_of_recommendations=5)
+    assert counting_recommender.scored_user_ids == [[user_id], [user_id]]
+
+# Test unknown users are not cached:
+def test_unknown_users_are_not_cached(counting_recommender) -> None:
+    cache = RecommendationCache()
+    assert cache.get_job_recommendations_for_single_user(counting_recommender, -5) == []
+    assert len(cache) == 0
+
+# Test the bulk path answers cached users from the cache and scores the misses in one call:
+def test_bulk_scores_only_misses_in_one_batch(counting_recommender, trained_recommender) -> None:
+    cache = RecommendationCache()
+    user_ids = trained_recommender.entity_indices["unique_users"][:4]
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_ids[1])
+    response = cache.get_job_recommendations_for_bulk_users(counting_recommender, user_ids + [-5, user_ids[0]])
+    assert counting_recommender.scored_user_ids == [[user_ids[1]], [user_ids[0], user_ids[2], user_ids[3], -5]]
+    assert list(response.keys()) == user_ids
+    expected_response = trained_recommender.get_job_recommendations_for_bulk_users(user_ids)
+    for user_id in user_ids:
+        assert [recommendation["job_id"] for recommendation in response[user_id]] == [recommendation["job_id"] for recommendation in expected_response[user_id]]
+
+# Test the least recently used entry is evicted once the cache is full:
+def test_lru_eviction(counting_recommender, trained_recommender) -> None:
+    cache = RecommendationCache(max_entries=2)
+    user_ids = trained_recommender.entity_indices["unique_users"][:3]
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_ids[0])
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_ids[1])
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_ids[0])
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_ids[2])
+    assert cache.get_statistics()["evictions"] == 1
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_ids[0])
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_ids[1])
+    assert counting_recommender.scored_user_ids == [[user_ids[0]], [user_ids[1]], [user_ids[2]], [user_ids[1]]]
+
+# Test entries expire after their time to live:
+def test_ttl_expiry(counting_recommender, trained_recommender) -> None:
+    clock = FakeClock()
+    cache = RecommendationCache(ttl_seconds=10, clock=clock)
+    job_id = trained_recommender.entity_indices["unique_jobs"][0]
+    cache.find_similar_jobs(counting_recommender, job_id)
+    clock.now = 9
+    cache.find_similar_jobs(counting_recommender, job_id)
+    clock.now = 10
+    cache.find_similar_jobs(counting_recommender, job_id)
+    assert counting_recommender.similar_job_ids == [job_id, job_id]
+    assert cache.get_statistics()["expirations"] == 1
+
+# Test a new model version and changed user rows invalidate cached entries:
+def test_invalidation_on_model_version_and_user_update(counting_recommender, trained_recommender) -> None:
+    cache = RecommendationCache()
+    user_ids = trained_recommender.entity_indices["unique_users"][:2]
+    for user_id in user_ids:
+        cache.get_job_recommendations_for_single_user(counting_recommender, user_id)
+    cache.invalidate_users([user_ids[0]])
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_ids[0])
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_ids[1])
+    assert counting_recommender.scored_user_ids == [[user_ids[0]], [user_ids[1]], [user_ids[0]]]
+    counting_recommender.model_version = "v2"
+    cache.get_job_recommendations_for_single_user(counting_recommender, user_ids[1])
+    assert counting_recommender.scored_user_ids[-1] == [user_ids[1]]
+    cache.clear()
+    assert len(cache) == 0
+
+# Test a request still running on the model before an update cannot write a stale entry the updated model reads:
+def test_stale_entries_of_previous_update_generation_are_not_served(trained_recommender) -> None:
+    cache = RecommendationCache()
+    user_id = trained_recommender.entity_indices["unique_users"][0]
+    previous_recommender = CountingRecommender(trained_recommender)
+    updated_recommender = CountingRecommender(trained_recommender)
+    updated_recommender.update_generation = 1
+    cache.invalidate_users([user_id])
+    cache.get_job_recommendations_for_single_user(previous_recommender, user_id)
+    cache.get_job_recommendations_for_bulk_users(previous_recommender, [user_id])
+    cache.get_job_recommendations_for_single_user(updated_recommender, user_id)
+    assert updated_recommender.scored_user_ids == [[user_id]]
+    cache.get_job_recommendations_for_bulk_users(updated_recommender, [user_id])
+    assert updated_recommender.scored_user_ids == [[user_id]]
@@ -112,3 +112,45 @@ def test_csr_matrix_has_correct_dimensions(activities_dto, expected_unique_entit
     expected_matrix_shape = (rows_dim, columns_dim)
     csr_matrix_shape = activities_dto.matrix_csr.shape
     assert csr_matrix_shape == expected_matrix_shape
+
+# Test csr matrix cells hold the implicit scores at their user and job indices:
+def test_csr_matrix_cells_match_user_job_triples(activities_dto, expected_user_job_triples) -> None:
+    for triple in expected_user_job_triples:
+        user_matrix_row_idx = activities_dto.matrix_row_user_index.get_loc(triple["user_id"])
+        job_matrix_column_idx = activities_dto.matrix_column_job_index.get_loc(triple["job_id"])
+        assert activities_dto.matrix_csr[user_matrix_row_idx, job_matrix_column_idx] == triple["implicit_score"]
+    assert activities_dto.matrix_csr.nnz == len(expected_user_job_triples)
+
+# Test matrix indices keep the sorted unique entities:
+def test_matrix_indices_follow_unique_entities(activities_dto, expected_unique_entities) -> None:
+    assert list(activities_dto.matrix_row_user_index) == expected_unique_entities["unique_users"]
+    assert list(activities_dto.matrix_column_job_index) == expected_unique_entities["unique_jobs"]
+    assert activities_dto.matrix_column_job_index[0].item() == expected_unique_entities["unique_jobs"][0]
+
+# Test unknown users are skipped in bulk recommendations:
+def test_bulk_recommendations_skip_unknown_users(trained_recommender) -> None:
+    known_user_ids = trained_recommender.entity_indices["unique_users"][:3]
+    response = trained_recommender.get_job_recommendations_for_bulk_users([known_user_ids[0], -1, known_user_ids[1], known_user_ids[2]])
+    assert list(response.keys()) == known_user_ids
+    assert trained_recommender.get_job_recommendations_for_bulk_users([-1, -2]) == {}
+    assert trained_recommender.get_job_recommendations_for_single_user(-1) == []
+
+# Test ids outside the int64 range are served as unknown ids instead of failing:
+def test_out_of_range_ids_are_unknown(trained_recommender) -> None:
+    known_user_id = trained_recommender.entity_indices["unique_users"][0]
+    assert trained_recommender.get_job_recommendations_for_single_user(2**70) == []
+    assert list(trained_recommender.get_job_recommendations_for_bulk_users([2**70, known_user_id, -2**70])) == [known_user_id]
+    assert trained_recommender.get_recommendation_tiers([2**70, known_user_id]) == [None, Recommender.personalized_tier]
+    user_ids, job_ids, scores = trained_recommender.get_job_recommendation_arrays_for_bulk_users([2**70, known_user_id])
+    assert user_ids.tolist() == [known_user_id] and len(job_ids) == len(scores) == 1
+    assert trained_recommender.find_similar_jobs(2**70) == []
+
+# Test recommendations hold plain Python ids and scores:
+def test_recommendations_hold_python_scalars(trained_recommender) -> None:
+    user_id = trained_recommender.entity_indices["unique_users"][0]
+    response = trained_recommender.get_job_recommendations_for_single_user(user_id, number_of_recommendations=5)
+    assert len(response) == 5
+    for recommendation in response:
+        assert type(recommendation["job_id"]) is int
+        assert type(recommendation["score"]) is float
+        assert recommendation["job_id"] in trained_recommender.entity_indices["unique_jobs"]
@@ -0,0 +1,65 @@
+import numpy
+import pytest
+
+from recommender import Recommender
+
+
+@pytest.fixture()
+def artifacts_root(recommender, tmp_path):
+    recommender.build_matrix_pair_counts()
+    recommender.save_model(str(tmp_path))
+    return str(tmp_path)
+
+def assert_same_recommendations(response: dict, expected_response: dict) -> None:
+    assert list(response) == list(expected_response)
+    for user_id, recommendations in response.items():
+        assert [recommendation["job_id"] for recommendation in recommendations] == [recommendation["job_id"] for recommendation in expected_response[user_id]]
+        assert [recommendation["score"] for recommendation in recommendations] == pytest.approx([recommendation["score"] for recommendation in expected_response[user_id]], rel=1e-5, abs=1e-6)
+
+
+# Test sharded serving returns the unsharded top N, with seen and closed jobs masked in every shard:
+@pytest.mark.parametrize("number_of_shards", [1, 3])
+def test_sharded_matches_unsharded(recommender, number_of_shards) -> None:
+    recommender.set_job_availability(recommender.entity_indices["unique_jobs"][::7], False)
+    user_ids = recommender.entity_indices["unique_users"]
+    expected_response = recommender.get_job_recommendations_for_bulk_users(user_ids, 8)
+    recommender.enable_sharded_scoring(number_of_shards)
+    try:
+        assert len(recommender.sharded_scorer) == number_of_shards
+        assert_same_recommendations(recommender.get_job_recommendations_for_bulk_users(user_ids, 8), expected_response)
+        assert recommender.get_job_recommendations_for_single_user(user_ids[0], 8) == recommender.get_job_recommendations_for_bulk_users(user_ids[:1], 8)[user_ids[0]]
+    finally:
+        recommender.disable_sharded_scoring()
+    assert recommender.sharded_scorer is None
+
+# Test shards of a memory-mapped model slice the artifacts by path and follow jobs added by incremental updates:
+def test_sharded_loaded_model_with_updates(artifacts_root) -> None:
+    recommender = Recommender.load_model(artifacts_root)
+    sharded_recommender = Recommender.load_model(artifacts_root)
+    sharded_recommender.enable_sharded_scoring(2)
+    try:
+        user_ids = recommender.entity_indices["unique_users"]
+        assert_same_recommendations(sharded_recommender.get_job_recommendations_for_bulk_users(user_ids), recommender.get_job_recommendations_for_bulk_users(user_ids))
+        activities = [{"user_id": user_ids[0], "job_id": 5_000, "type": "redirect"}, {"user_id": user_ids[1], "job_id": 5_000, "type": "impression"}]
+        expected_response = recommender.get_job_recommendations_for_bulk_users(user_ids, 40)
+        previous_sharded_recommender = sharded_recommender
+        sharded_recommender = previous_sharded_recommender.copy_for_update()
+        recommender.update_with_activities(activities)
+        sharded_recommender.update_with_activities(activities)
+        assert sharded_recommender.sharded_scorer.shard_boundaries[-1] == len(sharded_recommender.matrix_column_job_index)
+        # The model the update was copied from shares the shards but never serves the job added to the copy.
+        assert_same_recommendations(previous_sharded_recommender.get_job_recommendations_for_bulk_users(user_ids, 40), expected_response)
+        assert_same_recommendations(
+            sharded_recommender.get_job_recommendations_for_bulk_users(user_ids, 40),
+            recommender.get_job_recommendations_for_bulk_users(user_ids, 40)
+            )
+        scorer = sharded_recommender.sharded_scorer
+        scorer.close()
+        # A model whose shards were closed by a swap keeps serving by scoring locally.
+        assert scorer.search(numpy.zeros((1, 64), dtype=numpy.float32), 5, numpy.empty(0, dtype=int), numpy.empty(0, dtype=int)) is None
+        assert_same_recommendations(
+            sharded_recommender.get_job_recommendations_for_bulk_users(user_ids[:5]),
+            recommender.get_job_recommendations_for_bulk_users(user_ids[:5])
+            )
+    finally:
+        sharded_recommender.disable_sharded_scoring()
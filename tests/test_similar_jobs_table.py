@@ -0,0 +1,53 @@
+import numpy
+import pytest
+
+from recommender import Recommender
+
+
+@pytest.fixture()
+def recommender_with_similar_jobs_table(recommender):
+    recommender.build_similar_jobs_table(number_of_neighbours=10, block_size=7, number_of_workers=2)
+    return recommender
+
+
+# Test the neighbour table matches similar_items for every job:
+def test_similar_jobs_table_matches_similar_items(recommender_with_similar_jobs_table) -> None:
+    als_model = recommender_with_similar_jobs_table.als_model
+    number_of_jobs = len(als_model.item_factors)
+    assert recommender_with_similar_jobs_table.similar_job_positions.shape == (number_of_jobs, 10)
+    assert recommender_with_similar_jobs_table.similar_job_positions.dtype == numpy.int32
+    assert recommender_with_similar_jobs_table.similar_job_scores.dtype == numpy.float32
+    for job_idx in range(number_of_jobs):
+        expected_positions, expected_scores = als_model.similar_items(job_idx, N=10)
+        assert recommender_with_similar_jobs_table.similar_job_positions[job_idx].tolist() == expected_positions.tolist()
+        numpy.testing.assert_allclose(recommender_with_similar_jobs_table.similar_job_scores[job_idx], expected_scores, rtol=1e-4, atol=1e-5)
+
+# Test find_similar_jobs serves from the table and falls back beyond its width:
+def test_find_similar_jobs_uses_table(recommender_with_similar_jobs_table, trained_recommender) -> None:
+    job_id = trained_recommender.entity_indices["unique_jobs"][3]
+    response = recommender_with_similar_jobs_table.find_similar_jobs(job_id)
+    expected_response = trained_recommender.find_similar_jobs(job_id)
+    assert [recommendation["job_id"] for recommendation in response] == [recommendation["job_id"] for recommendation in expected_response]
+    assert len(recommender_with_similar_jobs_table.find_similar_jobs(job_id, number_of_recommendations=3)) == 3
+    assert len(recommender_with_similar_jobs_table.find_similar_jobs(job_id, number_of_recommendations=12)) == 12
+
+# Test closed jobs are skipped from the table and from the exact search, keeping the next open neighbours:
+@pytest.mark.parametrize("number_of_recommendations", [5, 8, 12])
+def test_find_similar_jobs_skips_closed_jobs(recommender_with_similar_jobs_table, trained_recommender, number_of_recommendations) -> None:
+    recommender = recommender_with_similar_jobs_table
+    job_id = trained_recommender.entity_indices["unique_jobs"][3]
+    similar_job_ids = [recommendation["job_id"] for recommendation in recommender.find_similar_jobs(job_id, 20)]
+    closed_job_ids = similar_job_ids[1:8:2]
+    recommender.set_job_availability(closed_job_ids, False)
+    response = recommender.find_similar_jobs(job_id, number_of_recommendations)
+    open_similar_job_ids = [similar_job_id for similar_job_id in similar_job_ids if similar_job_id not in closed_job_ids]
+    assert [recommendation["job_id"] for recommendation in response] == open_similar_job_ids[:number_of_recommendations]
+
+# Test the neighbour table is saved with the model and memory-mapped on load:
+def test_similar_jobs_table_is_saved_and_memory_mapped(recommender_with_similar_jobs_table, tmp_path) -> None:
+    recommender_with_similar_jobs_table.save_model(str(tmp_path))
+    loaded_recommender = Recommender.load_model(str(tmp_path))
+    assert isinstance(loaded_recommender.similar_job_positions, numpy.memmap)
+    numpy.testing.assert_array_equal(loaded_recommender.similar_job_positions, recommender_with_similar_jobs_table.similar_job_positions)
+    job_id = loaded_recommender.entity_indices["unique_jobs"][0]
+    assert loaded_recommender.find_similar_jobs(job_id) == recommender_with_similar_jobs_table.find_similar_jobs(job_id)
@@ -0,0 +1,39 @@
+import numpy
+
+from ingestion import Activity, read_activity_columns
+from synthetic_data import generate_activity_columns, write_activities
+
+
+# Test the generator is deterministic for a seed:
+def test_generator_is_deterministic() -> None:
+    first_columns = generate_activity_columns(number_of_users=100, number_of_jobs=50, number_of_events=1000, seed=3)
+    second_columns = generate_activity_columns(number_of_users=100, number_of_jobs=50, number_of_events=1000, seed=3)
+    other_columns = generate_activity_columns(number_of_users=100, number_of_jobs=50, number_of_events=1000, seed=4)
+    numpy.testing.assert_array_equal(first_columns.user_ids, second_columns.user_ids)
+    numpy.testing.assert_array_equal(first_columns.timestamps, second_columns.timestamps)
+    assert not numpy.array_equal(first_columns.job_ids, other_columns.job_ids)
+
+# Test ids, types and timestamps respect the configuration:
+def test_generator_respects_configuration() -> None:
+    activity_columns = generate_activity_columns(number_of_users=200, number_of_jobs=100, number_of_events=20_000, redirect_share=0.3)
+    assert len(activity_columns) == 20_000
+    assert activity_columns.user_ids.min() >= 1 and activity_columns.user_ids.max() <= 200
+    assert activity_columns.job_ids.min() >= 1 and activity_columns.job_ids.max() <= 100
+    assert abs((activity_columns.type_codes == Activity.REDIRECT.value).mean() - 0.3) < 0.02
+    assert (numpy.diff(activity_columns.timestamps) >= 0).all()
+
+# Test job popularity follows a power law, concentrating events on a few jobs:
+def test_job_popularity_is_skewed() -> None:
+    activity_columns = generate_activity_columns(number_of_users=1000, number_of_jobs=1000, number_of_events=50_000, job_popularity_exponent=1.1)
+    job_counts = numpy.sort(numpy.bincount(activity_columns.job_ids))[::-1]
+    assert job_counts[:10].sum() > 0.3 * len(activity_columns)
+
+# Test written activities read back into the same columns:
+def test_written_activities_round_trip(tmp_path) -> None:
+    activity_columns = generate_activity_columns(number_of_users=50, number_of_jobs=20, number_of_events=500)
+    write_activities(str(tmp_path / "activities.jsonl"), activity_columns)
+    read_columns = read_activity_columns(str(tmp_path / "activities.jsonl"))
+    numpy.testing.assert_array_equal(read_columns.user_ids, activity_columns.user_ids)
+    numpy.testing.assert_array_equal(read_columns.job_ids, activity_columns.job_ids)
+    numpy.testing.assert_array_equal(read_columns.type_codes, activity_columns.type_codes)
+    numpy.testing.assert_array_equal(read_columns.timestamps, activity_columns.timestamps)
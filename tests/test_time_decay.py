@@ -0,0 +1,155 @@
+import numpy
+import pytest
+
+from ingestion import Activity, ActivityColumns, read_activity_columns
+from recommender import Recommender
+from time_decay import DecayedPairCounts, ScoreDecay, select_events
+
+
+day_seconds = 86400.0
+
+def build_activity_columns(events: list[tuple[int, int, str, float]]) -> ActivityColumns:
+    user_ids, job_ids, activity_types, timestamps = zip(*events)
+    return ActivityColumns(
+        numpy.array(user_ids, dtype=ActivityColumns.user_id_dtype),
+        numpy.array(job_ids, dtype=ActivityColumns.job_id_dtype),
+        numpy.array([Activity[activity_type.upper()].value for activity_type in activity_types], dtype=ActivityColumns.type_code_dtype),
+        numpy.array(timestamps, dtype=ActivityColumns.timestamp_dtype)
+        )
+
+def get_pair_scores(recommender: Recommender) -> dict:
+    user_ids, job_ids, implicit_scores = recommender.get_user_job_score_arrays()
+    return dict(zip(zip(user_ids.tolist(), job_ids.tolist()), implicit_scores.tolist()))
+
+def get_matrix_cells(recommender: Recommender) -> dict:
+    recommender.merge_pending_updates()
+    matrix_coo = recommender.matrix_csr.tocoo()
+    user_ids = recommender.matrix_row_user_index.get_entity_ids(matrix_coo.row).tolist()
+    job_ids = recommender.matrix_column_job_index.get_entity_ids(matrix_coo.col).tolist()
+    return dict(zip(zip(user_ids, job_ids), matrix_coo.data.tolist()))
+
+def activity_records_from_columns(activity_columns: ActivityColumns) -> list[dict]:
+    return [
+        {"user_id": user_id, "job_id": job_id, "type": Activity(type_code).name.lower(), "timestamp": timestamp}
+        for user_id, job_id, type_code, timestamp in zip(
+            activity_columns.user_ids.tolist(), 
+            activity_columns.job_ids.tolist(), 
+            activity_columns.type_codes.tolist(), 
+            activity_columns.timestamps.tolist()
+            )
+        ]
+
+def train_decayed_recommender(activity_columns: ActivityColumns, score_decay: ScoreDecay) -> Recommender:
+    recommender = Recommender.from_activity_columns(activity_columns, score_decay)
+    recommender.build_sparse_matrix()
+    recommender.train_als_model()
+    recommender.build_matrix_pair_counts()
+    return recommender
+
+
+# Test decay switched off (no half-life, no lookback) gives the default scores and matrix:
+@pytest.mark.parametrize("score_decay", [ScoreDecay(), ScoreDecay(max_lookback_seconds=1e9)])
+def test_no_decay_matches_default_scores(random_activities_filepath, score_decay) -> None:
+    recommender = Recommender(random_activities_filepath, ingestion_mode="columnar")
+    decayed_recommender = Recommender(random_activities_filepath, ingestion_mode="columnar", score_decay=score_decay)
+    assert get_pair_scores(decayed_recommender) == get_pair_scores(recommender)
+    recommender.build_sparse_matrix()
+    decayed_recommender.build_sparse_matrix()
+    assert numpy.array_equal(decayed_recommender.matrix_csr.indptr, recommender.matrix_csr.indptr)
+    assert numpy.array_equal(decayed_recommender.matrix_csr.indices, recommender.matrix_csr.indices)
+    assert numpy.array_equal(decayed_recommender.matrix_csr.data, recommender.matrix_csr.data)
+    with pytest.raises(ValueError):
+        Recommender(random_activities_filepath, ingestion_mode="sharded", score_decay=score_decay)
+
+# Test hand-computed decayed scores, the decayed floors and the lookback window:
+def test_decayed_scores() -> None:
+    reference_time = 100 * day_seconds
+    recommender = Recommender.from_activity_columns(build_activity_columns([
+        (1, 10, "impression", reference_time),
+        (1, 10, "redirect", reference_time - 7 * day_seconds),
+        (2, 10, "impression", reference_time - 14 * day_seconds),
+        (2, 11, "redirect", reference_time - 7 * day_seconds),
+        (3, 10, "impression", reference_time - 40 * day_seconds),
+        (3, 11, "impression", reference_time - 1 * day_seconds)
+        ]), ScoreDecay(half_life_seconds=7 * day_seconds, max_lookback_seconds=30 * day_seconds))
+    assert recommender.score_reference_time == reference_time
+    pair_scores = get_pair_scores(recommender)
+    # A redirect one half-life ago counts 0.5, so 2 * 0.5 + min(1, 0.5).
+    assert pair_scores[(1, 10)] == pytest.approx(1.5)
+    # A lone impression two half-lives ago keeps the floor of 1, decayed to 0.25.
+    assert pair_scores[(2, 10)] == pytest.approx(0.25)
+    assert pair_scores[(2, 11)] == pytest.approx(1.0)
+    assert (3, 10) not in pair_scores
+    assert pair_scores[(3, 11)] == pytest.approx(2 ** (-1 / 7))
+
+# Test sliding the window processes entering and leaving events into the counters of a full recomputation:
+def test_sliding_window_matches_recomputation(random_activities_filepath) -> None:
+    activity_columns = read_activity_columns(random_activities_filepath)
+    score_decay = ScoreDecay(half_life_seconds=200 * day_seconds, max_lookback_seconds=400 * day_seconds)
+    cutoff_times = numpy.quantile(activity_columns.timestamps, [0.5, 0.7, 1.0])
+    decayed_pair_counts = DecayedPairCounts.from_activity_columns(
+        select_events(activity_columns, activity_columns.timestamps <= cutoff_times[0]), score_decay
+        )
+    for previous_cutoff_time, cutoff_time in zip(cutoff_times[:-1], cutoff_times[1:]):
+        is_new = (activity_columns.timestamps > previous_cutoff_time) & (activity_columns.timestamps <= cutoff_time)
+        decayed_pair_counts.advance(cutoff_time, select_events(activity_columns, is_new))
+        expected_pair_counts = DecayedPairCounts.from_activity_columns(activity_columns, score_decay, cutoff_time)
+        assert len(expected_pair_counts.window_activity_columns) < (activity_columns.timestamps <= cutoff_time).sum()
+        assert numpy.array_equal(decayed_pair_counts.pair_keys, expected_pair_counts.pair_keys)
+        assert numpy.array_equal(decayed_pair_counts.window_redirects, expected_pair_counts.window_redirects)
+        assert numpy.array_equal(decayed_pair_counts.window_activity_columns.timestamps, expected_pair_counts.window_activity_columns.timestamps)
+        for counter_name in ("impressions", "redirects", "latest_impression_timestamps", "latest_redirect_timestamps"):
+            assert getattr(decayed_pair_counts, counter_name) == pytest.approx(getattr(expected_pair_counts, counter_name), abs=1e-9)
+    with pytest.raises(ValueError):
+        decayed_pair_counts.advance(cutoff_times[0])
+
+# Test a recommender refreshed with new events rebuilds the matrix of one built from all events:
+def test_refresh_score_window(random_activities_filepath) -> None:
+    activity_columns = read_activity_columns(random_activities_filepath)
+    score_decay = ScoreDecay(half_life_seconds=100 * day_seconds, max_lookback_seconds=300 * day_seconds)
+    cutoff_time = numpy.quantile(activity_columns.timestamps, 0.8)
+    recommender = Recommender.from_activity_columns(select_events(activity_columns, activity_columns.timestamps <= cutoff_time), score_decay)
+    recommender.build_sparse_matrix()
+    recommender.refresh_score_window(activity_columns.timestamps.max(), select_events(activity_columns, activity_columns.timestamps > cutoff_time))
+    expected_recommender = Recommender.from_activity_columns(activity_columns, score_decay)
+    expected_recommender.build_sparse_matrix()
+    assert recommender.entity_indices == expected_recommender.entity_indices
+    assert numpy.array_equal(recommender.matrix_csr.indices, expected_recommender.matrix_csr.indices)
+    assert recommender.matrix_csr.data == pytest.approx(expected_recommender.matrix_csr.data)
+    recommender.train_als_model()
+    user_id = recommender.entity_indices["unique_users"][0]
+    job_matrix_column_idx = recommender.matrix_csr[recommender.matrix_row_user_index.get_loc(user_id)].indices[0]
+    summary = recommender.update_with_activities([{"user_id": user_id, "job_id": recommender.entity_indices["unique_jobs"][job_matrix_column_idx], "type": "redirect"}])
+    assert summary["updated_user_ids"] == [user_id]
+    assert recommender.matrix_impressions.dtype == numpy.float64
+
+# Test an update of a loaded decayed model decays new activity and its floors like a model built from all events:
+def test_update_decays_new_activity(random_activities_filepath, tmp_path) -> None:
+    activity_columns = read_activity_columns(random_activities_filepath)
+    score_decay = ScoreDecay(half_life_seconds=100 * day_seconds, max_lookback_seconds=300 * day_seconds)
+    is_batch = numpy.arange(len(activity_columns)) % 10 == 0
+    # The latest event stays out of the batch, so both models share the reference time.
+    is_batch[numpy.argmax(activity_columns.timestamps)] = False
+    recommender = train_decayed_recommender(select_events(activity_columns, ~is_batch), score_decay)
+    recommender.save_model(str(tmp_path))
+    loaded_recommender = Recommender.load_model(str(tmp_path))
+    loaded_recommender.update_with_activities(activity_records_from_columns(select_events(activity_columns, is_batch)))
+    expected_recommender = Recommender.from_activity_columns(activity_columns, score_decay)
+    expected_recommender.build_sparse_matrix()
+    assert get_matrix_cells(loaded_recommender) == pytest.approx(get_matrix_cells(expected_recommender))
+
+# Test a refresh counts the events folded in since the previous one without them being passed again:
+def test_refresh_after_update_adds_updated_events(random_activities_filepath) -> None:
+    activity_columns = read_activity_columns(random_activities_filepath)
+    score_decay = ScoreDecay(half_life_seconds=100 * day_seconds, max_lookback_seconds=300 * day_seconds)
+    cutoff_time = numpy.quantile(activity_columns.timestamps, 0.8)
+    recommender = train_decayed_recommender(select_events(activity_columns, activity_columns.timestamps <= cutoff_time), score_decay)
+    recommender.update_with_activities(activity_records_from_columns(select_events(activity_columns, activity_columns.timestamps > cutoff_time)))
+    assert len(recommender.activity_columns_since_refresh) == 1
+    recommender.refresh_score_window(activity_columns.timestamps.max())
+    assert recommender.activity_columns_since_refresh == ()
+    expected_recommender = Recommender.from_activity_columns(activity_columns, score_decay)
+    expected_recommender.build_sparse_matrix()
+    assert recommender.entity_indices == expected_recommender.entity_indices
+    assert numpy.array_equal(recommender.matrix_csr.indices, expected_recommender.matrix_csr.indices)
+    assert recommender.matrix_csr.data == pytest.approx(expected_recommender.matrix_csr.data)
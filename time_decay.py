@@ -0,0 +1,172 @@
+from ingestion import Activity, ActivityColumns, PairCounts, decode_pair_keys, encode_pair_keys
+
+import numpy
+
+
+class ScoreDecay:
+
+    def __init__(self, half_life_seconds: float = None, max_lookback_seconds: float = None) -> None:
+        # Without a half-life every event in the window counts 1; without a lookback the window has no start.
+        self.half_life_seconds = half_life_seconds
+        self.max_lookback_seconds = max_lookback_seconds
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, score_decay: dict) -> "ScoreDecay":
+        return cls(**score_decay)
+
+    def get_window_start(self, reference_time: float) -> float:
+        # The window is (reference_time - max_lookback_seconds, reference_time].
+        return reference_time - self.max_lookback_seconds if self.max_lookback_seconds is not None else -numpy.inf
+
+    def get_scale_factor(self, elapsed_seconds: float) -> float:
+        return 2.0 ** (-elapsed_seconds / self.half_life_seconds) if self.half_life_seconds is not None else 1.0
+
+    def calculate_event_weights(self, timestamps: numpy.ndarray, reference_time: float) -> numpy.ndarray:
+        # An event counts 2 ** (-age / half-life) at the reference time.
+        if self.half_life_seconds is None:
+            return numpy.ones(len(timestamps))
+        return numpy.exp2((timestamps - reference_time) / self.half_life_seconds)
+
+
+class DecayedPairCounts:
+
+    # The per-pair arrays, aligned with pair_keys, and the value of a pair without events.
+    pair_counter_empty_values: dict[str, float] = {
+        "impressions": 0.0, "redirects": 0.0, "window_impressions": 0, "window_redirects": 0,
+        "latest_impression_timestamps": -numpy.inf, "latest_redirect_timestamps": -numpy.inf
+        }
+
+    # Per (user, job) pair: impression and redirect counters summing the decayed weights of the pair's events in the
+    # window, plus the raw event counts and the time of its latest impression and redirect. Every weight is relative to
+    # reference_time, so sliding the window rescales all counters by one factor and only the events entering or
+    # leaving the window have to be processed.
+    def __init__(self, score_decay: ScoreDecay, reference_time: float) -> None:
+        self.score_decay = score_decay
+        self.reference_time = reference_time
+        # Events in the window, oldest first: the events leaving it on an advance are a prefix.
+        self.window_activity_columns = ActivityColumns.empty()
+        self.pair_keys = numpy.empty(0, dtype=numpy.int64)
+        self.impressions = numpy.empty(0)
+        self.redirects = numpy.empty(0)
+        self.window_impressions = numpy.empty(0, dtype=PairCounts.count_dtype)
+        self.window_redirects = numpy.empty(0, dtype=PairCounts.count_dtype)
+        self.latest_impression_timestamps = numpy.empty(0)
+        self.latest_redirect_timestamps = numpy.empty(0)
+
+    def __len__(self) -> int:
+        return len(self.pair_keys)
+
+    @classmethod
+    def from_activity_columns(cls, activity_columns: ActivityColumns, score_decay: ScoreDecay, reference_time: float = None) -> "DecayedPairCounts":
+        # The reference time defaults to the latest event, like the recent popularity window of the fallback rankings.
+        timestamps = activity_columns.timestamps
+        if reference_time is None:
+            reference_time = float(numpy.nanmax(timestamps)) if len(timestamps) and not numpy.isnan(timestamps).all() else 0.0
+        decayed_pair_counts = cls(score_decay, reference_time)
+        decayed_pair_counts.advance(reference_time, select_events(activity_columns, timestamps <= reference_time))
+        return decayed_pair_counts
+
+    @classmethod
+    def from_new_events(cls, activity_columns: ActivityColumns, score_decay: ScoreDecay, reference_time: float) -> "DecayedPairCounts":
+        # Counters of events arriving between refreshes, weighted relative to the reference time of the model they are
+        # folded into: events newer than it count more than 1 until a refresh moves the reference time past them.
+        # Only the counters are kept; the events join the window through advance at the next refresh.
+        decayed_pair_counts = cls(score_decay, reference_time)
+        decayed_pair_counts.count_events(select_events(activity_columns, activity_columns.timestamps > score_decay.get_window_start(reference_time)), 1)
+        return decayed_pair_counts
+
+    def advance(self, reference_time: float, new_activity_columns: ActivityColumns = None) -> None:
+        # Slides the window to end at reference_time and counts the new events, which must not be newer than it.
+        if reference_time < self.reference_time:
+            raise ValueError(f"The window only slides forward, from {self.reference_time} to {reference_time} requested.")
+        if new_activity_columns is not None and len(new_activity_columns) and numpy.nanmax(new_activity_columns.timestamps, initial=-numpy.inf) > reference_time:
+            raise ValueError("New events must not be newer than the reference time.")
+        scale_factor = self.score_decay.get_scale_factor(reference_time - self.reference_time)
+        self.impressions *= scale_factor
+        self.redirects *= scale_factor
+        self.reference_time = reference_time
+        window_start = self.score_decay.get_window_start(reference_time)
+        number_of_leaving_events = int(numpy.searchsorted(self.window_activity_columns.timestamps, window_start, side="right"))
+        if number_of_leaving_events:
+            window_positions = numpy.arange(len(self.window_activity_columns))
+            self.count_events(select_events(self.window_activity_columns, window_positions < number_of_leaving_events), -1)
+            self.window_activity_columns = select_events(self.window_activity_columns, window_positions >= number_of_leaving_events)
+        if new_activity_columns is not None and len(new_activity_columns):
+            # Events without a timestamp cannot be aged and are left out, as are events already older than the window.
+            entering_activity_columns = select_events(new_activity_columns, new_activity_columns.timestamps > window_start)
+            entering_activity_columns = select_events(entering_activity_columns, numpy.argsort(entering_activity_columns.timestamps, kind="stable"))
+            self.count_events(entering_activity_columns, 1)
+            window_activity_columns = ActivityColumns.concatenate([self.window_activity_columns, entering_activity_columns])
+            # A daily refresh brings events newer than the whole window, which keeps it sorted without a sort.
+            if len(self.window_activity_columns) and len(entering_activity_columns) and entering_activity_columns.timestamps[0] < self.window_activity_columns.timestamps[-1]:
+                window_activity_columns = select_events(window_activity_columns, numpy.argsort(window_activity_columns.timestamps, kind="stable"))
+            self.window_activity_columns = window_activity_columns
+
+    def count_events(self, activity_columns: ActivityColumns, sign: int) -> None:
+        # Adds (sign 1) or removes (sign -1) events grouped per pair. Only the touched pairs are updated; pairs are
+        # inserted or deleted at their sorted positions, so the cost grows with the events, not with a re-sort of all pairs.
+        if not len(activity_columns):
+            return
+        event_pair_keys, event_pair_positions = numpy.unique(encode_pair_keys(activity_columns.user_ids, activity_columns.job_ids), return_inverse=True)
+        number_of_event_pairs = len(event_pair_keys)
+        if sign > 0:
+            self.insert_missing_pairs(event_pair_keys)
+        pair_positions = numpy.searchsorted(self.pair_keys, event_pair_keys)
+        weights = self.score_decay.calculate_event_weights(activity_columns.timestamps, self.reference_time)
+        for counter_name, activity in (("impressions", Activity.IMPRESSION), ("redirects", Activity.REDIRECT)):
+            is_counted = activity_columns.type_codes == activity.value
+            decayed_counts = getattr(self, counter_name)
+            window_counts = getattr(self, f"window_{counter_name}")
+            latest_timestamps = getattr(self, f"latest_{counter_name[:-1]}_timestamps")
+            decayed_counts[pair_positions] += sign * numpy.bincount(event_pair_positions, weights=weights * is_counted, minlength=number_of_event_pairs)
+            window_counts[pair_positions] += sign * numpy.bincount(event_pair_positions[is_counted], minlength=number_of_event_pairs)
+            if sign > 0:
+                event_latest_timestamps = numpy.full(number_of_event_pairs, -numpy.inf)
+                numpy.maximum.at(event_latest_timestamps, event_pair_positions[is_counted], activity_columns.timestamps[is_counted])
+                latest_timestamps[pair_positions] = numpy.maximum(latest_timestamps[pair_positions], event_latest_timestamps)
+            else:
+                # Removed events are the oldest of the window, so a latest event only leaves with the last one of its pair.
+                emptied_positions = pair_positions[window_counts[pair_positions] == 0]
+                decayed_counts[emptied_positions] = 0.0
+                latest_timestamps[emptied_positions] = -numpy.inf
+                # Subtracting weights leaves rounding residues; counters never go below zero.
+                decayed_counts[pair_positions] = numpy.maximum(decayed_counts[pair_positions], 0.0)
+        if sign < 0:
+            is_emptied = (self.window_impressions[pair_positions] + self.window_redirects[pair_positions]) == 0
+            if is_emptied.any():
+                for array_name in ("pair_keys", *self.pair_counter_empty_values):
+                    setattr(self, array_name, numpy.delete(getattr(self, array_name), pair_positions[is_emptied]))
+
+    def insert_missing_pairs(self, pair_keys: numpy.ndarray) -> None:
+        # numpy.insert shifts the arrays once, with no re-sort of the existing pairs.
+        insert_positions = numpy.searchsorted(self.pair_keys, pair_keys)
+        is_missing = self.pair_keys.take(insert_positions, mode="clip") != pair_keys if len(self.pair_keys) else numpy.ones(len(pair_keys), dtype=bool)
+        if not is_missing.any():
+            return
+        insert_positions = insert_positions[is_missing]
+        self.pair_keys = numpy.insert(self.pair_keys, insert_positions, pair_keys[is_missing])
+        for array_name, empty_value in self.pair_counter_empty_values.items():
+            setattr(self, array_name, numpy.insert(getattr(self, array_name), insert_positions, empty_value))
+
+    def get_pair_counts(self) -> PairCounts:
+        # PairCounts carrying the decayed (float) counters of the pairs with events in the window.
+        user_ids, job_ids = decode_pair_keys(self.pair_keys)
+        return PairCounts(user_ids.astype(ActivityColumns.user_id_dtype), job_ids.astype(ActivityColumns.job_id_dtype), self.impressions.copy(), self.redirects.copy())
+
+    def get_latest_event_weights(self) -> tuple[numpy.ndarray, numpy.ndarray]:
+        return (
+            self.score_decay.calculate_event_weights(self.latest_impression_timestamps, self.reference_time),
+            self.score_decay.calculate_event_weights(self.latest_redirect_timestamps, self.reference_time)
+            )
+
+
+def select_events(activity_columns: ActivityColumns, selection: numpy.ndarray) -> ActivityColumns:
+    return ActivityColumns(
+        activity_columns.user_ids[selection],
+        activity_columns.job_ids[selection],
+        activity_columns.type_codes[selection],
+        activity_columns.timestamps[selection]
+        )
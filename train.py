@@ -0,0 +1,120 @@
+from als_training import TrainingConfig
+from funnel_statistics import calculate_funnel_statistics, write_funnel_statistics
+from metrics import metrics
+from ingestion import PairCounts
+from recommender import Recommender
+from time_decay import ScoreDecay
+
+import argparse
+import os
+
+
+training_stages: tuple[str, ...] = ("ingestion", "scoring", "matrix_build", "training", "funnel_statistics")
+
+
+def train_and_save_model(
+        activities_filepath: str,
+        artifacts_root: str,
+        ingestion_mode: str = "columnar",
+        cache_directory: str = None,
+        training_config: TrainingConfig = None,
+        users_filepath: str = None,
+        segment_attribute: str = None,
+        score_decay: ScoreDecay = None,
+        ann_index_parameters: dict = None
+        ) -> str:
+    recommender = Recommender(activities_filepath, ingestion_mode=ingestion_mode, cache_directory=cache_directory, score_decay=score_decay)
+    recommender.build_sparse_matrix()
+    recommender.train_als_model(training_config)
+    recommender.build_similar_jobs_table()
+    # The index parameters are stored in the manifest, so every load of the artifact serves through the ANN index.
+    if ann_index_parameters is not None:
+        recommender.enable_ann_index(**ann_index_parameters)
+    recommender.build_fallback_rankings(users_filepath, segment_attribute)
+    recommender.build_matrix_pair_counts()
+    # The funnel statistics reuse the per-pair counters of ingestion, so they cost no extra pass over the activities.
+    # Decayed counters only cover the lookback window, so with decay the funnel is counted from the raw events instead.
+    with metrics.time_stage("funnel_statistics"):
+        if score_decay is not None:
+            pair_counts = PairCounts.from_activity_columns(recommender.activity_columns)
+            funnel_statistics = calculate_funnel_statistics(pair_counts.user_ids, pair_counts.job_ids, pair_counts.impressions, pair_counts.redirects)
+        else:
+            funnel_statistics = calculate_funnel_statistics(*recommender.get_pair_count_arrays())
+    # Training usually runs in a separate process, so its stage metrics are saved with the artifact for the server.
+    if metrics.enabled:
+        recommender.training_report["stage_durations"] = {
+            stage: metrics.last_stage_durations[stage] for stage in training_stages if stage in metrics.last_stage_durations
+        }
+        recommender.training_report["stage_peak_traced_memory_bytes"] = {
+            stage: metrics.stage_peak_traced_memory[stage] for stage in training_stages if stage in metrics.stage_peak_traced_memory
+        }
+        recommender.training_report["stage_max_rss_bytes"] = {
+            stage: metrics.stage_max_rss[stage] for stage in training_stages if stage in metrics.stage_max_rss
+        }
+    artifact_directory = recommender.save_model(artifacts_root)
+    write_funnel_statistics(funnel_statistics, os.path.join(artifact_directory, "funnel_statistics.json"))
+    return artifact_directory
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the ALS recommender offline and write versioned model artifacts.")
+    parser.add_argument("--activities", default="dataset/activities.jsonl", help="Path to activities.jsonl.")
+    parser.add_argument("--artifacts", default="artifacts", help="Root directory for versioned model artifacts.")
+    parser.add_argument("--ingestion-mode", default="columnar", choices=Recommender.ingestion_modes)
+    parser.add_argument("--cache-directory", default=None, help="Binary activity cache used by columnar ingestion.")
+    parser.add_argument("--users", default=None, help="Path to users.jsonl; enables per-segment fallback rankings for unknown users.")
+    parser.add_argument("--segment-attribute", default="degree_subject", help="users.jsonl attribute defining the fallback segments.")
+    parser.add_argument("--trace-memory", action="store_true", help="Record the peak traced memory of every stage (slower).")
+    parser.add_argument("--factors", type=int, default=64)
+    parser.add_argument("--iterations", type=int, default=15)
+    parser.add_argument("--regularization", type=float, default=0.05)
+    parser.add_argument("--confidence-scale", type=float, default=2.0)
+    parser.add_argument("--factor-dtype", default="float32", choices=tuple(TrainingConfig.factor_dtypes))
+    parser.add_argument("--threads", type=int, default=0, help="Training threads; 0 uses every core.")
+    parser.add_argument("--track-loss", action="store_true")
+    parser.add_argument("--early-stopping-tolerance", type=float, default=None, help="Stop once the relative loss improvement falls below this.")
+    parser.add_argument("--early-stopping-patience", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--half-life-days", type=float, default=None, help="Weight events by recency with this half-life (columnar ingestion).")
+    parser.add_argument("--max-lookback-days", type=float, default=None, help="Only score events this recent (columnar ingestion).")
+    parser.add_argument("--ann-index", action="store_true", help="Serve the model through an approximate (IVF) nearest-neighbour index.")
+    parser.add_argument("--ann-clusters", type=int, default=None, help="IVF clusters; defaults to sqrt(number of jobs).")
+    parser.add_argument("--ann-probes", type=int, default=8, help="IVF clusters scanned per query.")
+    args = parser.parse_args()
+    training_config = TrainingConfig(
+        factors=args.factors,
+        iterations=args.iterations,
+        regularization=args.regularization,
+        confidence_scale=args.confidence_scale,
+        factor_dtype=args.factor_dtype,
+        number_of_threads=args.threads,
+        track_loss=args.track_loss,
+        early_stopping_tolerance=args.early_stopping_tolerance,
+        early_stopping_patience=args.early_stopping_patience,
+        random_state=args.seed
+        )
+    score_decay = None
+    if args.half_life_days is not None or args.max_lookback_days is not None:
+        score_decay = ScoreDecay(
+            args.half_life_days * 86400 if args.half_life_days is not None else None,
+            args.max_lookback_days * 86400 if args.max_lookback_days is not None else None
+            )
+    ann_index_parameters = None
+    if args.ann_index:
+        ann_index_parameters = {"number_of_clusters": args.ann_clusters, "number_of_probes": args.ann_probes}
+    metrics.enable(trace_memory=args.trace_memory)
+    artifact_directory = train_and_save_model(
+        args.activities, 
+        args.artifacts, 
+        args.ingestion_mode, 
+        args.cache_directory, 
+        training_config,
+        args.users,
+        args.segment_attribute,
+        score_decay,
+        ann_index_parameters
+        )
+    print(f"Model artifacts written to {artifact_directory}")
+    for stage, duration in metrics.last_stage_durations.items():
+        peak_memory_megabytes = metrics.stage_peak_traced_memory.get(stage, 0) / 2**20
+        print(f"{stage:>14}: {duration:>8.2f} s, peak traced memory {peak_memory_megabytes:>8.1f} MB, max RSS {metrics.stage_max_rss[stage] / 2**20:>8.1f} MB")
@@ -1,5 +1,76 @@
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import os
+import numpy
+from threadpoolctl import threadpool_limits
 
 
 def nested_default_dict():
-    return defaultdict(nested_default_dict)
\ No newline at end of file
+    return defaultdict(nested_default_dict)
+
+
+def select_top_k(scores: numpy.ndarray, k: int) -> tuple[numpy.ndarray, numpy.ndarray]:
+    number_of_columns = scores.shape[1]
+    k = min(k, number_of_columns)
+    if k == 0:
+        return numpy.empty((len(scores), 0), dtype=numpy.int64), numpy.empty((len(scores), 0), dtype=scores.dtype)
+    top_k_positions = numpy.argpartition(scores, number_of_columns - k, axis=1)[:, number_of_columns - k:]
+    top_k_scores = numpy.take_along_axis(scores, top_k_positions, axis=1)
+    descending_order = numpy.argsort(-top_k_scores, axis=1, kind="stable")
+    top_k_positions = numpy.take_along_axis(top_k_positions, descending_order, axis=1)
+    top_k_scores = numpy.take_along_axis(top_k_scores, descending_order, axis=1)
+    return top_k_positions, top_k_scores
+
+
+def for_each_top_k_block(
+        query_factors: numpy.ndarray,
+        target_factors: numpy.ndarray,
+        k: int,
+        handle_block: Callable[[int, int, numpy.ndarray, numpy.ndarray], None],
+        block_size: int = 2048,
+        number_of_workers: int = None,
+        adjust_block_scores: Callable[[int, int, numpy.ndarray], None] = None
+        ) -> None:
+    number_of_workers = number_of_workers or os.cpu_count()
+    target_factors_transposed = numpy.ascontiguousarray(target_factors.T)
+    number_of_queries = len(query_factors)
+
+    def score_block(block_start: int) -> None:
+        # Each worker holds one block_size x number_of_targets score matrix at a time.
+        block_end = min(block_start + block_size, number_of_queries)
+        block_scores = query_factors[block_start:block_end] @ target_factors_transposed
+        # Lets callers exclude targets (e.g. already seen items) in place before the top-k selection.
+        if adjust_block_scores is not None:
+            adjust_block_scores(block_start, block_end, block_scores)
+        top_k_positions, top_k_scores = select_top_k(block_scores, k)
+        handle_block(block_start, block_end, top_k_positions, top_k_scores)
+
+    # Parallelism comes from the block workers, so each BLAS call is kept single-threaded to avoid oversubscription.
+    with threadpool_limits(limits=1 if number_of_workers > 1 else None, user_api="blas"):
+        with ThreadPoolExecutor(max_workers=number_of_workers) as executor:
+            list(executor.map(score_block, range(0, number_of_queries, block_size)))
+
+
+def append_rows(array: numpy.ndarray, rows: numpy.ndarray, growth_factor: float = 1.5) -> numpy.ndarray:
+    # Returns array followed by rows as a leading view of a buffer with spare capacity; the buffer is only reallocated,
+    # growth_factor times larger, once full, so appending k rows costs O(k) amortized. Views returned earlier keep their
+    # length and contents, but only the latest view may be appended to: the rows beyond it are reused.
+    number_of_rows = len(array) + len(rows)
+    buffer = array.base
+    has_spare_capacity = (
+        isinstance(buffer, numpy.ndarray)
+        and buffer.flags.owndata
+        and buffer.flags.writeable
+        and buffer.dtype == array.dtype
+        and buffer.shape[1:] == array.shape[1:]
+        and buffer.strides == array.strides
+        and buffer.ctypes.data == array.ctypes.data
+        and len(buffer) >= number_of_rows
+        )
+    if not has_spare_capacity:
+        buffer = numpy.empty((max(int(growth_factor * number_of_rows), number_of_rows),) + array.shape[1:], dtype=array.dtype)
+        buffer[:len(array)] = array
+    buffer[len(array):number_of_rows] = rows
+    return buffer[:number_of_rows]